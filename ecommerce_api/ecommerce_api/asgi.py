@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_api.settings')
 
 application = get_asgi_application()
+
+# Build the autocomplete index in the background while the worker starts serving
+from products import autocomplete  # noqa: E402 - needs the app registry loaded above
+
+autocomplete.start_build()
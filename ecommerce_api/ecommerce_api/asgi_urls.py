@@ -0,0 +1,11 @@
+"""
+URL configuration for ASGI requests when ASYNC_CATALOG_READS is on: the same URLs as
+ecommerce_api.urls, with the async catalog reads in front of the product router.
+"""
+from django.urls import path, include
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/', include('products.async_urls')),
+] + sync_urlpatterns
@@ -0,0 +1,392 @@
+"""
+Read-through cache for API responses, invalidated by per-row versions or per-model
+generation counters.
+
+Every cached response is keyed on the version of what it was built from, so a write
+orphans every key built from the old version: nothing has to be deleted and stale
+entries simply age out. For models with a version field (updated_at on products and
+categories) that is the rows themselves: a detail response is keyed on its row's
+updated_at, a list on the (pk, updated_at) pairs of its page and the paginator's count
+(see get_row_version()). Writing one product then only invalidates the responses that
+show it. Other models are versioned as a whole, by a generation counter that any write
+bumps.
+
+The same key doubles as the response's ETag, and the row's updated_at or the time of
+the last bump of the models as its Last-Modified, so a client revalidating with
+If-None-Match or If-Modified-Since gets a 304 without the response being built or even
+looked up. Row-versioned lists have no Last-Modified: a row leaving the page can't move
+it forward.
+
+The generation and modified-time counters are kept in RESPONSE_CACHE_COUNTERS_ALIAS,
+which must be shared by every worker process: in a process-local cache a write only
+moves the counters of the process that made it, and the others keep answering 304 to
+the old ETag for good. It is the 'shared' database cache by default, whose table a
+migration creates; check_counter_cache() warns on `check --deploy` if it is pointed at
+a local-memory cache. The cached bodies may stay process-local, since their keys are
+built from the shared counters.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def get_response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def get_counter_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_COUNTERS_ALIAS', getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default'))]
+
+
+@register(Tags.caches, deploy=True)
+def check_counter_cache(app_configs, **kwargs):
+    if not isinstance(get_counter_cache(), LocMemCache):
+        return []
+    return [Warning(
+        'The response cache counters are kept in a process-local LocMemCache.',
+        hint=(
+            'With more than one worker process, writes only invalidate the cached responses and '
+            'ETags of the worker that made them. Point RESPONSE_CACHE_COUNTERS_ALIAS at a cache '
+            "shared by the workers, such as the 'shared' database cache."
+        ),
+        id='ecommerce_api.W001',
+    )]
+
+
+async def acall(cache, method, *args, **kwargs):
+    """
+    Calls a cache method from the event loop: directly on the local-memory cache,
+    which never blocks, and through the async API (a worker thread) on the others,
+    which read files or query the database.
+    """
+    if isinstance(cache, LocMemCache):
+        return getattr(cache, method)(*args, **kwargs)
+    return await getattr(cache, 'a' + method)(*args, **kwargs)
+
+
+class CacheStats:
+    """
+    Process-local hit/miss counters for the response cache.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+
+stats = CacheStats()
+
+
+def generation_key(model):
+    return f'generation:{model._meta.label_lower}'
+
+
+def modified_key(model):
+    return f'modified:{model._meta.label_lower}'
+
+
+def get_counters(starts):
+    """
+    Returns the values of the counters, given as a dict of their keys to their start
+    functions, in one cache lookup.
+    A missing counter (never set, or evicted) restarts from start(), the clock, so it
+    can't fall back to a value that older cached responses were keyed on.
+    """
+    cache = get_counter_cache()
+    values = cache.get_many(list(starts))
+    missing = [key for key in starts if key not in values]
+    if missing:
+        for key in missing:
+            cache.add(key, starts[key](), timeout=None)
+        values.update(cache.get_many(missing))  # What another worker may have added first
+    return [values[key] for key in starts]
+
+
+async def aget_counters(starts):
+    cache = get_counter_cache()
+    values = await acall(cache, 'get_many', list(starts))
+    missing = [key for key in starts if key not in values]
+    if missing:
+        for key in missing:
+            await acall(cache, 'add', key, starts[key](), timeout=None)
+        values.update(await acall(cache, 'get_many', missing))
+    return [values[key] for key in starts]
+
+
+def counter_starts(models):
+    starts = {generation_key(model): time.time_ns for model in models}
+    starts.update({modified_key(model): time.time for model in models})
+    return starts
+
+
+def get_generations(models):
+    """
+    Returns the current generation of each model.
+    """
+    return get_counters({generation_key(model): time.time_ns for model in models})
+
+
+def get_model_counters(models):
+    """
+    Returns the current generation of each model and when one of them was last written,
+    as a timestamp.
+    """
+    values = get_counters(counter_starts(models))
+    return values[:len(models)], max(values[len(models):])
+
+
+async def aget_model_counters(models):
+    values = await aget_counters(counter_starts(models))
+    return values[:len(models)], max(values[len(models):])
+
+
+def version_of(value):
+    return hashlib.md5(repr(value).encode('utf-8')).hexdigest()
+
+
+def get_object_version(queryset, pk, field):
+    """
+    Returns the version and Last-Modified of a detail response: the row's version field
+    (None when there is no such row).
+    """
+    try:
+        value = queryset.filter(pk=pk).values_list(field, flat=True).first()
+    except (TypeError, ValueError, ValidationError):
+        value = None
+    return version_of(value), value and value.timestamp()
+
+
+async def aget_object_version(queryset, pk, field):
+    try:
+        value = await queryset.filter(pk=pk).values_list(field, flat=True).afirst()
+    except (TypeError, ValueError, ValidationError):
+        value = None
+    return version_of(value), value and value.timestamp()
+
+
+def get_page_version(queryset, field, paginator, request, view):
+    """
+    Returns the version and Last-Modified (None) of a list response: a digest of the
+    (pk, version field) rows of its page and of the paginator's state, which changes when
+    a row on the page is written, added or removed.
+    """
+    rows = queryset.values_list('pk', field)
+    page = None if paginator is None else paginator.paginate_queryset(rows, request, view=view)
+    if page is None:
+        return version_of(list(rows)), None
+    return version_of((page, paginator.get_page_state())), None
+
+
+async def aget_page_version(queryset, field, paginator, request, view):
+    rows = queryset.values_list('pk', field)
+    page = None if paginator is None else await paginator.apaginate_queryset(rows, request, view=view)
+    if page is None:
+        return version_of([row async for row in rows]), None
+    return version_of((page, paginator.get_page_state())), None
+
+
+def _bump(models):
+    cache = get_counter_cache()
+    for model in models:
+        key = generation_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+    cache.set_many({modified_key(model): time.time() for model in models}, timeout=None)
+
+
+def bump_generation(*models):
+    """
+    Invalidates every cached response built from the given models.
+    Bumps now and again on commit, so a read that raced the transaction can't
+    leave the pre-commit data cached under the new generation.
+    """
+    _bump(models)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(models))
+
+
+class CachedResponseMixin:
+    """
+    Viewset mixin that serves list and retrieve (and any action wrapped with
+    cached_response) from the response cache, with ETag and Last-Modified validators.
+    Only the response data is cached, so content negotiation still applies.
+    Responses are versioned by the version_field of their rows when it is set, else by
+    the generations of cache_models.
+    """
+    cache_models = ()
+    version_field = None
+    cache_timeout = 300
+    cache_ignored_params = ('format',)
+
+    def get_cache_models(self):
+        """
+        Returns the models the response is built from, whose writes invalidate it.
+        """
+        return self.cache_models
+
+    def get_cache_ignored_params(self):
+        """
+        Returns the query parameters that don't change the response, left out of the key.
+        """
+        return self.cache_ignored_params
+
+    def get_response_cache_key(self, request, version=None):
+        """
+        Returns the cache key of the request, built from the version of what it shows:
+        the current generations of its models unless given.
+        """
+        ignored = self.get_cache_ignored_params()
+        params = sorted(
+            (key, sorted(request.query_params.getlist(key)))
+            for key in request.query_params
+            if key not in ignored
+        )
+        if version is None:
+            version = get_generations(self.get_cache_models())
+        raw = f'{version}|{request.get_host()}|{request.path}|{params}'
+        return 'response:' + hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        """
+        Returns the cached response for this request, or calls the handler and caches its result.
+        Answers 304 Not Modified when the client's copy is still current.
+        """
+        if request.method not in ('GET', 'HEAD'):
+            return handler(request, *args, **kwargs)
+        key, validators = self.get_validators(request)
+        not_modified = self.get_not_modified(request, validators)
+        if not_modified is not None:
+            return not_modified
+        cached = self.get_cached(key)
+        if cached is not None:
+            return self.set_validators(Response(cached), validators)
+        response = handler(request, *args, **kwargs)
+        self.set_cached(key, response)
+        return self.set_validators(response, validators)
+
+    async def acached_response(self, request, handler, *args, **kwargs):
+        """
+        Async counterpart of cached_response, for the async read views. The cache is
+        used through acall(), so only a cache that can block is reached from a thread.
+        """
+        key, validators = await self.aget_validators(request, *args, **kwargs)
+        not_modified = self.get_not_modified(request, validators)
+        if not_modified is not None:
+            return not_modified
+        cached = await acall(get_response_cache(), 'get', key)
+        stats.record(hit=cached is not None)
+        if cached is not None:
+            return self.set_validators(Response(cached), validators)
+        response = await handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            await acall(get_response_cache(), 'set', key, response.data, self.cache_timeout)
+        return self.set_validators(response, validators)
+
+    def get_row_version(self, request):
+        """
+        Returns the version and Last-Modified (or None) of the rows behind a list or
+        retrieve response, or None when the response is versioned by the generations of
+        its models: without a version_field, and for other actions unless overridden.
+        """
+        if self.version_field is None or self.action not in ('list', 'retrieve'):
+            return None
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == 'retrieve':
+            return get_object_version(queryset, self.kwargs[self.lookup_url_kwarg or self.lookup_field], self.version_field)
+        return get_page_version(queryset, self.version_field, self.paginator, request, self)
+
+    async def aget_row_version(self, request, *args, **kwargs):
+        return None
+
+    def get_validators(self, request):
+        """
+        Returns the cache key of the request and its (ETag, Last-Modified) validators.
+        """
+        version = self.get_row_version(request)
+        if version is None:
+            version = get_model_counters(self.get_cache_models())
+        key = self.get_response_cache_key(request, version[0])
+        return key, self.build_validators(request, key, version[1])
+
+    async def aget_validators(self, request, *args, **kwargs):
+        version = await self.aget_row_version(request, *args, **kwargs)
+        if version is None:
+            version = await aget_model_counters(self.get_cache_models())
+        key = self.get_response_cache_key(request, version[0])
+        return key, self.build_validators(request, key, version[1])
+
+    def build_validators(self, request, key, last_modified):
+        # The rendered body also depends on the negotiated format
+        media_type = getattr(request, 'accepted_media_type', '')
+        etag = 'W/"%s"' % hashlib.md5(f'{key}|{media_type}'.encode('utf-8')).hexdigest()
+        # HTTP dates have whole seconds: round up, and leave the header out until that
+        # second is over, so a write later in the same second can't hide behind it
+        if last_modified is not None:
+            last_modified = math.ceil(last_modified)
+            if last_modified > time.time():
+                last_modified = None
+        return etag, last_modified
+
+    def get_not_modified(self, request, validators):
+        """
+        Returns the 304 (or 412) response for a conditional request the validators
+        satisfy, or None when the response has to be sent.
+        """
+        etag, last_modified = validators
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            return None
+        return self.set_validators(Response(status=response.status_code), validators)
+
+    def set_validators(self, response, validators):
+        if response.status_code in (200, 304):
+            etag, last_modified = validators
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, no_cache=True)  # Clients may keep it, but revalidate before use
+        return response
+
+    def get_cached(self, key):
+        cached = get_response_cache().get(key)
+        stats.record(hit=cached is not None)
+        return cached
+
+    def set_cached(self, key, response):
+        if response.status_code == 200:
+            get_response_cache().set(key, response.data, self.cache_timeout)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
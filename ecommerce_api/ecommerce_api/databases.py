@@ -0,0 +1,124 @@
+"""
+Database profiles, chosen with the DATABASE_PROFILE environment variable.
+
+sqlite (the default) tunes SQLite for serving: WAL, so readers don't wait for the
+writer and the writer doesn't wait for readers; synchronous=NORMAL, which with WAL
+can lose the last commits on power loss but never corrupts the file; a bigger page
+cache and memory-mapped reads; a busy timeout instead of failing at once when another
+connection writes; write transactions that take the lock when they start, so two of
+them can't deadlock upgrading a read lock; and connections kept open between requests.
+
+sqlite-rollback is Django's default SQLite configuration, kept to compare against
+(see the benchmark_db command).
+
+postgres reads its connection from POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD,
+POSTGRES_HOST and POSTGRES_PORT. With psycopg_pool installed, connections come from a
+pool of POSTGRES_POOL_MIN_SIZE to POSTGRES_POOL_MAX_SIZE connections, each checked
+before it is handed out; without it, each worker keeps its connection for
+CONN_MAX_AGE seconds, checked at the start of every request.
+"""
+import os
+from importlib.util import find_spec
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,  # KiB, so 64 MB per connection
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+SQLITE_BUSY_TIMEOUT = 20  # Seconds a connection waits for the write lock before "database is locked"
+CONN_MAX_AGE = 600
+
+
+def sqlite_profile(base_dir, env):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env.get('SQLITE_PATH', base_dir / 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(f'PRAGMA {name} = {value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
+    }
+
+
+def sqlite_rollback_profile(base_dir, env):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env.get('SQLITE_PATH', base_dir / 'db.sqlite3'),
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode = DELETE',  # Undoes WAL, which is stored in the file
+        },
+    }
+
+
+def postgres_profile(base_dir, env):
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': env.get('POSTGRES_DB', 'ecommerce'),
+        'USER': env.get('POSTGRES_USER', 'ecommerce'),
+        'PASSWORD': env.get('POSTGRES_PASSWORD', ''),
+        'HOST': env.get('POSTGRES_HOST', 'localhost'),
+        'PORT': env.get('POSTGRES_PORT', '5432'),
+        'OPTIONS': {},
+    }
+    if find_spec('psycopg_pool') is not None:
+        from psycopg_pool import ConnectionPool
+
+        # Django returns pooled connections to the pool after each request, so CONN_MAX_AGE stays 0
+        database['OPTIONS']['pool'] = {
+            'min_size': int(env.get('POSTGRES_POOL_MIN_SIZE', 2)),
+            'max_size': int(env.get('POSTGRES_POOL_MAX_SIZE', 10)),
+            'timeout': 10,  # Seconds a request waits for a free connection
+            'check': ConnectionPool.check_connection,
+        }
+    else:
+        database['CONN_MAX_AGE'] = CONN_MAX_AGE
+        database['CONN_HEALTH_CHECKS'] = True
+    return database
+
+
+PROFILES = {
+    'sqlite': sqlite_profile,
+    'sqlite-rollback': sqlite_rollback_profile,
+    'postgres': postgres_profile,
+}
+
+
+def get_replicas(primary, env):
+    """
+    Returns the settings of the read replicas: the comma-separated SQLITE_REPLICA_PATHS
+    for SQLite (copies of the primary, see the sync_replica command), or
+    POSTGRES_REPLICA_HOSTS for PostgreSQL.
+    """
+    if primary['ENGINE'] == 'django.db.backends.sqlite3':
+        key, variable = 'NAME', 'SQLITE_REPLICA_PATHS'
+    else:
+        key, variable = 'HOST', 'POSTGRES_REPLICA_HOSTS'
+    values = [value.strip() for value in env.get(variable, '').split(',') if value.strip()]
+    return [
+        # Tests run against the primary's test database instead of creating one per replica
+        {**primary, key: value, 'TEST': {'MIRROR': 'default'}}
+        for value in values
+    ]
+
+
+def get_databases(base_dir, env=os.environ):
+    """
+    Returns the DATABASES setting of the profile named by DATABASE_PROFILE: the
+    primary as 'default', and its read replicas, if any, as 'replica1', 'replica2'...
+    """
+    name = env.get('DATABASE_PROFILE', 'sqlite')
+    if name not in PROFILES:
+        raise ImproperlyConfigured(f"Unknown DATABASE_PROFILE {name!r}; use one of {', '.join(PROFILES)}.")
+    primary = PROFILES[name](base_dir, env)
+    databases = {'default': primary}
+    for number, replica in enumerate(get_replicas(primary, env), start=1):
+        databases[f'replica{number}'] = replica
+    return databases
@@ -0,0 +1,103 @@
+"""
+Read-only serialization fast path for list endpoints.
+
+A ModelSerializer builds a model instance per row and walks its field objects for
+each one. ValuesSerializer compiles a serializer class once into the list of columns
+to fetch with values_list() and the DRF field converters to apply to them, then turns
+each fetched tuple into the same dict the serializer would have produced.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import fields as drf_fields
+from rest_framework import relations
+from rest_framework.response import Response
+
+
+# Fields whose to_representation returns the database value unchanged, so it can be skipped
+PASSTHROUGH_FIELDS = (drf_fields.ReadOnlyField, drf_fields.IntegerField, drf_fields.BooleanField)
+
+
+def is_passthrough(field):
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        return field.pk_field is None  # values_list() already returns the raw key
+    if type(field) is drf_fields.CharField:
+        return True  # Not its subclasses (URLField, EmailField...) which may differ in future versions
+    return isinstance(field, PASSTHROUGH_FIELDS) and not isinstance(field, drf_fields.ChoiceField)
+
+
+class ValuesSerializer:
+    """
+    Serializes values_list() rows with the readable fields of a serializer class.
+    Supports plain model fields, primary key relations and dotted sources; fields that
+    need the instance (method fields, nested serializers...) raise ImproperlyConfigured.
+    """
+    _compiled = {}
+
+    def __init__(self, serializer_class):
+        readable = [field for field in serializer_class().fields.values() if not field.write_only]
+        self.names = [field.field_name for field in readable]
+        self.lookups = []
+        self.converters = []
+        for index, field in enumerate(readable):
+            if isinstance(field, (drf_fields.SerializerMethodField, relations.ManyRelatedField)) or hasattr(field, 'fields') \
+                    or (isinstance(field, relations.RelatedField) and not isinstance(field, relations.PrimaryKeyRelatedField)) \
+                    or field.source == '*':
+                raise ImproperlyConfigured(f'{serializer_class.__name__}.{field.field_name} cannot be read from values_list().')
+            self.lookups.append(field.source.replace('.', '__'))
+            if not is_passthrough(field):
+                self.converters.append((index, field.to_representation))
+
+    @classmethod
+    def for_serializer(cls, serializer_class):
+        """
+        Returns the compiled ValuesSerializer of a serializer class, building it once.
+        """
+        compiled = cls._compiled.get(serializer_class)
+        if compiled is None:
+            compiled = cls._compiled[serializer_class] = cls(serializer_class)
+        return compiled
+
+    def rows(self, queryset, extra=()):
+        """
+        Returns the queryset as named tuples of the needed columns, followed by the extra
+        ones (annotations a paginator keys on, left out of the output).
+        The tuples carry the field names, so keyset pagination can read its keys from them.
+        """
+        return queryset.values_list(*self.lookups, *extra, named=True)
+
+    def to_representation(self, rows):
+        names = self.names
+        converters = self.converters
+        data = []
+        for row in rows:
+            if converters:
+                row = list(row)
+                for index, convert in converters:
+                    value = row[index]
+                    if value is not None:  # Serializers output None as is
+                        row[index] = convert(value)
+            data.append(dict(zip(names, row)))  # Stops before any extra columns
+        return data
+
+
+class ValuesListMixin:
+    """
+    Viewset mixin that serves list() through ValuesSerializer, with the same filters,
+    pagination and output as the regular list.
+    """
+    def get_values_serializer(self):
+        return ValuesSerializer.for_serializer(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        return self.list_values(self.filter_queryset(self.get_queryset()))
+
+    def list_values(self, queryset, extra=()):
+        """
+        Returns the (paginated) response for a queryset of model instances, fetching the
+        extra columns too for the paginator.
+        """
+        serializer = self.get_values_serializer()
+        rows = serializer.rows(queryset, extra)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(rows))
@@ -0,0 +1,305 @@
+"""
+Per-route request metrics: latency histograms, SQL query counts and SQL time.
+
+MetricsMiddleware times every request and counts its queries with a database
+execute wrapper (no DEBUG cursor needed), in sync and async views alike, records
+them under the route the request resolved to, and reports them in a Server-Timing
+header to staff (see SERVER_TIMING). A streaming response is recorded once it is closed, with the queries run while
+its content was iterated. The counters are process-local and exported in the Prometheus
+text format by MetricsView.
+"""
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.functional import SimpleLazyObject, empty
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+DEFAULTS = {
+    'SERVER_TIMING': 'staff',  # Whom the Server-Timing header is sent to: True (everyone), 'staff' (and everyone under DEBUG) or False
+    'QUERY_BUDGET': None,  # Queries per request before a request is logged as over budget
+    'LATENCY_BUDGET_MS': None,
+    'LOG_SAMPLE_RATE': 1.0,  # Share of over-budget requests that are logged
+}
+
+
+def get_metrics_settings():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_METRICS', {})}
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus layout.
+    """
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class RouteStats:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+
+
+class RequestMetrics:
+    """
+    Thread-safe registry of RouteStats keyed on (route, method, status class).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def record(self, route, method, status, seconds, queries, db_seconds):
+        key = (route, method, f'{status // 100}xx')
+        with self.lock:
+            stats = self.routes.get(key)
+            if stats is None:
+                stats = self.routes[key] = RouteStats()
+            stats.latency.observe(seconds)
+            stats.queries.observe(queries)
+            stats.db_seconds += db_seconds
+
+    def clear(self):
+        with self.lock:
+            self.routes = {}
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+
+        def histogram(name, help, attr):
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, stats in items:
+                data = getattr(stats, attr)
+                for bound, count in data.cumulative():
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {data.count}')
+                lines.append(f'{name}_sum{{{labels}}} {data.sum}')
+                lines.append(f'{name}_count{{{labels}}} {data.count}')
+
+        with self.lock:
+            items = [
+                (f'route="{escape(route)}",method="{method}",status="{status}"', stats)
+                for (route, method, status), stats in sorted(self.routes.items())
+            ]
+            histogram('http_request_duration_seconds', 'Request latency by route.', 'latency')
+            histogram('http_request_db_queries', 'SQL queries per request by route.', 'queries')
+            lines.append('# HELP http_request_db_seconds_total Time spent in SQL by route.')
+            lines.append('# TYPE http_request_db_seconds_total counter')
+            for labels, stats in items:
+                lines.append(f'http_request_db_seconds_total{{{labels}}} {stats.db_seconds}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = RequestMetrics()
+
+
+def escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def is_staff_request(request):
+    """
+    Whether the request was authenticated as a staff user. Never looks the user up
+    itself, so requests no view authenticated count as anonymous.
+    """
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return False
+    return bool(user and user.is_staff)
+
+
+def sends_server_timing(options, request):
+    audience = options['SERVER_TIMING']
+    if audience == 'staff':
+        return settings.DEBUG or is_staff_request(request)
+    return bool(audience)
+
+
+def get_route(request):
+    """
+    Names the route a request resolved to: router basename and viewset action
+    (e.g. product.search), the URL name for other views, or "unmatched".
+    Raw paths are never used, so the number of series stays bounded.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    actions = getattr(match.func, 'actions', None)
+    basename = getattr(match.func, 'initkwargs', {}).get('basename')
+    if actions and basename:
+        return f"{basename}.{actions.get(request.method.lower(), request.method.lower())}"
+    return match.view_name or 'unmatched'
+
+
+class QueryCounter:
+    """
+    Counts the queries of one request and the time spent running them.
+    """
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# The counter of the request being handled. Context variables follow the request into
+# the threads sync_to_async runs the async ORM on, where a per-request execute
+# wrapper on the event loop thread's connection would never see the queries.
+current_counter = ContextVar('current_counter', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed once on every connection; counts into the current request's counter.
+    """
+    counter = current_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counter.seconds += time.perf_counter() - started
+        counter.count += 1
+
+
+def install_query_counter(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+connection_created.connect(install_query_counter)
+
+
+class CountedStream:
+    """
+    Iterates the content of a streaming response with the request's query counter
+    current, and calls on_close once when the response is closed.
+    """
+    def __init__(self, content, counter, on_close):
+        self.iterator = iter(content)
+        self.counter = counter
+        self.on_close = on_close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        token = current_counter.set(self.counter)
+        try:
+            return next(self.iterator)
+        finally:
+            current_counter.reset(token)
+
+    def close(self):
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+
+
+class MetricsMiddleware:
+    """
+    Records latency, query count and SQL time of every request under its route.
+    Should be first in MIDDLEWARE so the timings cover the whole stack.
+    Sync streaming responses are recorded when closed, so their latency and queries
+    include the streaming; their Server-Timing header, sent first, covers the view only.
+    Async streaming responses are recorded when the view returns.
+    Runs natively in both sync and async stacks, so it never forces async views onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for connection in connections.all():
+            install_query_counter(connection)  # Connections opened before this module was imported
+        counter = QueryCounter()
+        token = current_counter.set(counter)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_counter.reset(token)
+        return self.finish(request, response, started, counter)
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        token = current_counter.set(counter)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_counter.reset(token)
+        return self.finish(request, response, started, counter)
+
+    def finish(self, request, response, started, counter):
+        options = get_metrics_settings()
+        if sends_server_timing(options, request):
+            seconds = time.perf_counter() - started
+            response['Server-Timing'] = (
+                f'app;dur={seconds * 1000:.1f}, db;dur={counter.seconds * 1000:.1f};desc="{counter.count} queries"'
+            )
+        if response.streaming and not response.is_async:
+            response.streaming_content = CountedStream(
+                response.streaming_content, counter, lambda: self.record(options, request, response, started, counter)
+            )
+        else:
+            self.record(options, request, response, started, counter)
+        return response
+
+    def record(self, options, request, response, started, counter):
+        seconds = time.perf_counter() - started
+        route = get_route(request)
+        metrics.record(route, request.method, response.status_code, seconds, counter.count, counter.seconds)
+        self.check_budget(options, request, route, response, seconds, counter)
+
+    def check_budget(self, options, request, route, response, seconds, counter):
+        query_budget = options['QUERY_BUDGET']
+        latency_budget = options['LATENCY_BUDGET_MS']
+        over = (
+            (query_budget is not None and counter.count > query_budget)
+            or (latency_budget is not None and seconds * 1000 > latency_budget)
+        )
+        if over and random.random() < options['LOG_SAMPLE_RATE']:
+            logger.warning(
+                'Request over budget: %s %s (%s) -> %s in %.1f ms with %d queries (%.1f ms SQL)',
+                request.method, request.path, route, response.status_code,
+                seconds * 1000, counter.count, counter.seconds * 1000,
+            )
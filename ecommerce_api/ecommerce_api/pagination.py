@@ -1,4 +1,15 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
 
 class ProductPagination(PageNumberPagination):
     """
@@ -6,4 +17,235 @@ class ProductPagination(PageNumberPagination):
     """
     page_size = 10  # Number of items per page
     page_size_query_param = 'page_size'  # Allows clients to override the page size using this query parameter
-    max_page_size = 100  # Maximum number of items that can be requested per page
\ No newline at end of file
+    max_page_size = 100  # Maximum number of items that can be requested per page
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async counterpart of paginate_queryset, for the async read views.
+        The count and the page are fetched with the async ORM.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()  # Fills the cached property before the paginator needs it
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        return self.page.object_list
+
+    def get_page_state(self):
+        """
+        Returns what the paginated response shows besides the rows of the page: the count,
+        from which the links follow.
+        """
+        return self.page.paginator.count
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over a fixed set of orderings.
+
+    Every ordering is a (field, 'id') pair, so the position of a row is unique and
+    the next page is fetched with a WHERE on that pair instead of an OFFSET.
+    No COUNT(*) is run, which keeps the cost of a page the same however deep the client is.
+    The cursors handed back to clients are opaque base64 tokens.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    invalid_cursor_message = 'Invalid cursor'
+
+    # Maps the public ordering name to the model field and direction of the keyset.
+    orderings = {}
+    default_ordering = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async counterpart of paginate_queryset, for the async read views.
+        """
+        return self.set_page([obj async for obj in self.get_page_queryset(queryset, request)])
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Returns the query for the requested page, with one extra row to tell whether there is more.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering_name = self.get_ordering_name(request)
+        field, descending = self.orderings[self.ordering_name]
+        self.field = field
+
+        self.cursor = self.decode_cursor(request)
+        self.reverse = self.cursor is not None and self.cursor['r']
+
+        # Walking backwards means flipping the sort and reversing the page afterwards.
+        scan_descending = descending != self.reverse
+        prefix = '-' if scan_descending else ''
+        queryset = queryset.order_by(f'{prefix}{field}', f'{prefix}id')
+
+        if self.cursor is not None:
+            value, pk = self.cursor['p']
+            lookup = 'lt' if scan_descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': pk})
+            )
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        return self.page
+
+    def get_page_state(self):
+        """
+        Returns what the paginated response shows besides the rows of the page: whether
+        there are pages after and before it.
+        """
+        return self.has_next, self.has_previous
+
+    def get_page_size(self, request):
+        """
+        Returns the requested page size, capped at max_page_size, or the default when
+        it is missing or not a positive whole number.
+        """
+        if self.page_size_query_param:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+            except (KeyError, ValueError):
+                return self.page_size
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        return self.page_size
+
+    def get_ordering_name(self, request):
+        """
+        Returns the requested ordering, or the default when there is none.
+        Orderings without a keyset are rejected rather than silently replaced.
+        """
+        ordering = request.query_params.get(self.ordering_query_param)
+        if not ordering:
+            return self.default_ordering
+        if ordering not in self.orderings:
+            raise ValidationError({
+                self.ordering_query_param: f"Cursor pagination supports ordering by {', '.join(self.orderings)} only."
+            })
+        return ordering
+
+    def decode_cursor(self, request):
+        """
+        Decodes the cursor from the request, or returns None on the first page.
+        A cursor is only valid for the ordering it was issued for.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if cursor['o'] != self.ordering_name or len(cursor['p']) != 2:
+                raise ValueError
+            cursor['r'] = bool(cursor['r'])
+        except (TypeError, KeyError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, instance, reverse):
+        """
+        Returns a URL pointing at the page after (or before, if reverse) the given row.
+        """
+        value = getattr(instance, self.field)
+        position = [value.isoformat() if hasattr(value, 'isoformat') else str(value), instance.id]
+        payload = json.dumps({'o': self.ordering_name, 'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Nothing left when walking backwards; restart from the first page.
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ProductCursorPagination(KeysetPagination):
+    """
+    Opt-in cursor pagination for products.
+    Newest first by default, or by price or rating with ?ordering=price / -price / avg_rating / -avg_rating.
+    """
+    orderings = {
+        '-created_date': ('created_date', True),
+        'created_date': ('created_date', False),
+        'price': ('price', False),
+        '-price': ('price', True),
+        'avg_rating': ('avg_rating', False),
+        '-avg_rating': ('avg_rating', True),
+    }
+    default_ordering = '-created_date'
+
+
+class ProductSearchCursorPagination(ProductCursorPagination):
+    """
+    Cursor pagination for product search: best match first by default, keyed on the
+    search_rank annotation, or any ordering of ProductCursorPagination.
+    """
+    orderings = {
+        'search_rank': ('search_rank', False),
+        **ProductCursorPagination.orderings,
+    }
+    default_ordering = 'search_rank'
+
+
+class ReviewCursorPagination(KeysetPagination):
+    """
+    Cursor pagination for a product's reviews, newest first by default or oldest first with ?ordering=created_at.
+    """
+    page_size = 20
+    orderings = {
+        '-created_at': ('created_at', True),
+        'created_at': ('created_at', False),
+    }
+    default_ordering = '-created_at'
@@ -0,0 +1,67 @@
+"""
+Faster renderers for the API: JSON through orjson and MessagePack for internal services.
+
+Both fall back on DRF's JSONEncoder for the types they don't handle natively (lazy
+translation strings, Decimals, datetimes...), so a payload renders to the same values
+as with DRF's JSONRenderer. orjson and msgpack are optional: ORJSONRenderer renders with
+the standard library when orjson isn't installed, and the MessagePack classes are only
+enabled in settings when msgpack is.
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes compact output with orjson, byte-for-byte like JSONRenderer
+    for the data our serializers produce. Indented output (the browsable API,
+    ?format=json with "; indent=") and non-default JSON settings use JSONRenderer.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if (
+            orjson is None or data is None or not self.compact or self.ensure_ascii or not self.strict
+            or self.get_indent(accepted_media_type, renderer_context) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                # Datetimes go through the encoder too, which writes UTC as "Z" where orjson would write +00:00
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)  # e.g. integers over 64 bits
+        # Escaped like JSONRenderer does, so the output stays a strict JavaScript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renders MessagePack (application/msgpack, ?format=msgpack). Values that have no
+    MessagePack type are converted like in JSON responses: Decimals to numbers,
+    datetimes to ISO 8601 strings.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    encoder_class = encoders.JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self.encoder_class().default, use_bin_type=True, datetime=False)
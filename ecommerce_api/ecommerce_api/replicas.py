@@ -0,0 +1,105 @@
+"""
+Read replicas.
+
+PrimaryReplicaRouter sends every write to the primary ('default') and reads to the
+primary too, except while a view with ReplicaRoutingMixin handles a safe-method
+request: then reads go to one of the DATABASE_REPLICAS aliases, chosen at random.
+
+A replica lags the primary, so a user who just wrote could read their own write back
+stale. ReplicaRoutingMixin pins the user to the primary for DATABASE_REPLICA_PIN_SECONDS
+after every successful write request, which should exceed the replication lag. Pins
+are kept in the default cache: to hold across worker processes it has to be shared,
+like the response cache. Responses filled from a replica into the response cache can
+be as stale as the replica was.
+"""
+import random
+import sqlite3
+from contextlib import closing, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+
+
+DEFAULT_PIN_SECONDS = 5
+
+use_replica = ContextVar('use_replica', default=False)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if use_replica.get() and replicas and model._meta.app_label != 'django_cache':  # Database cache entries are written on the primary
+            return random.choice(replicas)
+        return None  # The primary, or the database of the instance hint
+
+    def db_for_write(self, model, **hints):
+        return 'default'  # Also for instances read from a replica
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+@contextmanager
+def replica_reads():
+    """
+    Sends the reads made in the block to a replica.
+    """
+    token = use_replica.set(True)
+    try:
+        yield
+    finally:
+        use_replica.reset(token)
+
+
+def pin_key(user):
+    return f'replica-pin:{user.pk}'
+
+
+def pin_to_primary(user):
+    timeout = getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', DEFAULT_PIN_SECONDS)
+    caches['default'].set(pin_key(user), True, timeout)
+
+
+def is_pinned(user):
+    return bool(user and user.is_authenticated and caches['default'].get(pin_key(user)))
+
+
+class ReplicaRoutingMixin:
+    """
+    View mixin that reads from a replica for safe-method requests, unless the user
+    wrote recently, and pins the user to the primary after a successful write.
+    Set replica_reads = False to only pin.
+    """
+    replica_reads = True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)  # Authenticates, so is_pinned() sees the user
+        if self.replica_reads and get_replicas() and request.method in SAFE_METHODS and not is_pinned(request.user):
+            self.replica_token = use_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, 'replica_token', None)
+        if token is not None:
+            use_replica.reset(token)
+            self.replica_token = None
+        if request.method not in SAFE_METHODS and response.status_code < 400 and request.user.is_authenticated:
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def copy_database(source, target):
+    """
+    Copies the SQLite database file source over target with the online backup API,
+    consistently even while source is being written.
+    """
+    with closing(sqlite3.connect(source)) as primary, closing(sqlite3.connect(target, timeout=20)) as replica:
+        primary.backup(replica)
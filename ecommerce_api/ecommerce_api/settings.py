@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 
+from .databases import get_databases
+
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -46,15 +49,47 @@ INSTALLED_APPS = [
 ]
 
 
+# MessagePack (application/msgpack) is offered when the optional msgpack package is installed
+MSGPACK_ENABLED = find_spec('msgpack') is not None
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',  # Use standard TokenAuthentication
+        'users.authentication.CachedTokenAuthentication',  # TokenAuthentication with an in-process token cache
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'ecommerce_api.renderers.ORJSONRenderer',  # First, so it stays the default for clients without an Accept header
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        *(['ecommerce_api.renderers.MessagePackRenderer'] if MSGPACK_ENABLED else []),
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'ecommerce_api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        *(['ecommerce_api.parsers.MessagePackParser'] if MSGPACK_ENABLED else []),
     ],
+    # Token buckets of the views with a throttle_scope (ecommerce_api.throttling): registration
+    # and login per client IP, order and review writes per user
+    'DEFAULT_THROTTLE_RATES': {
+        'register': '5/hour',
+        'login': '10/min',
+        'orders': '30/min',
+        'reviews': '10/min',
+    },
+    'NUM_PROXIES': None,  # Set to the number of reverse proxies in front of the app, so throttles key on the client IP
+}
+
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,  # Tokens kept per worker process (LRU)
+    'TTL': 60,  # Seconds a cached token is kept
+    'REVOCATION_ALIAS': 'shared',  # Cache shared by the worker processes, checked on each hit so revocations reach all of them
 }
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 MIDDLEWARE = [
+    'ecommerce_api.metrics.MetricsMiddleware',  # First, so latency covers the whole stack
+    'ecommerce_api.compression.CompressionMiddleware',  # Before anything that reads or changes the body
+    'products.async_views.AsyncCatalogMiddleware',  # Async catalog reads under ASGI
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,8 +99,25 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Responses of at least COMPRESSION_MIN_BYTES are compressed with brotli (when the
+# optional brotli package is installed and the client accepts it) or gzip
+COMPRESSION_MIN_BYTES = 1024
+
+# Per-route latency and SQL metrics (ecommerce_api.metrics), served at /api/metrics.
+# Requests over either budget are logged as warnings, sampled at LOG_SAMPLE_RATE.
+REQUEST_METRICS = {
+    'SERVER_TIMING': 'staff',  # The header reveals query counts and SQL time: staff only, or everyone under DEBUG
+    'QUERY_BUDGET': 25,
+    'LATENCY_BUDGET_MS': 500,
+    'LOG_SAMPLE_RATE': 0.1,
+}
+
 ROOT_URLCONF = 'ecommerce_api.urls'
 
+# Under ASGI (e.g. uvicorn ecommerce_api.asgi:application), serve the catalog reads from
+# the native async views in products.async_views. No effect under WSGI.
+ASYNC_CATALOG_READS = True
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -87,14 +139,65 @@ WSGI_APPLICATION = 'ecommerce_api.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# Set DATABASE_PROFILE to sqlite (default, tuned with WAL), sqlite-rollback or postgres,
+# and SQLITE_REPLICA_PATHS or POSTGRES_REPLICA_HOSTS to add read replicas; see
+# ecommerce_api.databases for the environment variables of each.
+
+DATABASES = get_databases(BASE_DIR)
+
+# Catalog and order reads go to the replicas, and a user who writes reads from the
+# primary for DATABASE_REPLICA_PIN_SECONDS after (ecommerce_api.replicas)
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['ecommerce_api.replicas.PrimaryReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = 5
+
 
-DATABASES = {
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory per process by default. To share the response cache between worker
+# processes, switch to 'django.core.cache.backends.filebased.FileBasedCache' with a directory LOCATION.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ecommerce-api',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Shared by all the worker processes; its table is created by the products migrations
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'shared_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }
 
+RESPONSE_CACHE_ALIAS = 'default'  # Cache used by ecommerce_api.cache for catalog responses
+# Generation and modified-time counters behind the response cache keys, ETags and
+# Last-Modified headers. This must be a cache all the worker processes share, or workers
+# keep answering 304 after another one's writes; `manage.py check --deploy` warns when it
+# is process-local.
+RESPONSE_CACHE_COUNTERS_ALIAS = 'shared'
+
+# Seconds before a worker's autocomplete index (products.autocomplete) is rebuilt in the
+# background once products or categories have been written elsewhere
+AUTOCOMPLETE_MAX_AGE = 300
+
+PRODUCT_FACET_PRICE_BUCKETS = [25, 50, 100, 250, 500, 1000]  # Price boundaries of GET /api/products/facets/
+
+# Cart stock holds (products.cart): how long adding to a cart holds the stock, and how
+# many lapsed holds sweep_reservations releases per transaction
+CART_RESERVATION_TTL = 15 * 60
+CART_SWEEP_BATCH_SIZE = 500
+
+# Sales rollups (products.rollups): orders younger than this are left for the next
+# rollup_sales run, and how many order line ids it rolls up per transaction
+SALES_ROLLUP_SETTLE_SECONDS = 60
+SALES_ROLLUP_BATCH_SIZE = 10000
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -0,0 +1,98 @@
+"""
+Token-bucket throttles for the write and authentication endpoints.
+
+A view opts in with throttle_classes and a throttle_scope whose rate is set in
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], e.g. 'login': '10/min'. Every client gets a
+bucket holding that many requests, refilled continuously over the period: a burst up
+to the rate passes, a steady client is held to the rate. A bucket is one row of
+(tokens, timestamp), so a check is one statement whatever the rate, where DRF's
+SimpleRateThrottle reads and rewrites the timestamp of every request in the window.
+
+The buckets are ThrottleBucket rows, created by the users migrations and shared by all
+the worker processes. A request refills and spends its bucket with one conditional
+UPDATE, so concurrent requests from one client can't overdraw it. Idle buckets are full
+again after their period; purge_throttle_buckets deletes them. Reads (GET, HEAD,
+OPTIONS) are never throttled.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Least
+from django.db.models.lookups import GreaterThanOrEqual
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from users.models import ThrottleBucket
+
+
+class ScopedIPThrottle(SimpleRateThrottle):
+    """
+    Limits the unsafe requests to views with a throttle_scope, per client IP address
+    (X-Forwarded-For is trusted for NUM_PROXIES hops). A scope without a rate isn't throttled.
+    """
+    scope_attr = 'throttle_scope'
+
+    def __init__(self):
+        pass  # The rate depends on the view, see allow_request()
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_ident_key(self, request):
+        return f'ip-{self.get_ident(request)}'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident_key(request)}
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        self.scope = getattr(view, self.scope_attr, None)
+        self.rate = self.get_rate() if self.scope else None
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        refill = self.num_requests / self.duration  # Requests per second
+        key = self.get_cache_key(request, view)
+        bucket = ThrottleBucket.objects.filter(key=key)
+        now = self.timer()
+        tokens = Least(Value(float(self.num_requests)), F('tokens') + (Value(now) - F('updated')) * Value(refill))
+        while True:
+            # Refills the bucket and takes a request from it in one statement, if one is left
+            if bucket.filter(GreaterThanOrEqual(tokens, 1)).update(tokens=tokens - 1, updated=Value(now)):
+                return True
+            state = bucket.values_list('tokens', 'updated').first()
+            if state is not None:
+                left = min(self.num_requests, state[0] + (now - state[1]) * refill)
+                self.wait_seconds = max(1 - left, 0) / refill
+                return False
+            try:
+                with transaction.atomic():
+                    ThrottleBucket.objects.create(key=key, tokens=self.num_requests - 1, updated=now)
+                return True
+            except IntegrityError:
+                pass  # Another request created the bucket first; spend from it
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class ScopedUserThrottle(ScopedIPThrottle):
+    """
+    Like ScopedIPThrottle, but per user for authenticated requests, whichever token or
+    session they come with. Anonymous requests are still limited per IP address.
+    """
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user-{request.user.pk}'
+        return super().get_ident_key(request)
+
+
+def purge_idle_buckets(now):
+    """
+    Deletes the buckets untouched for longer than the longest throttle period, which are
+    full again, as if they had never been used. Returns how many were deleted.
+    """
+    durations = [ScopedIPThrottle().parse_rate(rate)[1] for rate in api_settings.DEFAULT_THROTTLE_RATES.values() if rate]
+    deleted, _ = ThrottleBucket.objects.filter(updated__lt=now - max(durations, default=0)).delete()
+    return deleted
@@ -14,9 +14,16 @@ class ProductAdmin(admin.ModelAdmin):
     """
     Admin configuration for the Product model.
     """
-    list_display = ('name', 'category', 'price', 'stock_quantity', 'created_date')
+    list_display = ('name', 'category', 'price', 'stock_quantity', 'avg_rating', 'review_count', 'created_date')
     list_filter = ('category',)
     search_fields = ('name', 'description')
+    readonly_fields = (
+        'reserved_quantity',  # Held and released by carts (products.cart)
+        'stock_shards',  # Changed with shard_stock() (products.inventory), which creates the shards
+        # Maintained from reviews
+        'avg_rating', 'review_count',
+        'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+    )
 
 class OrderItemInline(admin.TabularInline):
     """
@@ -0,0 +1,20 @@
+from django.urls import re_path
+
+from . import urls
+from .async_views import CategoryListView, ProductDetailView, ProductListView, ProductSearchView, ReviewListView
+
+# Async views for the catalog reads, mounted on the router's own patterns and names
+# in front of the sync URLs (used under ASGI, see AsyncCatalogMiddleware).
+ASYNC_READ_VIEWS = {
+    'product-list': ProductListView,
+    'product-detail': ProductDetailView,
+    'product-search': ProductSearchView,
+    'category-list': CategoryListView,
+    'review-list': ReviewListView,
+}
+
+urlpatterns = [
+    re_path(pattern.pattern.regex.pattern, ASYNC_READ_VIEWS[pattern.name].as_view(sync_view=pattern.callback), name=pattern.name)
+    for pattern in urls.router.urls
+    if pattern.name in ASYNC_READ_VIEWS and 'format' not in pattern.pattern.regex.groupindex  # .json suffixes stay sync
+] + urls.urlpatterns
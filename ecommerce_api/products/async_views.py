@@ -0,0 +1,260 @@
+"""
+Native async read path for the catalog under ASGI.
+
+The hot read-only endpoints (product list, detail and search, category list and
+reviews by product) are served by async views that query with the async ORM and
+serialize the fetched rows in the event loop, so a GET doesn't hold a thread from the
+sync_to_async pool. They answer with the same data, cache entries and headers as the
+sync viewsets. Writes, authenticated requests and the browsable API are handed to the
+sync viewsets, which stay the only implementation of everything else.
+
+AsyncCatalogMiddleware switches ASGI requests to these views (see ASYNC_CATALOG_READS);
+under WSGI nothing changes.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.forms import ModelChoiceField
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+import django_filters
+from rest_framework.exceptions import NotAcceptable, ValidationError
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from .models import Category, Product, Review
+from .serializers import CategorySerializer, ProductSerializer, ReviewSerializer
+from .search import get_search_backend
+from .views import ProductFilter
+from ecommerce_api.cache import CachedResponseMixin, aget_object_version, aget_page_version, version_of
+from ecommerce_api.fast_serializers import ValuesSerializer
+from ecommerce_api.pagination import ProductCursorPagination, ProductPagination, ProductSearchCursorPagination
+from ecommerce_api.replicas import replica_reads
+
+
+ASYNC_URLCONF = 'ecommerce_api.asgi_urls'
+
+
+class AsyncCatalogMiddleware:
+    """
+    Routes ASGI requests through ASYNC_URLCONF, which puts the async read views in
+    front of the router, when settings.ASYNC_CATALOG_READS is on.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if isinstance(request, ASGIRequest) and getattr(settings, 'ASYNC_CATALOG_READS', False):
+            request.urlconf = ASYNC_URLCONF
+        return await self.get_response(request)
+
+
+class AsyncProductFilter(ProductFilter):
+    """
+    ProductFilter without the category lookup, which validates against the database
+    from synchronous form code; AsyncReadView.filter_products checks it instead.
+    """
+    category = django_filters.NumberFilter(field_name='category_id')
+
+
+class AsyncReadView(CachedResponseMixin, View):
+    """
+    Base class for an async GET endpoint mounted in front of a router view.
+    Anything it doesn't serve is passed on to sync_view, the router's view for the same URL.
+    """
+    sync_view = None
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+
+    @classmethod
+    def as_view(cls, sync_view, **initkwargs):
+        view = super().as_view(sync_view=sync_view, **initkwargs)
+        # Keep the router's basename and action, used to label the request metrics
+        view.initkwargs = sync_view.initkwargs
+        view.actions = sync_view.actions
+        return csrf_exempt(view)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method == 'GET' and 'HTTP_AUTHORIZATION' not in request.META:
+            drf_request = Request(request)
+            renderer = self.select_renderer(drf_request)
+            if renderer is not None:
+                return self.read(drf_request, renderer, *args, **kwargs)
+        return sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    def select_renderer(self, request):
+        """
+        Returns the negotiated renderer, or None when the response needs the sync view:
+        HTML (the browsable API) or a failed negotiation.
+        """
+        renderers = [renderer() for renderer in self.renderer_classes]
+        try:
+            renderer, media_type = DefaultContentNegotiation().select_renderer(request, renderers)
+        except NotAcceptable:
+            return None
+        if renderer.media_type == 'text/html':
+            return None
+        request.accepted_renderer, request.accepted_media_type = renderer, media_type
+        return renderer
+
+    async def read(self, request, renderer, *args, **kwargs):
+        try:
+            with replica_reads():  # Anonymous, so never pinned to the primary
+                response = await self.acached_response(request, self.get, *args, **kwargs)
+        except Exception as exc:
+            response = exception_handler(exc, {'view': self, 'request': request})
+            if response is None:
+                raise
+        return self.finalize_response(request, response, renderer, *args, **kwargs)
+
+    def finalize_response(self, request, response, renderer, *args, **kwargs):
+        """
+        Renders the DRF response into a plain HttpResponse, so Django doesn't hand the
+        deferred rendering to a thread, and adds the headers APIView would.
+        """
+        response.accepted_renderer = renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = {'view': self, 'args': args, 'kwargs': kwargs, 'request': request}
+        response.render()
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        rendered['Allow'] = self.allowed_methods
+        patch_vary_headers(rendered, ['Accept'])
+        return rendered
+
+    @property
+    def allowed_methods(self):
+        methods = set(self.sync_view.actions) | {'options'}
+        if 'get' in methods:
+            methods.add('head')
+        return ', '.join(method.upper() for method in View.http_method_names if method in methods)
+
+    def get_serializer_context(self, request):
+        return {'request': request, 'format': None, 'view': self}
+
+
+class ProductReadView(AsyncReadView):
+    cache_models = (Product, Category)  # Same cache entries as ProductViewSet
+    version_field = 'updated_at'
+    cursor_pagination_class = ProductCursorPagination
+
+    def get_paginator(self, request):
+        params = request.query_params
+        if params.get('pagination') == 'cursor' or 'cursor' in params:
+            return self.cursor_pagination_class()
+        return ProductPagination()
+
+    async def filter_products(self, request, queryset):
+        """
+        Applies ProductFilter and ?search= the way ProductViewSet's filter backends do.
+        """
+        params = request.query_params.copy()
+        errors = {}
+        category = params.get('category')
+        if category:
+            try:
+                exists = await Category.objects.filter(pk=category).aexists()
+            except (TypeError, ValueError):
+                exists = False
+            if not exists:
+                errors['category'] = [ModelChoiceField.default_error_messages['invalid_choice']]
+                del params['category']
+
+        filterset = AsyncProductFilter(params, queryset=queryset, request=request)
+        if not filterset.is_valid():
+            errors.update(filterset.errors)
+        if errors:
+            raise ValidationError(errors)
+        queryset = filterset.qs
+
+        query = request.query_params.get(api_settings.SEARCH_PARAM, '')
+        if query.strip():
+            queryset = get_search_backend().search(queryset, query)
+        return queryset
+
+    async def paginated(self, request, queryset, extra=()):
+        paginator = self.get_paginator(request)
+        serializer = ValuesSerializer.for_serializer(ProductSerializer)
+        page = await paginator.apaginate_queryset(serializer.rows(queryset, extra), request, view=self)
+        return paginator.get_paginated_response(serializer.to_representation(page))
+
+
+class ProductListView(ProductReadView):
+    async def aget_row_version(self, request):
+        queryset = await self.filter_products(request, Product.objects.all())
+        return await aget_page_version(queryset, self.version_field, self.get_paginator(request), request, self)
+
+    async def get(self, request):
+        queryset = await self.filter_products(request, Product.objects.all())
+        return await self.paginated(request, queryset)
+
+
+class ProductDetailView(ProductReadView):
+    async def aget_row_version(self, request, pk):
+        queryset = await self.filter_products(request, Product.objects.all())
+        return await aget_object_version(queryset, pk, self.version_field)
+
+    async def get(self, request, pk):
+        queryset = await self.filter_products(request, Product.objects.all())
+        try:
+            product = await queryset.aget(pk=pk)
+        except (TypeError, ValueError, Product.DoesNotExist):
+            raise Http404('No Product matches the given query.')
+        return Response(ProductSerializer(product, context=self.get_serializer_context(request)).data)
+
+
+class ProductSearchView(ProductReadView):
+    cursor_pagination_class = ProductSearchCursorPagination
+
+    async def aget_row_version(self, request):
+        query = request.query_params.get('q')
+        if not query:
+            return version_of(None), None
+        queryset = get_search_backend().search(Product.objects.all(), query)
+        return await aget_page_version(queryset, self.version_field, self.get_paginator(request), request, self)
+
+    async def get(self, request):
+        query = request.query_params.get('q')
+        if not query:
+            return Response({'message': 'Please provide a search query.'})
+        return await self.paginated(request, get_search_backend().search(Product.objects.all(), query), extra=('search_rank',))
+
+
+class CategoryListView(AsyncReadView):
+    cache_models = (Category,)
+    version_field = 'updated_at'
+
+    async def aget_row_version(self, request):
+        return await aget_page_version(Category.objects.all(), self.version_field, None, request, self)
+
+    async def get(self, request):
+        serializer = ValuesSerializer.for_serializer(CategorySerializer)
+        return Response(serializer.to_representation([row async for row in serializer.rows(Category.objects.all())]))
+
+
+class ReviewListView(AsyncReadView):
+    cache_models = (Review, User)  # Same cache entries as ReviewViewSet
+
+    async def get(self, request):
+        reviews = Review.objects.all()
+        product_id = request.query_params.get('product_id', None)
+        if product_id:
+            reviews = reviews.filter(product_id=product_id)
+        serializer = ValuesSerializer.for_serializer(ReviewSerializer)  # Joins in the username
+        return Response(serializer.to_representation([row async for row in serializer.rows(reviews)]))
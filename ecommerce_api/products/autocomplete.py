@@ -0,0 +1,366 @@
+"""
+Search-as-you-type suggestions from an in-process prefix index of product and category names.
+
+Names are normalized (lowercased, accents stripped, punctuation folded to spaces) and
+indexed at each word start, so "wire" suggests "Logitech Wireless Mouse". The index is
+a sorted array of those word-start suffixes: a trie whose paths are compressed into
+strings, kept in a few flat strings and arrays rather than an object per letter, so a
+million names fit in tens of megabytes. A prefix is located with two binary searches.
+Its best names are found by scanning its range when that holds at most SCAN_LIMIT
+entries, and were computed at build time for the few prefixes that hold more.
+Products are ranked by review count, categories by their number of products.
+
+Each worker process builds its index from the database in a background thread, started
+when the WSGI/ASGI application loads or else by the first query; until it is ready,
+queries raise NotReady (the view answers 503). Saves and deletes made in the process,
+bulk imports included, are applied on commit to a small overlay that takes precedence
+over the index. The index is rebuilt in the background, while the old one keeps
+answering, once the overlay holds OVERLAY_LIMIT names, or once it is
+AUTOCOMPLETE_MAX_AGE seconds old and products or categories were written since it was
+built (by any process: the response cache generations tell).
+"""
+import heapq
+import itertools
+import operator
+import os
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+
+from .models import Category, Product
+from .search import tokenize
+from ecommerce_api.cache import get_generations
+
+
+KINDS = ('products', 'categories')
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20  # Also how many names are kept per precomputed prefix
+SCAN_LIMIT = 256  # Entries of a prefix scanned per query; prefixes with more are precomputed
+MAX_WORD_STARTS = 8  # Words of a name it can be found by
+OVERLAY_LIMIT = 1000
+DEFAULT_MAX_AGE = 300
+END = '\U0010ffff'  # Sorts after every character of a normalized name
+
+
+def normalize(text):
+    """
+    Lowercases the text, strips accents and folds everything but letters and digits to single spaces.
+    """
+    if not text.isascii():
+        text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return ' '.join(tokenize(text))
+
+
+def join(strings):
+    """
+    Concatenates the strings into one, returning it with the offsets of each: string i
+    is joined[offsets[i]:offsets[i + 1]].
+    """
+    offsets = array('I', [0])
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    return ''.join(strings), offsets
+
+
+class PrefixIndex:
+    """
+    Immutable index of (id, name, score) items, searchable by the prefix of any word of the name.
+    """
+    def __init__(self, items):
+        self.ids, self.scores = array('q'), array('q')
+        names, texts = [], []
+        for pk, name, score in items:
+            text = normalize(name)
+            if not text:
+                continue
+            self.ids.append(pk)
+            self.scores.append(score)
+            names.append(name)
+            texts.append(text)
+        self.names, self.name_offsets = join(names)
+        self.text, self.text_offsets = join(texts)
+        del names
+
+        # Popularity order of the items, so they can be compared without building tuples
+        popularity = list(zip(self.scores, map(operator.neg, self.ids)))
+        self.ranks = array('I', bytes(4 * len(self.ids)))
+        for rank, item in enumerate(sorted(range(len(self.ids)), key=popularity.__getitem__)):
+            self.ranks[item] = rank
+        del popularity
+
+        # One entry per word start: where its suffix starts in self.text, and its item
+        starts, owners, keys = array('I'), array('I'), []
+        for item, text in enumerate(texts):
+            offset = self.text_offsets[item]
+            position = 0
+            for _ in range(MAX_WORD_STARTS):
+                starts.append(offset + position)
+                owners.append(item)
+                keys.append(text[position:])
+                position = text.find(' ', position) + 1
+                if not position:
+                    break
+        del texts
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        del keys
+        self.starts = array('I', map(starts.__getitem__, order))
+        self.owners = array('I', map(owners.__getitem__, order))
+        del starts, owners, order
+        self.entries = range(len(self.starts))
+
+        self.top = {}  # Prefix of more than SCAN_LIMIT entries: its best items, best first
+        if self.starts:
+            self.build_top(0, len(self.starts), '')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def key(self, entry):
+        return self.text[self.starts[entry]:self.text_offsets[self.owners[entry] + 1]]
+
+    def name(self, item):
+        return self.names[self.name_offsets[item]:self.name_offsets[item + 1]]
+
+    def best(self, items, limit):
+        return heapq.nlargest(limit, set(items), key=self.ranks.__getitem__)  # Most popular first, then oldest
+
+    def build_top(self, lo, hi, prefix):
+        """
+        Returns the best items of the entries lo to hi, which all start with prefix,
+        recording them in self.top when there are too many entries to scan per query.
+        Each entry is scanned once: by the first prefix of it that is few enough.
+        """
+        if hi - lo <= SCAN_LIMIT:
+            return self.best(self.owners[lo:hi], MAX_LIMIT)
+        depth = len(prefix)
+        i = bisect_left(self.entries, prefix + '\0', lo, hi, key=self.key)  # Entries that are the prefix itself come first
+        candidates = list(self.owners[lo:i])
+        while i < hi:
+            child = prefix + self.key(i)[depth]
+            j = bisect_left(self.entries, child + END, i, hi, key=self.key)
+            candidates.extend(self.build_top(i, j, child))
+            i = j
+        top = self.best(candidates, MAX_LIMIT)
+        if prefix:
+            self.top[prefix] = array('I', top)
+        return top
+
+    def search(self, prefix, limit, exclude=()):
+        """
+        Returns the best items with a word starting with the normalized prefix, leaving out the ids in exclude.
+        """
+        top = self.top.get(prefix)
+        if top is not None:
+            found = [item for item in top if self.ids[item] not in exclude]
+            if len(found) >= limit or len(found) == len(top):
+                return found[:limit]
+            # Too many of the best names were changed since the build; scan the whole range
+        lo = bisect_left(self.entries, prefix, key=self.key)
+        hi = bisect_left(self.entries, prefix + END, lo, key=self.key)
+        items = self.owners[lo:hi]
+        if exclude:
+            items = [item for item in items if self.ids[item] not in exclude]
+        return self.best(items, limit)
+
+    def memory_footprint(self):
+        """
+        Returns the bytes held by the index.
+        """
+        arrays = (self.ids, self.scores, self.ranks, self.names, self.name_offsets, self.text, self.text_offsets, self.starts, self.owners)
+        return (
+            sum(sys.getsizeof(value) for value in arrays) + sys.getsizeof(self.top)
+            + sum(sys.getsizeof(prefix) + sys.getsizeof(top) for prefix, top in self.top.items())
+        )
+
+
+def load_products():
+    return Product.objects.values_list('id', 'name', 'review_count').iterator(chunk_size=10000)
+
+
+def load_categories():
+    return Category.objects.annotate(products=Count('product')).values_list('id', 'name', 'products')
+
+
+class Autocomplete:
+    """
+    The product and category indexes of this process, and the overlay of the changes
+    made in it since they were built: id -> (sequence, ' ' + normalized name, name,
+    score), or a None name for a deleted item.
+    """
+    watched_models = (Product, Category)
+
+    def __init__(self):
+        # Read before loading, so that writes made during the load trigger a rebuild
+        self.generations = get_generations(self.watched_models)
+        self.built_at = time.monotonic()
+        self.indexes = {'products': PrefixIndex(load_products()), 'categories': PrefixIndex(load_categories())}
+        self.overlay = {kind: {} for kind in KINDS}
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        prefix = normalize(query)
+        return {kind: self.suggest_kind(kind, prefix, limit) if prefix else [] for kind in KINDS}
+
+    def suggest_kind(self, kind, prefix, limit):
+        index = self.indexes[kind]
+        overlay = self.overlay[kind]
+        found = [(index.scores[item], -index.ids[item], index.ids[item], index.name(item)) for item in index.search(prefix, limit, overlay)]
+        if overlay:
+            needle = ' ' + prefix
+            found += [
+                (score, -pk, pk, name) for pk, (_, text, name, score) in list(overlay.items())
+                if name is not None and needle in text
+            ]
+            found = heapq.nlargest(limit, found)
+        return [{'id': pk, 'name': name} for _, _, pk, name in found]
+
+    def record(self, kind, pk, name, score, sequence):
+        self.overlay[kind][pk] = (sequence, ' ' + normalize(name) if name is not None else None, name, score)
+
+    def is_stale(self):
+        if sum(len(overlay) for overlay in self.overlay.values()) >= OVERLAY_LIMIT:
+            return True
+        max_age = getattr(settings, 'AUTOCOMPLETE_MAX_AGE', DEFAULT_MAX_AGE)
+        return time.monotonic() - self.built_at > max_age and get_generations(self.watched_models) != self.generations
+
+    def memory_footprint(self):
+        return sum(index.memory_footprint() for index in self.indexes.values())
+
+
+_lock = threading.Lock()  # Held while the overlay is written, the index replaced or a build claimed
+_sequence = itertools.count()
+_autocomplete = None
+_rebuilding = False
+_pending = {kind: {} for kind in KINDS}  # What record() saw while the first index was being built
+
+
+class NotReady(Exception):
+    """
+    The first index of this process is still being built.
+    """
+
+
+def _forget_build():
+    # A build thread doesn't survive a fork (e.g. gunicorn --preload): let the child start its own
+    global _lock, _rebuilding
+    _lock = threading.Lock()
+    _rebuilding = False
+
+
+os.register_at_fork(after_in_child=_forget_build)
+
+
+def start_build():
+    """
+    Starts building a new index in a background thread, unless a build is running.
+    The old index, if any, keeps answering meanwhile.
+    """
+    global _rebuilding
+    with _lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+        since = next(_sequence)
+    threading.Thread(target=rebuild, args=(since,), daemon=True).start()
+
+
+def get_autocomplete():
+    """
+    Returns the autocomplete index of this process, starting a background rebuild when
+    it is stale. Raises NotReady, after starting the first build, if there is none yet.
+    """
+    autocomplete = _autocomplete
+    if autocomplete is None:
+        start_build()
+        raise NotReady
+    if not _rebuilding and autocomplete.is_stale():  # start_build() checks again under the lock
+        start_build()
+    return autocomplete
+
+
+def rebuild(since):
+    """
+    Replaces the index with a new one, keeping the overlay entries recorded after
+    sequence number since, which the new index may have been loaded without.
+    Runs in the build thread; start_build() has claimed the build.
+    """
+    global _autocomplete, _rebuilding
+    try:
+        fresh = Autocomplete()
+        with _lock:
+            overlay = _pending if _autocomplete is None else _autocomplete.overlay
+            for kind in KINDS:
+                fresh.overlay[kind] = {pk: entry for pk, entry in overlay[kind].items() if entry[0] > since}
+                _pending[kind] = {}
+            _autocomplete = fresh
+    finally:
+        with _lock:
+            _rebuilding = False
+        connection.close()
+
+
+def build():
+    """
+    Builds the index in the calling thread, e.g. from a management command or a test.
+    """
+    global _rebuilding
+    with _lock:
+        _rebuilding = True
+        since = next(_sequence)
+    rebuild(since)
+
+
+def suggest(query, limit=DEFAULT_LIMIT):
+    return get_autocomplete().suggest(query, limit)
+
+
+def record(kind, pk, name, score=0):
+    """
+    Applies a committed save (or, with a None name, a delete) to the index, if this
+    process has built or is building one.
+    """
+    record_many(kind, [(pk, name, score)])
+
+
+def record_many(kind, items):
+    """
+    Applies committed saves of (pk, name, score) items, such as an import batch, to the index.
+    """
+    with _lock:
+        if _autocomplete is not None:
+            for pk, name, score in items:
+                _autocomplete.record(kind, pk, name, score, next(_sequence))
+        elif _rebuilding:
+            for pk, name, score in items:
+                _pending[kind][pk] = (next(_sequence), ' ' + normalize(name) if name is not None else None, name, score)
+
+
+def reset():
+    """
+    Drops the index of this process; the next query starts building a new one.
+    """
+    global _autocomplete
+    with _lock:
+        _autocomplete = None
+        for kind in KINDS:
+            _pending[kind] = {}
+
+
+def stats():
+    """
+    Returns the size of the index of this process, or None if it hasn't been built.
+    """
+    autocomplete = _autocomplete
+    if autocomplete is None:
+        return None
+    return {
+        'names': {kind: len(index) for kind, index in autocomplete.indexes.items()},
+        'overlay': {kind: len(overlay) for kind, overlay in autocomplete.overlay.items()},
+        'bytes': autocomplete.memory_footprint(),
+    }
@@ -0,0 +1,134 @@
+"""
+Cart stock reservations.
+
+Putting a product in a cart holds the quantity for CART_RESERVATION_TTL seconds. The
+hold is added to Product.reserved_quantity with a conditional UPDATE that only applies
+while stock_quantity - reserved_quantity covers it (products.inventory), so holds never
+exceed stock and shoppers compete for stock while browsing rather than all at checkout.
+
+A lapsed hold keeps counting until sweep_expired_holds() releases it. The
+sweep_reservations command does this in batches, and a product is swept before it is
+reserved. checkout() turns the cart's lines into an Order in one transaction, using up
+their holds.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .inventory import hold_stock, take_stock, use_held_stock
+from .models import Cart, CartItem, Order, OrderItem, Product
+
+
+DEFAULT_RESERVATION_TTL = 15 * 60
+DEFAULT_SWEEP_BATCH_SIZE = 500
+
+
+def get_reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'CART_RESERVATION_TTL', DEFAULT_RESERVATION_TTL))
+
+
+def get_cart(user):
+    return Cart.objects.get_or_create(user=user)[0]
+
+
+def release_holds(rows):
+    """
+    Releases the holds of (pk, product_id, quantity) cart lines locked by the caller.
+    """
+    held = defaultdict(int)
+    for pk, product_id, quantity in rows:
+        held[product_id] += quantity
+    CartItem.objects.filter(pk__in=[row[0] for row in rows]).update(reserved_until=None)
+    products = Product.objects.only('stock_shards').in_bulk(held)
+    for product_id in sorted(held):  # Same lock order everywhere, so concurrent releases can't deadlock
+        hold_stock(products[product_id], -held[product_id])
+
+
+def sweep_expired_holds(queryset=None, batch_size=None):
+    """
+    Releases the holds of cart lines past their reserved_until, batch_size lines per
+    transaction. Lines locked by a concurrent checkout are skipped where the database
+    supports it. Returns the number of lines released.
+    """
+    queryset = CartItem.objects.all() if queryset is None else queryset
+    batch_size = batch_size or getattr(settings, 'CART_SWEEP_BATCH_SIZE', DEFAULT_SWEEP_BATCH_SIZE)
+    now = timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                queryset.filter(reserved_until__lt=now).select_for_update(skip_locked=True)
+                .values_list('pk', 'product_id', 'quantity')[:batch_size]
+            )
+            if batch:
+                release_holds(batch)
+        released += len(batch)
+        if len(batch) < batch_size:
+            return released
+
+
+def reserve(cart, product, quantity, add=False):
+    """
+    Sets (or with add=True, increases) the quantity of a product in the cart, and holds
+    it for the reservation TTL from now. Raises ValidationError and changes nothing if
+    not enough stock is available.
+    """
+    with transaction.atomic():
+        sweep_expired_holds(CartItem.objects.filter(product=product))
+        item = CartItem.objects.select_for_update().filter(cart=cart, product=product).first()
+        if item is None:
+            item = CartItem(cart=cart, product=product, quantity=0)
+        held = item.quantity if item.reserved_until is not None else 0
+        if add:
+            quantity += item.quantity
+        if not hold_stock(product, quantity - held):
+            raise ValidationError(f"Insufficient stock for {product.name}")
+        item.quantity = quantity
+        item.reserved_until = timezone.now() + get_reservation_ttl()
+        item.save()
+    return item
+
+
+def remove(item):
+    """
+    Deletes a cart line, releasing its hold.
+    """
+    with transaction.atomic():
+        rows = list(
+            CartItem.objects.select_for_update().filter(pk=item.pk, reserved_until__isnull=False)
+            .values_list('pk', 'product_id', 'quantity')
+        )
+        release_holds(rows)
+        CartItem.objects.filter(pk=item.pk).delete()
+
+
+def checkout(cart):
+    """
+    Places an order for everything in the cart and empties it, in one transaction.
+    Held lines use up their hold, lapsed ones included as long as they haven't been
+    swept; released lines need the stock to be available. If any line is short, or the
+    cart is empty, a ValidationError is raised and nothing changes.
+    """
+    with transaction.atomic():
+        items = list(cart.items.select_for_update(of=('self',)).select_related('product').order_by('product_id'))
+        if not items:
+            raise ValidationError('The cart is empty.')
+        for item in items:
+            if item.reserved_until is not None:
+                updated = use_held_stock(item.product, item.quantity)
+            else:
+                updated = take_stock(item.product, item.quantity)
+            if not updated:
+                raise ValidationError(f"Insufficient stock for {item.product.name}")
+
+        order = Order.objects.create(user_id=cart.user_id)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=item.product_id, quantity=item.quantity, unit_price=item.product.price)
+            for item in items
+        ])
+        CartItem.objects.filter(pk__in=[item.pk for item in items]).delete()
+    return order
@@ -0,0 +1,224 @@
+"""
+Streaming NDJSON/CSV exports of orders and products.
+
+Rows are read with iterator(chunk_size=...) (a server-side cursor where the database
+supports it) and written out as they arrive, so memory use stays flat whatever the
+table size. Order lines are prefetched per chunk, never per order.
+
+The rows are read after the view has returned, once its replica routing is undone, so
+each export binds its queryset to the database the router picks while the view runs.
+"""
+import csv
+import json
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Order, OrderItem, Product
+
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CHUNK_SIZE = 1000
+BUFFER_SIZE = 64 * 1024
+
+PRODUCT_FIELDS = [
+    'id', 'sku', 'name', 'description', 'price', 'category_id', 'category__name', 'stock_quantity',
+    'image_url', 'created_date', 'avg_rating', 'review_count',
+]
+
+ORDER_LINE_COLUMNS = [
+    'order_id', 'order_date', 'user_id', 'username', 'line_id', 'product_id', 'sku', 'product_name',
+    'category_id', 'price', 'quantity',
+]
+
+
+def parse_bound(value, name, end=False):
+    """
+    Parses a date or datetime query parameter. A bare date covers the whole day.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: 'Enter a date (YYYY-MM-DD) or an ISO 8601 datetime.'})
+        parsed = datetime.combine(day, time.max if end else time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_export(queryset, params, date_field, category_lookup):
+    """
+    Applies the date_from, date_to and category query parameters shared by all exports.
+    """
+    if params.get('date_from'):
+        queryset = queryset.filter(**{f'{date_field}__gte': parse_bound(params['date_from'], 'date_from')})
+    if params.get('date_to'):
+        queryset = queryset.filter(**{f'{date_field}__lte': parse_bound(params['date_to'], 'date_to', end=True)})
+    if params.get('category'):
+        try:
+            category = int(params['category'])
+        except ValueError:
+            raise ValidationError({'category': 'A valid integer is required.'})
+        queryset = queryset.filter(**{category_lookup: category})
+    return queryset
+
+
+def get_output_format(params):
+    output = params.get('output', 'ndjson')
+    if output not in CONTENT_TYPES:
+        raise ValidationError({'output': 'Choose ndjson or csv.'})
+    return output
+
+
+def buffered(chunks):
+    """
+    Joins small string chunks into writes of about BUFFER_SIZE bytes.
+    """
+    buffer, size = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+class Echo:
+    """
+    File-like object whose write() returns the value, for csv.writer.
+    """
+    def write(self, value):
+        return value
+
+
+def encode_value(value):
+    """
+    Formats datetimes and Decimals the way the API serializers do.
+    """
+    if isinstance(value, datetime):
+        value = timezone.localtime(value).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    if isinstance(value, Decimal):
+        return str(value)  # Prices stay exact
+    return value
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, cls=JSONEncoder, separators=(',', ':')) + '\n'
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([row[column] for column in columns])
+
+
+def product_records(queryset):
+    for row in queryset.values(*PRODUCT_FIELDS).iterator(chunk_size=CHUNK_SIZE):
+        row['category_name'] = row.pop('category__name')
+        yield {key: encode_value(value) for key, value in row.items()}
+
+
+def order_queryset(queryset):
+    lines = OrderItem.objects.select_related('product').only(
+        'id', 'order_id', 'quantity', 'unit_price', 'product__id', 'product__sku', 'product__name', 'product__price', 'product__category_id'
+    ).order_by('id')
+    return queryset.select_related('user').only('id', 'order_date', 'user__id', 'user__username').prefetch_related(
+        Prefetch('orderitem_set', queryset=lines)
+    ).order_by('id')
+
+
+def order_records(queryset):
+    for order in order_queryset(queryset).iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'id': order.id,
+            'order_date': encode_value(order.order_date),
+            'user_id': order.user_id,
+            'username': order.user.username,
+            'items': [
+                {
+                    'id': line.id,
+                    'product_id': line.product_id,
+                    'sku': line.product.sku,
+                    'name': line.product.name,
+                    'category_id': line.product.category_id,
+                    'price': encode_value(line.unit_price if line.unit_price is not None else line.product.price),  # Lines from before unit_price: the current price
+                    'quantity': line.quantity,
+                }
+                for line in order.orderitem_set.all()
+            ],
+        }
+
+
+def order_line_rows(queryset):
+    for order in order_records(queryset):
+        for line in order['items']:
+            yield {
+                'order_id': order['id'],
+                'order_date': order['order_date'],
+                'user_id': order['user_id'],
+                'username': order['username'],
+                'line_id': line['id'],
+                'product_id': line['product_id'],
+                'sku': line['sku'],
+                'product_name': line['name'],
+                'category_id': line['category_id'],
+                'price': line['price'],
+                'quantity': line['quantity'],
+            }
+
+
+def bind_database(queryset):
+    """
+    Fixes the database the queryset reads from to the one the router picks now.
+    """
+    return queryset.using(queryset.db)
+
+
+def streaming_export(chunks, name, output):
+    response = StreamingHttpResponse(buffered(chunks), content_type=CONTENT_TYPES[output])
+    response['Content-Disposition'] = f'attachment; filename="{name}.{output}"'
+    return response
+
+
+def export_products(request):
+    """
+    Streams products filtered by created_date range and category.
+    """
+    output = get_output_format(request.query_params)
+    queryset = filter_export(Product.objects.order_by('id'), request.query_params, 'created_date', 'category_id')
+    queryset = bind_database(queryset)
+    if output == 'csv':
+        columns = [field.replace('category__name', 'category_name') for field in PRODUCT_FIELDS]
+        return streaming_export(csv_lines(columns, product_records(queryset)), 'products', output)
+    return streaming_export(ndjson_lines(product_records(queryset)), 'products', output)
+
+
+def export_orders(request):
+    """
+    Streams orders with their lines, filtered by order_date range and by the category
+    of the products ordered. NDJSON has one order per line, CSV one order line per row.
+    """
+    output = get_output_format(request.query_params)
+    queryset = filter_export(Order.objects.all(), request.query_params, 'order_date', 'orderitem__product__category_id')
+    if request.query_params.get('category'):
+        queryset = Order.objects.filter(pk__in=queryset.values('pk'))  # One row per order despite the join
+    queryset = bind_database(queryset)  # The prefetched lines follow the orders' database
+    if output == 'csv':
+        return streaming_export(csv_lines(ORDER_LINE_COLUMNS, order_line_rows(queryset)), 'orders', output)
+    return streaming_export(ndjson_lines(order_records(queryset)), 'orders', output)
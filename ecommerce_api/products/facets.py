@@ -0,0 +1,83 @@
+"""
+Facet counts for a filtered product listing: per category, per price bucket and by
+stock status, for a filter sidebar.
+
+All three come from one GROUP BY over (category, price bucket, in stock) on the
+filtered queryset; the per-facet totals are summed up from its rows in Python.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import BooleanField, Case, Count, IntegerField, Value, When
+from rest_framework.exceptions import ValidationError
+
+
+DEFAULT_PRICE_BUCKETS = [25, 50, 100, 250, 500, 1000]
+MAX_PRICE_BUCKETS = 20
+
+
+def get_price_buckets(value=None):
+    """
+    Returns the bucket boundaries as Decimals: from the comma-separated ?price_buckets=
+    value if given, else the PRODUCT_FACET_PRICE_BUCKETS setting.
+    """
+    if not value:
+        return [Decimal(str(bound)) for bound in getattr(settings, 'PRODUCT_FACET_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS)]
+    try:
+        bounds = [Decimal(part.strip()) for part in value.split(',')]
+    except InvalidOperation:
+        raise ValidationError({'price_buckets': 'Enter comma-separated prices.'})
+    if len(bounds) > MAX_PRICE_BUCKETS:
+        raise ValidationError({'price_buckets': f'Enter at most {MAX_PRICE_BUCKETS} boundaries.'})
+    if any(not bound.is_finite() or bound <= 0 for bound in bounds) or bounds != sorted(set(bounds)):
+        raise ValidationError({'price_buckets': 'Boundaries must be positive and strictly increasing.'})
+    return bounds
+
+
+def format_price(value):
+    return None if value is None else f'{value:.2f}'
+
+
+def facet_counts(queryset, bounds):
+    """
+    Returns the total and the category, price and stock facet counts of the queryset.
+    Buckets include their lower bound and exclude their upper bound; every bucket is
+    listed, empty ones included.
+    """
+    price_bucket = Case(
+        *[When(price__lt=bound, then=Value(i)) for i, bound in enumerate(bounds)],
+        default=Value(len(bounds)),
+        output_field=IntegerField(),
+    )
+    in_stock = Case(When(stock_quantity__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField())
+    rows = (
+        queryset.order_by()
+        .annotate(price_bucket=price_bucket, in_stock=in_stock)
+        .values('category_id', 'category__name', 'price_bucket', 'in_stock')
+        .annotate(count=Count('id'))
+    )
+
+    total = 0
+    categories = {}
+    buckets = [0] * (len(bounds) + 1)
+    stock = {True: 0, False: 0}
+    for row in rows:
+        count = row['count']
+        total += count
+        key = row['category_id']
+        if key not in categories:
+            categories[key] = {'id': key, 'name': row['category__name'], 'count': 0}
+        categories[key]['count'] += count
+        buckets[row['price_bucket']] += count
+        stock[bool(row['in_stock'])] += count
+
+    edges = [None] + bounds + [None]
+    return {
+        'count': total,
+        'categories': sorted(categories.values(), key=lambda c: (-c['count'], c['name'] or '')),
+        'price': [
+            {'min': format_price(edges[i]), 'max': format_price(edges[i + 1]), 'count': count}
+            for i, count in enumerate(buckets)
+        ],
+        'in_stock': {'true': stock[True], 'false': stock[False]},
+    }
@@ -0,0 +1,193 @@
+"""
+Streaming bulk import of products from CSV or NDJSON feeds.
+
+Rows are read one line at a time, checked with plain Python validation instead of a
+serializer, and upserted by sku in batches with one INSERT ... ON CONFLICT statement,
+so memory stays bounded by the batch size whatever the feed length. Bad rows are
+reported and skipped instead of aborting the import.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+
+from . import autocomplete
+from .inventory import shard_stock
+from .models import Category, Product
+from .search import get_search_backend
+from ecommerce_api.cache import bump_generation
+
+
+FORMATS = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
+UPDATE_FIELDS = ['name', 'description', 'price', 'category', 'stock_quantity', 'image_url', 'updated_at']
+
+
+class RowError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+
+
+def read_rows(lines, format):
+    """
+    Yields one dict per record from an iterable of byte lines.
+    """
+    text = (line.decode('utf-8-sig') if isinstance(line, bytes) else line for line in lines)
+    if format == 'csv':
+        yield from csv.DictReader(text)
+        return
+    for line in text:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            row = {'__invalid__': 'Line is not a JSON object.'}
+        yield row
+
+
+class ProductImporter:
+    """
+    Upserts products by sku from rows of sku, name, description, price, category
+    (name), stock_quantity and image_url. Every row is a full product record.
+    """
+    max_reported_errors = 1000
+    validate_url = URLValidator()
+
+    def __init__(self, batch_size=1000, create_categories=False):
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        self.created = self.updated = self.failed = 0
+        self.errors = []
+
+    def run(self, rows):
+        """
+        Imports all rows and returns the report.
+        """
+        batch = {}
+        for number, row in enumerate(rows, start=1):
+            try:
+                product = self.clean(row)
+            except RowError as exc:
+                self.fail(number, exc.errors)
+                continue
+            batch[product.sku] = product  # The last row for a sku wins
+            if len(batch) >= self.batch_size:
+                self.save(batch)
+                batch = {}
+        if batch:
+            self.save(batch)
+        if self.created or self.updated:
+            bump_generation(Product)
+        return self.report()
+
+    def fail(self, number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_reported_errors:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def report(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+    def clean(self, row):
+        """
+        Validates a row and returns an unsaved Product, or raises RowError.
+        """
+        if '__invalid__' in row:
+            raise RowError({'row': row['__invalid__']})
+        errors = {}
+
+        def text(field, max_length=None, required=False):
+            value = row.get(field)
+            value = '' if value is None else str(value).strip()
+            if required and not value:
+                errors[field] = 'This field is required.'
+            elif max_length and len(value) > max_length:
+                errors[field] = f'Ensure this field has no more than {max_length} characters.'
+            return value
+
+        sku = text('sku', max_length=64, required=True)
+        name = text('name', max_length=255, required=True)
+        description = text('description')
+        image_url = text('image_url', max_length=200) or None
+        category_name = text('category', max_length=100)
+
+        try:
+            price = Decimal(str(row.get('price', '')).strip())
+            if not price.is_finite() or price < 0:
+                raise InvalidOperation
+            if price.as_tuple().exponent < -2 or price.adjusted() >= 8:
+                errors['price'] = 'Ensure there are no more than 8 digits before and 2 after the decimal point.'
+        except InvalidOperation:
+            errors['price'] = 'A valid non-negative number is required.'
+            price = None
+
+        try:
+            stock_quantity = int(str(row.get('stock_quantity', '')).strip())
+        except ValueError:
+            errors['stock_quantity'] = 'A valid integer is required.'
+            stock_quantity = None
+
+        if image_url and 'image_url' not in errors:
+            try:
+                self.validate_url(image_url)
+            except ValidationError:
+                errors['image_url'] = 'Enter a valid URL.'
+
+        category_id = None
+        if category_name and 'category' not in errors:
+            category_id = self.categories.get(category_name)
+            if category_id is None:
+                if self.create_categories:
+                    category_id = Category.objects.get_or_create(name=category_name)[0].id
+                    self.categories[category_name] = category_id
+                else:
+                    errors['category'] = f'Unknown category "{category_name}".'
+
+        if errors:
+            raise RowError(errors)
+        return Product(
+            sku=sku, name=name, description=description, price=price, category_id=category_id,
+            stock_quantity=stock_quantity, image_url=image_url,
+        )
+
+    def save(self, batch):
+        """
+        Upserts one batch of products by sku in a single transaction, using one
+        INSERT ... ON CONFLICT (sku) DO UPDATE statement for the whole batch.
+        """
+        skus = list(batch)
+        with transaction.atomic():
+            existing = Product.objects.filter(sku__in=skus).count()
+            Product.objects.bulk_create(
+                list(batch.values()),
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=UPDATE_FIELDS,
+            )
+            # The upsert bypasses the model signals, so the search and autocomplete indexes are fed here
+            rows = list(Product.objects.filter(sku__in=skus).values_list('id', 'name', 'review_count'))
+            ids = [row[0] for row in rows]
+            get_search_backend().index_products(ids)
+            transaction.on_commit(lambda: autocomplete.record_many('products', rows))
+            for product in Product.objects.filter(id__in=ids, stock_shards__gt=0).only('stock_shards'):
+                shard_stock(product, product.stock_shards, from_totals=True)  # The feed set stock_quantity
+
+        self.created += len(batch) - existing
+        self.updated += existing
@@ -0,0 +1,192 @@
+"""
+Stock counters.
+
+A product's stock is normally taken with one conditional UPDATE of its row, so every
+order for a popular product queues on that row. shard_stock() switches a hot product
+to sharded stock instead. Its available units (stock_quantity - reserved_quantity) are
+split across StockShard rows, and an order takes its units from a shard that has enough
+left, starting from a random one, so concurrent orders lock different rows.
+
+stock_quantity and reserved_quantity of a sharded product stay the totals for reads and
+filters. They are moved by an unconditional UPDATE right after the transaction commits,
+so the product row is no longer locked for the length of an order. A sharded product
+keeps sum(shard quantities) == stock_quantity - reserved_quantity, apart from that brief
+window after a commit.
+
+Every UPDATE that moves stock_quantity also sets updated_at, so only the cached responses
+showing that product are invalidated (see ecommerce_api.cache). Every function that takes
+stock must run in a transaction that the caller rolls back when the order fails. Shards are switched on, resized, rebalanced and recounted with the
+shard_stock command.
+"""
+import random
+import time
+
+from django.db import OperationalError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import CartItem, Product, StockShard
+
+
+TOTALS_ATTEMPTS = 50
+
+
+def reload_mode(product):
+    """
+    Re-reads whether a product is sharded, after a single-row UPDATE found it had been switched.
+    """
+    product.stock_shards = Product.objects.values_list('stock_shards', flat=True).get(pk=product.pk)
+    return product.stock_shards
+
+
+def move_totals_on_commit(product_id, stock=0, reserved=0):
+    """
+    Moves a sharded product's totals once the current transaction commits.
+    The order is committed by then, so a failure is logged rather than raised to the
+    caller; recount_totals() repairs the totals.
+    """
+    def move():
+        for attempt in range(TOTALS_ATTEMPTS):
+            try:
+                Product.objects.filter(pk=product_id).update(
+                    stock_quantity=F('stock_quantity') + stock,
+                    reserved_quantity=F('reserved_quantity') + reserved,
+                    updated_at=timezone.now(),
+                )
+                break
+            except OperationalError:  # SQLite reports "database is locked" under write contention
+                if attempt == TOTALS_ATTEMPTS - 1:
+                    raise
+                time.sleep(0.001 * (attempt + 1))
+    transaction.on_commit(move, robust=True)
+
+
+def take_from_shards(product, quantity):
+    """
+    Takes quantity units from the product's shards: from the first shard with enough
+    left, starting at a random one, or when none has, from several. Returns whether
+    the shards held enough.
+    """
+    shards = StockShard.objects.filter(product_id=product.pk)
+    start = random.randrange(product.stock_shards)
+    for index in list(range(start, product.stock_shards)) + list(range(start)):
+        if shards.filter(index=index, quantity__gte=quantity).update(quantity=F('quantity') - quantity):
+            return True
+
+    with transaction.atomic():
+        available = list(shards.select_for_update().order_by('index').values_list('index', 'quantity'))
+        if sum(left for index, left in available) < quantity:
+            return False
+        remaining = quantity
+        for index, left in available:
+            part = min(left, remaining)
+            if part:
+                shards.filter(index=index).update(quantity=F('quantity') - part)
+                remaining -= part
+    return True
+
+
+def return_to_shards(product, quantity):
+    StockShard.objects.filter(product_id=product.pk, index=random.randrange(product.stock_shards)).update(
+        quantity=F('quantity') + quantity
+    )
+
+
+def take_stock(product, quantity):
+    """
+    Takes quantity units of the product's available stock (not held by carts), for an
+    order. Returns False, changing nothing, if not that many are available.
+    """
+    if not product.stock_shards:
+        if Product.objects.filter(pk=product.pk, stock_shards=0, stock_quantity__gte=F('reserved_quantity') + quantity).update(
+            stock_quantity=F('stock_quantity') - quantity, updated_at=timezone.now()
+        ):
+            return True
+        if not reload_mode(product):
+            return False
+    if not take_from_shards(product, quantity):
+        return False
+    move_totals_on_commit(product.pk, stock=-quantity)
+    return True
+
+
+def hold_stock(product, delta):
+    """
+    Sets delta units of available stock aside for a cart (or with a negative delta,
+    releases them). Returns False, changing nothing, if not that many are available.
+    """
+    if delta == 0:
+        return True
+    if not product.stock_shards:
+        products = Product.objects.filter(pk=product.pk, stock_shards=0)
+        if delta > 0:
+            products = products.filter(stock_quantity__gte=F('reserved_quantity') + delta)
+        if products.update(reserved_quantity=F('reserved_quantity') + delta):
+            return True
+        if not reload_mode(product):
+            return False
+    if delta > 0:
+        if not take_from_shards(product, delta):
+            return False
+    else:
+        return_to_shards(product, -delta)
+    move_totals_on_commit(product.pk, reserved=delta)
+    return True
+
+
+def use_held_stock(product, quantity):
+    """
+    Turns quantity held units into sold ones, for the checkout of a cart line.
+    """
+    if not product.stock_shards:
+        if Product.objects.filter(pk=product.pk, stock_shards=0, stock_quantity__gte=quantity, reserved_quantity__gte=quantity).update(
+            stock_quantity=F('stock_quantity') - quantity,
+            reserved_quantity=F('reserved_quantity') - quantity,
+            updated_at=timezone.now(),
+        ):
+            return True
+        if not reload_mode(product):
+            return False
+    move_totals_on_commit(product.pk, stock=-quantity, reserved=-quantity)  # The shards gave the units up when they were held
+    return True
+
+
+def shard_stock(product, shards, from_totals=False):
+    """
+    Splits the product's available units evenly across the given number of shards, or
+    with shards=0 goes back to the single row. A sharded product keeps the units in its
+    shards, so this also rebalances them, unless from_totals is set: then the units are
+    recounted from the product row, after stock_quantity was written directly.
+    """
+    with transaction.atomic():
+        totals = Product.objects.select_for_update().values_list('stock_quantity', 'reserved_quantity', 'stock_shards').get(pk=product.pk)
+        stock_quantity, reserved_quantity, current = totals
+        existing = StockShard.objects.filter(product_id=product.pk)
+        if current and not from_totals:
+            available = sum(existing.select_for_update().values_list('quantity', flat=True))
+        else:
+            available = max(stock_quantity - reserved_quantity, 0)
+        existing.delete()
+        StockShard.objects.bulk_create([
+            StockShard(product_id=product.pk, index=index, quantity=available // shards + (index < available % shards))
+            for index in range(shards)
+        ])
+        Product.objects.filter(pk=product.pk).update(stock_shards=shards)
+    product.stock_shards = shards
+
+
+def recount_totals(product):
+    """
+    Recomputes a sharded product's totals from its shards and the held cart lines, in case
+    an update after commit was lost. Totals still in flight are counted twice, so run it
+    while the product isn't being ordered.
+    """
+    with transaction.atomic():
+        Product.objects.select_for_update().values_list('pk', flat=True).get(pk=product.pk)  # Locks the totals
+        reserved_quantity = CartItem.objects.filter(product_id=product.pk, reserved_until__isnull=False).aggregate(
+            total=Sum('quantity')
+        )['total'] or 0
+        available = StockShard.objects.filter(product_id=product.pk).aggregate(total=Sum('quantity'))['total'] or 0
+        Product.objects.filter(pk=product.pk, stock_shards__gt=0).update(
+            stock_quantity=available + reserved_quantity, reserved_quantity=reserved_quantity, updated_at=timezone.now()
+        )
@@ -0,0 +1,176 @@
+import json
+import math
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from products.models import Category, Product
+from ecommerce_api.cache import get_response_cache
+from users.authentication import token_cache
+
+
+PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    """
+    Drives every API endpoint in-process with the test client and reports latency
+    percentiles, throughput and SQL queries per request.
+
+    Runs against whatever catalog is in the database (see seed_catalog). The benchmark
+    user and everything written by the write endpoints live in a transaction that is
+    rolled back at the end. --save writes the results as JSON, --compare diffs the run
+    against a saved baseline.
+    """
+    help = 'Benchmarks the API endpoints in-process: p50/p95/p99 latency, requests/sec and queries/request.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per scenario.')
+        parser.add_argument('--only', default='', help='Comma-separated scenarios to run (default: all).')
+        parser.add_argument('--cold', action='store_true', help='Clear the response cache before every request.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the ids and queries requested.')
+        parser.add_argument('--host', default='localhost', help='Host header sent with every request.')
+        parser.add_argument('--save', metavar='PATH', help='Write the results to a JSON baseline.')
+        parser.add_argument('--compare', metavar='PATH', help='Diff the results against a JSON baseline.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+        self.host = options['host']
+        baseline = self.load_baseline(options['compare']) if options['compare'] else None
+        product_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:10000])
+        if not product_ids:
+            raise CommandError('The catalog is empty; run seed_catalog first.')
+        rng = random.Random(options['seed'])
+
+        # Without throttling, or the write and login scenarios would mostly measure 429 responses
+        no_throttles = override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}})
+        with no_throttles, transaction.atomic():
+            self.user = User.objects.create_user(f'benchmark-api-{time.monotonic_ns()}', password=PASSWORD)
+            self.token = Token.objects.create(user=self.user)
+            self.category_id = Category.objects.values_list('id', flat=True).first()
+            self.order_product = Product.objects.create(
+                name='Benchmark order product', description='Benchmark', price=1, stock_quantity=10 ** 9
+            )
+            scenarios = self.get_scenarios(rng, product_ids)
+            only = {name.strip() for name in options['only'].split(',') if name.strip()}
+            unknown = only - {name for name, _ in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+            results = {}
+            header = f"{'scenario':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'queries':>9}{'errors':>8}"
+            self.stdout.write(header + (f"{'Δp50':>8}{'Δp95':>8}{'Δqueries':>10}" if baseline else ''))
+            for name, make_request in scenarios:
+                if only and name not in only:
+                    continue
+                result = self.run_scenario(make_request, options)
+                results[name] = result
+                self.stdout.write(self.format_row(name, result, baseline.get(name) if baseline else None))
+            transaction.set_rollback(True)
+        token_cache.clear()
+        get_response_cache().clear()  # Entries built from rolled-back rows
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump({
+                    'products': Product.objects.count(),
+                    'iterations': options['iterations'],
+                    'cold': options['cold'],
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {options['save']}."))
+
+    def load_baseline(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)['results']
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f'Cannot read baseline {path}: {exc}')
+
+    def get_scenarios(self, rng, product_ids):
+        """
+        Returns (name, callable) pairs. Each callable takes an iteration number and
+        performs one request with the given client.
+        """
+        anonymous = APIClient(SERVER_NAME=self.host)
+        authenticated = APIClient(SERVER_NAME=self.host)
+        authenticated.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        queries = ['laptop', 'wireless', 'smart wat', 'premium', 'kettle']
+        reviewed = rng.sample(product_ids, len(product_ids))  # One review per product for the benchmark user
+
+        return [
+            ('products-list', lambda i: anonymous.get(reverse('product-list'), {'page': rng.randint(1, 5)})),
+            ('products-cursor', lambda i: anonymous.get(reverse('product-list'), {'pagination': 'cursor', 'ordering': rng.choice(['-created_date', 'price', '-avg_rating'])})),
+            ('products-filter', lambda i: anonymous.get(reverse('product-list'), {'category': self.category_id, 'price_min': rng.randint(1, 500), 'price_max': rng.randint(1000, 5000), 'stock_available': 'true'})),
+            ('products-search', lambda i: anonymous.get(reverse('product-search'), {'q': rng.choice(queries)})),
+            ('products-detail', lambda i: anonymous.get(reverse('product-detail', args=[rng.choice(product_ids)]))),
+            ('categories-list', lambda i: anonymous.get(reverse('category-list'))),
+            ('reviews-by-product', lambda i: anonymous.get(reverse('review-list'), {'product_id': rng.choice(product_ids)})),
+            ('reviews-create', lambda i: authenticated.post(reverse('review-list'), {'product': reviewed[i % len(reviewed)], 'rating': rng.randint(1, 5), 'text': 'Benchmark'}, format='json')),
+            ('orders-list', lambda i: authenticated.get(reverse('order-list'))),
+            ('orders-create', lambda i: authenticated.post(reverse('order-list'), {'items': [{'item': self.order_product.id, 'quantity': 1}]}, format='json')),
+            ('token-login', lambda i: anonymous.post(reverse('api_token_auth'), {'username': self.user.username, 'password': PASSWORD}, format='json')),
+        ]
+
+    def run_scenario(self, make_request, options):
+        cache = get_response_cache()
+        for i in range(options['warmup']):
+            make_request(i)
+
+        latencies = []
+        errors = queries = 0
+        started = time.perf_counter()
+        for i in range(options['warmup'], options['warmup'] + options['iterations']):
+            if options['cold']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                request_started = time.perf_counter()
+                response = make_request(i)
+                latencies.append(time.perf_counter() - request_started)
+            queries += len(context)
+            if response.status_code >= 400:
+                errors += 1
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'requests_per_sec': len(latencies) / elapsed,
+            'queries_per_request': queries / len(latencies),
+            'errors': errors,
+        }
+
+    def format_row(self, name, result, previous):
+        row = (
+            f"{name:<22}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+            f"{result['requests_per_sec']:>9.0f}{result['queries_per_request']:>9.2f}{result['errors']:>8}"
+        )
+        if previous:
+            row += (
+                f"{change(previous['p50_ms'], result['p50_ms']):>8}{change(previous['p95_ms'], result['p95_ms']):>8}"
+                f"{result['queries_per_request'] - previous['queries_per_request']:>+10.2f}"
+            )
+        return row
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a sorted list.
+    """
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def change(before, after):
+    return f'{(after - before) / before * 100:+.0f}%' if before else 'n/a'
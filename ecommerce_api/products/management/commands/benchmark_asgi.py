@@ -0,0 +1,139 @@
+import asyncio
+import random
+import time
+from urllib.parse import urlencode
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from products.models import Product
+from ecommerce_api.cache import get_response_cache
+
+from .benchmark_api import percentile
+
+
+class Command(BaseCommand):
+    """
+    Serves the catalog read endpoints through the project's ASGI application with many
+    concurrent connections, once with the sync viewsets (each request on the
+    sync_to_async thread pool) and once with the native async views, and compares
+    throughput and latency. Requests are fed to the ASGI callable in-process, so no
+    server or network is involved.
+    """
+    help = 'Benchmarks catalog reads under ASGI: sync viewsets vs the async read views.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=32, help='Concurrent connections.')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per scenario and mode.')
+        parser.add_argument('--only', default='', help='Comma-separated scenarios to run (default: all).')
+        parser.add_argument('--cold', action='store_true', help='Clear the response cache before every request.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the ids and queries requested.')
+        parser.add_argument('--host', default='localhost', help='Host header sent with every request.')
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:10000])
+        if not product_ids:
+            raise CommandError('The catalog is empty; run seed_catalog first.')
+        self.host = options['host'].encode()
+        self.cold = options['cold']
+        self.application = get_asgi_application()
+
+        scenarios = self.get_scenarios(random.Random(options['seed']), product_ids)
+        only = {name.strip() for name in options['only'].split(',') if name.strip()}
+        unknown = only - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        self.stdout.write(f"{'scenario':<22}{'mode':<7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}")
+        for name, urls in scenarios.items():
+            if only and name not in only:
+                continue
+            for mode in ('sync', 'async'):
+                with override_settings(ASYNC_CATALOG_READS=mode == 'async'):
+                    get_response_cache().clear()
+                    result = asyncio.run(self.run_scenario(urls, options['concurrency'], options['requests']))
+                self.stdout.write(
+                    f"{name:<22}{mode:<7}{result['requests_per_sec']:>9.0f}{result['p50_ms']:>9.2f}"
+                    f"{result['p95_ms']:>9.2f}{result['errors']:>8}"
+                )
+
+    def get_scenarios(self, rng, product_ids):
+        """
+        Returns the URLs requested per scenario, cycled through by the connections.
+        """
+        sample = [rng.choice(product_ids) for _ in range(200)]
+        return {
+            'products-list': [(reverse('product-list'), {'page': page}) for page in range(1, 6)],
+            'products-detail': [(reverse('product-detail', args=[pk]), {}) for pk in sample],
+            'products-search': [(reverse('product-search'), {'q': q}) for q in ('laptop', 'wireless', 'smart wat', 'premium', 'kettle')],
+            'categories-list': [(reverse('category-list'), {})],
+            'reviews-by-product': [(reverse('review-list'), {'product_id': pk}) for pk in sample],
+        }
+
+    async def run_scenario(self, urls, concurrency, requests):
+        for path, params in urls[:5]:
+            await self.request(path, params)  # Warm up the app and the connection
+
+        latencies, errors = [], 0
+        remaining = iter(range(requests))
+
+        async def connection():
+            nonlocal errors
+            for i in remaining:
+                path, params = urls[i % len(urls)]
+                if self.cold:
+                    get_response_cache().clear()
+                started = time.perf_counter()
+                status = await self.request(path, params)
+                latencies.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connection() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        return {
+            'requests_per_sec': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'errors': errors,
+        }
+
+    async def request(self, path, params):
+        """
+        Sends one GET through the ASGI application and returns the response status.
+        """
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': urlencode(params).encode(),
+            'root_path': '',
+            'headers': [(b'host', self.host), (b'accept', b'application/json')],
+            'client': ('127.0.0.1', 50000),
+            'server': (self.host.decode(), 80),
+        }
+        body_sent = False
+        status = 500
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Future()  # The client never disconnects; Django cancels this wait
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        await self.application(scope, receive, send)
+        return status
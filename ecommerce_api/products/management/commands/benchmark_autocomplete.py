@@ -0,0 +1,80 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products import autocomplete
+from products.models import Product
+from products.search import get_search_backend
+from .benchmark_search import WORDS
+
+
+class Command(BaseCommand):
+    """
+    Builds an autocomplete prefix index and times prefix queries against it: from
+    synthetic names held in memory only, or from the catalog, where the same prefixes
+    are also run through the full-text search backend for comparison.
+    """
+    help = 'Benchmarks the build time, memory footprint and query latency of the autocomplete index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--names', type=int, default=1000000, help='Synthetic names to index (0 indexes the catalog).')
+        parser.add_argument('--queries', type=int, default=10000, help='Prefix queries to time.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the names and queries.')
+
+    def handle(self, *args, **options):
+        if options['queries'] < 1:
+            raise CommandError('--queries must be at least 1.')
+        rng = random.Random(options['seed'])
+        if options['names']:
+            names = self.generate(rng, options['names'])
+            items = ((pk, name, rng.randint(0, 500)) for pk, name in enumerate(names, start=1))
+        else:
+            names = list(Product.objects.values_list('name', flat=True)[:100000])
+            if not names:
+                raise CommandError('The catalog is empty; run seed_catalog first.')
+            items = autocomplete.load_products()
+
+        started = time.perf_counter()
+        index = autocomplete.PrefixIndex(items)
+        built = time.perf_counter() - started
+        self.stdout.write(
+            f'names {len(index)}, word-start entries {len(index.starts)}, precomputed prefixes {len(index.top)}'
+        )
+        self.stdout.write(f'build {built:.1f}s, memory {index.memory_footprint() / 1024 ** 2:.1f} MB')
+
+        prefixes = [self.prefix(rng, rng.choice(names)) for _ in range(options['queries'])]
+        timings = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            index.search(prefix, autocomplete.DEFAULT_LIMIT)
+            timings.append(time.perf_counter() - started)
+        self.report('prefix index', timings)
+
+        if not options['names']:
+            backend = get_search_backend()
+            timings = []
+            for prefix in prefixes[:200]:
+                started = time.perf_counter()
+                list(backend.search(Product.objects.all(), prefix).values_list('id', 'name')[:autocomplete.DEFAULT_LIMIT])
+                timings.append(time.perf_counter() - started)
+            self.report('full-text search', timings)
+
+    def generate(self, rng, count):
+        syllables = ['ka', 'lo', 'mi', 'ne', 'ra', 'tu', 'zo', 'vi', 'sa', 'de', 'po', 'gu', 'fe', 'bo', 'xi']
+        vocabulary = WORDS + [''.join(rng.choices(syllables, k=3)).capitalize() for _ in range(20000)]
+        return [' '.join(rng.sample(vocabulary, rng.randint(2, 5))) for _ in range(count)]
+
+    def prefix(self, rng, name):
+        """
+        Returns what a user has typed so far of a word of the name: its first one to six letters.
+        """
+        words = autocomplete.normalize(name).split() or ['']
+        word = rng.choice(words)
+        return word[:rng.randint(1, min(6, max(len(word), 1)))]
+
+    def report(self, label, timings):
+        timings.sort()
+        p50 = timings[len(timings) // 2] * 1e6
+        p99 = timings[min(len(timings) - 1, len(timings) * 99 // 100)] * 1e6
+        self.stdout.write(self.style.SUCCESS(f'{label}: p50 {p50:.1f} µs, p99 {p99:.1f} µs over {len(timings)} queries'))
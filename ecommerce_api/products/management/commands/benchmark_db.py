@@ -0,0 +1,127 @@
+import os
+import random
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from rest_framework.exceptions import ValidationError
+
+from products.models import Product
+from products.serializers import OrderSerializer
+
+from .benchmark_api import percentile
+
+
+class Command(BaseCommand):
+    """
+    Reads product list pages from some threads while others place orders, for a fixed
+    time, and reports how many pages the readers got through and how long they took,
+    next to the orders written. It runs against the configured database, so compare
+    profiles by running it once per DATABASE_PROFILE, e.g.
+
+        DATABASE_PROFILE=sqlite-rollback python manage.py benchmark_db
+        python manage.py benchmark_db
+
+    The benchmark users, product and orders are deleted at the end.
+    """
+    help = 'Benchmarks catalog reads while orders are being written, for comparing database profiles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5, help='How long to run.')
+        parser.add_argument('--readers', type=int, default=4, help='Threads reading product pages.')
+        parser.add_argument('--writers', type=int, default=2, help='Threads placing orders.')
+        parser.add_argument('--page-size', type=int, default=20, help='Products per page read.')
+
+    def handle(self, *args, **options):
+        if options['readers'] < 1 or options['seconds'] <= 0:
+            raise CommandError('At least one reader and a positive duration are needed.')
+        total = Product.objects.count()
+        if not total:
+            raise CommandError('The catalog is empty; run seed_catalog first.')
+
+        product = Product.objects.create(name='Benchmark order product', description='Benchmark', price=1, stock_quantity=10 ** 9)
+        users = [User.objects.create_user(f'benchmark-db-{time.monotonic_ns()}-{i}') for i in range(options['writers'])]
+        payload = {'items': [{'item': product.id, 'quantity': 1}]}
+        stop = threading.Event()
+        lock = threading.Lock()
+        latencies = []
+        counts = {'orders': 0, 'read_errors': 0, 'write_errors': 0}
+
+        def reader(seed):
+            rng = random.Random(seed)
+            own, errors = [], 0
+            try:
+                while not stop.is_set():
+                    offset = rng.randrange(max(total - options['page_size'], 1))
+                    started = time.perf_counter()
+                    try:
+                        # What a product list page queries: the count, then the page
+                        Product.objects.count()
+                        list(Product.objects.select_related('category').order_by('id')[offset:offset + options['page_size']])
+                    except OperationalError:
+                        errors += 1
+                        continue
+                    own.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+                with lock:
+                    latencies.extend(own)
+                    counts['read_errors'] += errors
+
+        def writer(user):
+            placed = errors = 0
+            try:
+                while not stop.is_set():
+                    serializer = OrderSerializer(data=payload)
+                    try:
+                        serializer.is_valid(raise_exception=True)
+                        serializer.save(user=user)
+                        placed += 1
+                    except (OperationalError, ValidationError):
+                        errors += 1
+            finally:
+                connection.close()
+                with lock:
+                    counts['orders'] += placed
+                    counts['write_errors'] += errors
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        threads += [threading.Thread(target=writer, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        product.delete()  # Cascades to the order lines
+        for user in users:
+            user.delete()  # Cascades to the orders
+
+        latencies.sort()
+        self.stdout.write(f"profile={os.environ.get('DATABASE_PROFILE', 'sqlite')} {self.describe_database()}")
+        self.stdout.write(
+            f"readers={options['readers']} reads/sec={len(latencies) / elapsed:.0f} "
+            + (
+                f"p50={percentile(latencies, 50) * 1000:.2f}ms p95={percentile(latencies, 95) * 1000:.2f}ms "
+                f"p99={percentile(latencies, 99) * 1000:.2f}ms " if latencies else ''
+            )
+            + f"errors={counts['read_errors']}"
+        )
+        self.stdout.write(
+            f"writers={options['writers']} orders/sec={counts['orders'] / elapsed:.1f} errors={counts['write_errors']}"
+        )
+
+    def describe_database(self):
+        if connection.vendor != 'sqlite':
+            return f'vendor={connection.vendor}'
+        with connection.cursor() as cursor:
+            settings = [
+                f"{pragma}={cursor.execute(f'PRAGMA {pragma}').fetchone()[0]}"
+                for pragma in ('journal_mode', 'synchronous', 'busy_timeout')
+            ]
+        return ' '.join(settings)
@@ -0,0 +1,81 @@
+import io
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from products.models import Product
+from products.serializers import ProductSerializer
+from ecommerce_api.fast_serializers import ValuesSerializer
+from ecommerce_api.parsers import MessagePackParser, ORJSONParser
+from ecommerce_api.renderers import MessagePackRenderer, ORJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    """
+    Measures render and parse throughput of the API's media types on product list pages
+    as the list endpoint returns them: DRF's stdlib JSON, orjson and MessagePack.
+    """
+    help = 'Benchmarks JSON (stdlib and orjson) and MessagePack rendering and parsing of product pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help='Products per page.')
+        parser.add_argument('--pages', type=int, default=20, help='Distinct pages rendered.')
+        parser.add_argument('--iterations', type=int, default=20, help='Passes over the pages per codec.')
+
+    def handle(self, *args, **options):
+        pages = self.get_pages(options['page_size'], options['pages'])
+        if not pages:
+            raise CommandError('The catalog is empty; run seed_catalog first.')
+
+        codecs = [('json (stdlib)', JSONRenderer(), JSONParser())]
+        if orjson is not None:
+            codecs.append(('json (orjson)', ORJSONRenderer(), ORJSONParser()))
+        if settings.MSGPACK_ENABLED:
+            codecs.append(('msgpack', MessagePackRenderer(), MessagePackParser()))
+
+        iterations = options['iterations']
+        self.stdout.write(f"{'codec':<16}{'bytes/page':>12}{'render pages/s':>16}{'parse pages/s':>15}{'render MB/s':>13}")
+        for name, renderer, parser in codecs:
+            rendered = [renderer.render(page, renderer.media_type) for page in pages]
+            size = sum(len(body) for body in rendered)
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                for page in pages:
+                    renderer.render(page, renderer.media_type)
+            render_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                for body in rendered:
+                    parser.parse(io.BytesIO(body), parser.media_type, {})
+            parse_seconds = time.perf_counter() - started
+
+            count = len(pages) * iterations
+            self.stdout.write(
+                f'{name:<16}{size // len(pages):>12}{count / render_seconds:>16.0f}'
+                f'{count / parse_seconds:>15.0f}{size * iterations / render_seconds / 1e6:>13.1f}'
+            )
+
+    def get_pages(self, page_size, count):
+        """
+        Returns product list pages in the paginated response layout.
+        """
+        serializer = ValuesSerializer.for_serializer(ProductSerializer)
+        queryset = Product.objects.order_by('id')
+        total = queryset.count()
+        pages = []
+        for number in range(count):
+            results = serializer.to_representation(serializer.rows(queryset[number * page_size:(number + 1) * page_size]))
+            if not results:
+                break
+            pages.append({
+                'count': total,
+                'next': f'http://localhost/api/products/?page={number + 2}',
+                'previous': f'http://localhost/api/products/?page={number}' if number else None,
+                'results': results,
+            })
+        return pages
@@ -0,0 +1,95 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from products.models import Product
+from ecommerce_api.compression import brotli
+
+
+# Request headers of each way a client can fetch a response it already has
+MODES = [
+    ('identity', {}),
+    ('gzip', {'HTTP_ACCEPT_ENCODING': 'gzip'}),
+    ('br', {'HTTP_ACCEPT_ENCODING': 'br, gzip'}),
+    ('revalidated', {'HTTP_ACCEPT_ENCODING': 'br, gzip'}),  # Plus If-None-Match, see run_scenario()
+]
+
+
+class Command(BaseCommand):
+    """
+    Fetches the same catalog responses over and over, in-process with the test client,
+    the way a mobile client refreshes its screens: uncompressed, gzipped, brotli-compressed
+    and revalidated with If-None-Match. Reports the body bytes and the CPU time per
+    request of each, and what the last three save over the first. The response cache is
+    warm throughout, so the savings are on top of it. The CPU time includes the test
+    client's own work, which is the same for every mode.
+    """
+    help = 'Benchmarks the bytes and CPU time saved by compression and conditional GETs on repeated catalog fetches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500, help='Measured requests per scenario and mode.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the products requested.')
+        parser.add_argument('--host', default='localhost', help='Host header sent with every request.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+        product_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:10000])
+        if not product_ids:
+            raise CommandError('The catalog is empty; run seed_catalog first.')
+        rng = random.Random(options['seed'])
+        reviewed = Product.objects.annotate(reviews_count=Count('reviews')).order_by('-reviews_count', 'id').values_list('id', flat=True).first()
+
+        client = APIClient(SERVER_NAME=options['host'])
+        scenarios = [
+            ('products-list', reverse('product-list'), {'page_size': 20}),
+            ('products-detail', reverse('product-detail', args=[rng.choice(product_ids)]), {}),
+            ('categories-list', reverse('category-list'), {}),
+            ('product-reviews', reverse('product-reviews', args=[reviewed]), {}),
+        ]
+        modes = [(mode, headers) for mode, headers in MODES if mode != 'br' or brotli is not None]
+        if brotli is None:
+            self.stdout.write('brotli is not installed; skipping br.')
+        self.stdout.write(f"{'scenario':<18}{'mode':<13}{'body bytes':>12}{'cpu ms':>9}{'bytes saved':>13}{'cpu saved':>11}")
+        for name, url, params in scenarios:
+            results = self.run_scenario(client, url, params, modes, options['iterations'])
+            baseline = results['identity']
+            for mode, _ in modes:
+                result = results[mode]
+                self.stdout.write(
+                    f"{name:<18}{mode:<13}{result['bytes']:>12.0f}{result['cpu_ms']:>9.3f}"
+                    f"{saved(baseline['bytes'], result['bytes']):>13}{saved(baseline['cpu_ms'], result['cpu_ms']):>11}"
+                )
+
+    def run_scenario(self, client, url, params, modes, iterations):
+        """
+        Requests the URL iterations times in every mode, taking turns in a rotating order
+        so that noise on the machine affects every mode alike, and returns the mean bytes and CPU time of each.
+        """
+        first = client.get(url, params)  # Fills the response cache
+        if first.status_code != 200:
+            raise CommandError(f'GET {url} answered {first.status_code}.')
+        headers = {mode: dict(mode_headers) for mode, mode_headers in modes}
+        headers['revalidated']['HTTP_IF_NONE_MATCH'] = first['ETag']
+
+        totals = {mode: {'bytes': 0, 'cpu': 0.0} for mode, _ in modes}
+        for i in range(iterations):
+            for mode, _ in modes[i % len(modes):] + modes[:i % len(modes)]:
+                started = time.process_time()
+                response = client.get(url, params, **headers[mode])
+                totals[mode]['cpu'] += time.process_time() - started
+                totals[mode]['bytes'] += len(response.content)
+                if mode == 'revalidated' and response.status_code != 304:
+                    raise CommandError(f'GET {url} with If-None-Match answered {response.status_code}, not 304.')
+        return {
+            mode: {'bytes': total['bytes'] / iterations, 'cpu_ms': total['cpu'] / iterations * 1000}
+            for mode, total in totals.items()
+        }
+
+
+def saved(before, after):
+    return f'{(before - after) / before * 100:.0f}%' if before else 'n/a'
@@ -0,0 +1,75 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import Category, Product
+from products.search import LikeSearchBackend, get_search_backend
+
+
+WORDS = [
+    'laptop', 'phone', 'tablet', 'camera', 'speaker', 'monitor', 'keyboard', 'mouse', 'charger', 'cable',
+    'shirt', 'jacket', 'shoe', 'watch', 'lamp', 'chair', 'desk', 'bottle', 'kettle', 'blender',
+    'pro', 'max', 'mini', 'ultra', 'lite', 'wireless', 'portable', 'smart', 'classic', 'premium',
+]
+
+
+class Command(BaseCommand):
+    """
+    Compares the full-text backend with the LIKE search it replaced.
+    Synthetic products are generated inside a transaction that is rolled back at the end.
+    """
+    help = 'Benchmarks product search: full-text index vs icontains LIKE scans.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50000, help='Synthetic products to generate (0 uses the existing catalog).')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query and backend.')
+        parser.add_argument('--queries', default='lap,wireless,kettle,smart wat,premium', help='Comma-separated queries.')
+
+    def handle(self, *args, **options):
+        queries = [q.strip() for q in options['queries'].split(',') if q.strip()]
+        with transaction.atomic():
+            if options['products']:
+                self.generate(options['products'])
+            backends = [('like', LikeSearchBackend()), ('fulltext', get_search_backend())]
+
+            self.stdout.write(f"{'query':<16}{'backend':<10}{'matches':>9}{'ms/query':>10}")
+            for query in queries:
+                for label, backend in backends:
+                    elapsed, matches = self.measure(backend, query, options['repeat'])
+                    self.stdout.write(f'{query:<16}{label:<10}{matches:>9}{elapsed * 1000:>10.2f}')
+            transaction.set_rollback(True)
+
+    def generate(self, count):
+        rng = random.Random(42)
+        syllables = ['ka', 'lo', 'mi', 'ne', 'ra', 'tu', 'zo', 'vi', 'sa', 'de', 'po', 'gu', 'fe', 'bo', 'xi']
+        vocabulary = WORDS + [''.join(rng.choices(syllables, k=3)) for _ in range(3000)]
+        categories = Category.objects.bulk_create(
+            [Category(name=f'Benchmark {word} {i}') for i, word in enumerate(WORDS[:20])]
+        )
+        batch = []
+        for i in range(count):
+            batch.append(Product(
+                name=' '.join(rng.sample(vocabulary, 3)),
+                description=' '.join(rng.choices(vocabulary, k=12)),
+                price=rng.randint(1, 2000),
+                category=rng.choice(categories),
+                stock_quantity=rng.randint(0, 100),
+            ))
+            if len(batch) == 1000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+        get_search_backend().rebuild()  # bulk_create bypasses the index signals
+
+    def measure(self, backend, query, repeat):
+        """
+        Times one search page the way ProductViewSet.search serves it: a count plus the first 10 rows.
+        """
+        started = time.perf_counter()
+        for _ in range(repeat):
+            results = backend.search(Product.objects.all(), query)
+            matches = results.count()
+            list(results[:10])
+        return (time.perf_counter() - started) / repeat, matches
@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from products.models import Category, Product, Review
+from products.serializers import CategorySerializer, ProductSerializer, ReviewSerializer
+from ecommerce_api.fast_serializers import ValuesSerializer
+
+
+class Command(BaseCommand):
+    """
+    Measures the CPU time per row of fetching and serializing list pages the two ways
+    the list endpoints can: model instances through the ModelSerializer, and
+    values_list() rows through ValuesSerializer. The JSON of both is compared on every
+    page, so the run fails if the outputs ever differ.
+    """
+    help = 'Benchmarks list serialization: ModelSerializer vs the values_list() fast path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Rows per page (the list page size).')
+        parser.add_argument('--iterations', type=int, default=50, help='Pages fetched per scenario and path.')
+        parser.add_argument('--only', default='', help='Comma-separated scenarios to run (default: all).')
+
+    def handle(self, *args, **options):
+        scenarios = {
+            'products': (Product.objects.order_by('id'), ProductSerializer),
+            'categories': (Category.objects.order_by('id'), CategorySerializer),
+            'reviews': (Review.objects.order_by('id'), ReviewSerializer),
+        }
+        only = {name.strip() for name in options['only'].split(',') if name.strip()}
+        unknown = only - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        rows = options['rows']
+        self.stdout.write(f"{'scenario':<12}{'rows':>6}{'model us/row':>14}{'values us/row':>15}{'speedup':>9}")
+        for name, (queryset, serializer_class) in scenarios.items():
+            if only and name not in only:
+                continue
+            count = queryset.count()
+            if not count:
+                self.stdout.write(f'{name:<12}{"no rows; run seed_catalog first":>44}')
+                continue
+            pages = [queryset[offset:offset + rows] for offset in range(0, count, rows)][:options['iterations']]
+            model, values = self.measure(pages, serializer_class, options['iterations'])
+            page_rows = len(pages[0])
+            self.stdout.write(
+                f'{name:<12}{page_rows:>6}{model / page_rows * 1e6:>14.1f}{values / page_rows * 1e6:>15.1f}{model / values:>8.1f}x'
+            )
+
+    def measure(self, pages, serializer_class, iterations):
+        """
+        Returns the mean CPU seconds per page of each path, checking their output matches.
+        """
+        renderer = JSONRenderer()
+        fast = ValuesSerializer.for_serializer(serializer_class)
+        model_seconds = values_seconds = 0.0
+        for i in range(iterations):
+            page = pages[i % len(pages)]
+
+            started = time.process_time()
+            model_data = serializer_class(list(page.all()), many=True).data
+            model_seconds += time.process_time() - started
+
+            started = time.process_time()
+            values_data = fast.to_representation(list(fast.rows(page.all())))
+            values_seconds += time.process_time() - started
+
+            if renderer.render(model_data) != renderer.render(values_data):
+                raise CommandError(f'{serializer_class.__name__} and the values_list() path disagree.')
+        return model_seconds / iterations, values_seconds / iterations
@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import ProductImporter, read_rows
+
+
+class Command(BaseCommand):
+    """
+    Imports a CSV or NDJSON product feed with the same importer as POST /api/products/import/.
+    """
+    help = 'Upserts products by sku from a CSV or NDJSON feed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file, or - for stdin.')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Feed format (defaults to the file extension).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows upserted per transaction.')
+        parser.add_argument('--create-categories', action='store_true', help='Create unknown categories instead of rejecting the row.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else None)
+        if format is None:
+            raise CommandError('Cannot guess the feed format; pass --format.')
+
+        importer = ProductImporter(batch_size=options['batch_size'], create_categories=options['create_categories'])
+        if path == '-':
+            report = importer.run(read_rows(sys.stdin.buffer, format))
+        else:
+            try:
+                with open(path, 'rb') as feed:
+                    report = importer.run(read_rows(feed, format))
+            except OSError as exc:
+                raise CommandError(str(exc))
+
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        if report['errors_truncated']:
+            self.stderr.write(f"... {report['failed'] - len(report['errors'])} more failed rows not shown")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']}, updated {report['updated']}, failed {report['failed']}."
+        ))
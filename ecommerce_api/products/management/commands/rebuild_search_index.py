@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ecommerce_api.cache import bump_generation
+from products.models import Product
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the product full-text index from the products and categories tables.
+    Needed after bulk writes that bypass model signals (bulk_create, queryset.update, loaddata).
+    """
+    help = 'Rebuilds the product full-text search index.'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            count = backend.rebuild()
+            bump_generation(Product)  # Cached search responses came from the old index
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products with {type(backend).__name__}.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from products.ratings import recompute_ratings
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the rating aggregates stored on Product from the Review table.
+    Needed after bulk writes that bypass model signals, or to repair drift.
+    """
+    help = 'Recomputes avg_rating, review_count and the star histogram of every product.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products recomputed per batch.')
+
+    def handle(self, *args, **options):
+        checked, fixed = recompute_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} products, fixed {fixed}.'))
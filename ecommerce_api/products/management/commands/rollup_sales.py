@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.rollups import catch_up, get_state, rebuild
+
+
+class Command(BaseCommand):
+    """
+    Adds the order lines placed since the last run to the daily sales rollups. Meant to
+    run every few minutes from cron; on a fresh database it backfills the whole order
+    history, in batches of one transaction each. --rebuild counts everything again, e.g.
+    after order lines were deleted or products moved to another category.
+    """
+    help = 'Catches the daily sales rollups up with the new order lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Order line ids per transaction (default: SALES_ROLLUP_BATCH_SIZE).')
+        parser.add_argument('--settle', type=int, default=None, help='Leave orders younger than this many seconds (default: SALES_ROLLUP_SETTLE_SECONDS).')
+        parser.add_argument('--rebuild', action='store_true', help='Drop the rollups and count every order line again.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        if options['settle'] is not None and options['settle'] < 0:
+            raise CommandError('--settle must not be negative.')
+        run = rebuild if options['rebuild'] else catch_up
+        counted = run(batch_size=options['batch_size'], settle_seconds=options['settle'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {counted} order lines; the rollups now cover order lines up to #{get_state().last_item_id}.'
+        ))
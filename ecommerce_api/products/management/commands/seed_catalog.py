@@ -0,0 +1,215 @@
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from products.models import CartItem, Category, CategorySalesDaily, Order, OrderItem, Product, ProductSalesDaily, Review
+from products.ratings import STAR_FIELDS
+from products.search import get_search_backend
+from ecommerce_api.cache import bump_generation
+
+from .benchmark_search import WORDS
+
+
+SKU_PREFIX = 'seed-'
+USERNAME_PREFIX = 'seed-user-'
+CATEGORY_PREFIX = 'Seed '
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)  # Fixed, so the dates are reproducible too
+RATING_WEIGHTS = [5, 7, 15, 33, 40]  # Share of 1 to 5 star reviews
+
+
+class Command(BaseCommand):
+    """
+    Generates a large synthetic catalog for load testing: categories, products, users,
+    reviews and orders. The same --seed always produces the same rows.
+
+    Everything is written with chunked bulk_create, so the model signals don't fire;
+    the rating aggregates are computed while the reviews are generated and the search
+    index is rebuilt once at the end.
+    """
+    help = 'Seeds a large, deterministic catalog with users, orders and reviews for benchmarking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help='Products to generate.')
+        parser.add_argument('--categories', type=int, default=50, help='Categories to generate.')
+        parser.add_argument('--users', type=int, default=10000, help='Users to generate.')
+        parser.add_argument('--orders', type=int, default=50000, help='Orders to generate (1 to 4 lines each).')
+        parser.add_argument('--reviews', type=int, default=200000, help='Reviews to generate, at most one per user and product.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create.')
+        parser.add_argument('--password', default='seed-password', help='Password of every generated user.')
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded rows first.')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.seed = options['seed']
+        if options['products'] < 1 or options['categories'] < 1:
+            raise CommandError('At least one category and one product are needed.')
+        if options['reviews'] and not options['users']:
+            raise CommandError('Reviews need at least one user.')
+        if options['reviews'] > options['products'] * options['users']:
+            raise CommandError('Cannot generate more reviews than there are user and product pairs.')
+        if options['orders'] and not options['users']:
+            raise CommandError('Orders need at least one user.')
+
+        if options['clear']:
+            self.clear()
+        elif Product.objects.filter(sku__startswith=SKU_PREFIX).exists():
+            raise CommandError('The database already holds a seeded catalog; pass --clear to replace it.')
+
+        category_ids = self.seed_categories(options['categories'])
+        user_ids = self.seed_users(options['users'], options['password'])
+        product_ids = self.seed_products_and_reviews(
+            options['products'], category_ids, user_ids, options['reviews']
+        )
+        orders = self.seed_orders(options['orders'], user_ids, product_ids)
+
+        indexed = get_search_backend().rebuild()
+        bump_generation(Category, Product, Review)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(category_ids)} categories, {len(product_ids)} products, {len(user_ids)} users, "
+            f"{options['reviews']} reviews and {orders} orders; indexed {indexed} products."
+        ))
+
+    def rng(self, name):
+        # One generator per table, so changing one count doesn't reshuffle the other tables
+        return random.Random(f'{self.seed}-{name}')
+
+    def clear(self):
+        """
+        Deletes the seeded rows without loading them. The review and product signals
+        would otherwise run once per row; the search index is rebuilt at the end anyway.
+        """
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        products = Product.objects.filter(sku__startswith=SKU_PREFIX)
+        with transaction.atomic():
+            for queryset in (
+                CartItem.objects.filter(Q(cart__user__in=users) | Q(product__in=products)),
+                OrderItem.objects.filter(Q(order__user__in=users) | Q(product__in=products)),
+                Order.objects.filter(user__in=users),
+                Review.objects.filter(Q(user__in=users) | Q(product__in=products)),
+                ProductSalesDaily.objects.filter(product__in=products),
+                CategorySalesDaily.objects.filter(category__name__startswith=CATEGORY_PREFIX),
+                products,
+                Category.objects.filter(name__startswith=CATEGORY_PREFIX, product__isnull=True),
+            ):
+                queryset._raw_delete(queryset.db)
+            users.delete()
+
+    def bulk_insert(self, model, objects):
+        """
+        Inserts the objects in chunks of batch_size, one transaction per chunk,
+        and returns their primary keys.
+        """
+        pks, batch = [], []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                pks.extend(self.insert_batch(model, batch))
+                batch = []
+        if batch:
+            pks.extend(self.insert_batch(model, batch))
+        return pks
+
+    def insert_batch(self, model, batch):
+        with transaction.atomic():
+            return [obj.pk for obj in model.objects.bulk_create(batch)]
+
+    def seed_categories(self, count):
+        return self.bulk_insert(Category, (Category(name=f'{CATEGORY_PREFIX}{i:04d}') for i in range(count)))
+
+    def seed_users(self, count, password):
+        password = make_password(password)  # Hashed once; PBKDF2 per user would dominate the run
+        return self.bulk_insert(User, (
+            User(username=f'{USERNAME_PREFIX}{i:07d}', email=f'{USERNAME_PREFIX}{i:07d}@example.com', password=password)
+            for i in range(count)
+        ))
+
+    def seed_products_and_reviews(self, count, category_ids, user_ids, reviews):
+        """
+        Inserts the products, then their reviews. Review j goes to product j % count and
+        user (j // count + j % count) % users, which never repeats a (product, user) pair.
+        """
+        rng = self.rng('products')
+        review_rng = self.rng('reviews')
+        vocabulary = WORDS + [''.join(rng.choices('aeioubdgklmnprstvz', k=6)) for _ in range(3000)]
+        span = int(timedelta(days=365).total_seconds())
+        pending_reviews = {}  # Ratings per product index, for the chunk being inserted
+
+        def products():
+            for i in range(count):
+                ratings = [
+                    review_rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0]
+                    for _ in range(reviews // count + (1 if i < reviews % count else 0))
+                ]
+                pending_reviews[i] = ratings
+                stars = {field: ratings.count(star) for star, field in STAR_FIELDS.items()}
+                yield Product(
+                    sku=f'{SKU_PREFIX}{i:08d}',
+                    name=' '.join(rng.sample(vocabulary, 3)).title(),
+                    description=' '.join(rng.choices(vocabulary, k=20)),
+                    price=Decimal(rng.randint(100, 500000)).scaleb(-2),
+                    category_id=rng.choice(category_ids),
+                    stock_quantity=rng.choice([0] + [rng.randint(1, 500)] * 9),  # About 10% out of stock
+                    created_date=EPOCH + timedelta(seconds=rng.randrange(span)),
+                    avg_rating=sum(ratings) / len(ratings) if ratings else 0.0,
+                    review_count=len(ratings),
+                    **stars,
+                )
+
+        product_ids = []
+        batch = []
+        for product in products():
+            batch.append(product)
+            if len(batch) >= self.batch_size:
+                product_ids.extend(self.insert_products(batch, pending_reviews, product_ids, user_ids, count))
+                batch = []
+        if batch:
+            product_ids.extend(self.insert_products(batch, pending_reviews, product_ids, user_ids, count))
+        return product_ids
+
+    def insert_products(self, batch, pending_reviews, product_ids, user_ids, count):
+        offset = len(product_ids)
+        with transaction.atomic():
+            pks = [obj.pk for obj in Product.objects.bulk_create(batch)]
+            Review.objects.bulk_create(
+                [
+                    Review(
+                        product_id=pk,
+                        user_id=user_ids[(k + index) % len(user_ids)],
+                        rating=rating,
+                        text=f'Rated {rating} out of 5.',
+                    )
+                    for index, pk in enumerate(pks, start=offset)
+                    for k, rating in enumerate(pending_reviews.pop(index))
+                ],
+                batch_size=self.batch_size,
+            )
+        return pks
+
+    def seed_orders(self, count, user_ids, product_ids):
+        rng = self.rng('orders')
+        span = int(timedelta(days=365).total_seconds())
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            with transaction.atomic():
+                orders = Order.objects.bulk_create([
+                    Order(user_id=rng.choice(user_ids), order_date=EPOCH + timedelta(seconds=rng.randrange(span)))
+                    for _ in range(size)
+                ])
+                OrderItem.objects.bulk_create(
+                    [
+                        OrderItem(order_id=order.pk, product_id=product_id, quantity=rng.randint(1, 3))
+                        for order in orders
+                        for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(1, 4)))
+                    ],
+                    batch_size=self.batch_size,
+                )
+            created += size
+        return created
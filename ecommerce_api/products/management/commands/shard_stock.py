@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.inventory import recount_totals, shard_stock
+from products.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Splits the stock of hot products across counter rows (see products.inventory), changes
+    their number of shards, or rebalances them. Rebalancing evens out shards that orders
+    have drained unevenly, so orders keep finding a shard with enough left. --recount
+    repairs the stock_quantity and reserved_quantity totals of sharded products.
+    """
+    help = 'Shards, unshards (--shards 0), rebalances or recounts the stock counters of products.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='*', type=int, help='Products to shard (default with --rebalance: every sharded product).')
+        parser.add_argument('--shards', type=int, default=None, help='Number of shards; 0 goes back to the single stock_quantity row.')
+        parser.add_argument('--rebalance', action='store_true', help='Keep the number of shards and even out their quantities.')
+        parser.add_argument('--recount', action='store_true', help='Also recompute the totals of sharded products from their shards.')
+
+    def handle(self, *args, **options):
+        shards = options['shards']
+        if (shards is None) == (not options['rebalance']):
+            raise CommandError('Pass either --shards N or --rebalance.')
+        if shards is not None and not 0 <= shards <= 1000:
+            raise CommandError('--shards must be between 0 and 1000.')
+
+        products = Product.objects.filter(pk__in=options['product_ids']) if options['product_ids'] else None
+        if products is None:
+            if not options['rebalance']:
+                raise CommandError('Name the products to shard.')
+            products = Product.objects.filter(stock_shards__gt=0)
+        products = list(products.only('stock_shards', 'name').order_by('pk'))
+        missing = set(options['product_ids']) - {product.pk for product in products}
+        if missing:
+            raise CommandError(f"Unknown products: {', '.join(map(str, sorted(missing)))}")
+
+        for product in products:
+            shard_stock(product, product.stock_shards if shards is None else shards)
+            if options['recount']:
+                recount_totals(product)
+        self.stdout.write(self.style.SUCCESS(f'Updated the stock shards of {len(products)} products.'))
@@ -0,0 +1,117 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from rest_framework.exceptions import ValidationError
+
+from products.inventory import shard_stock
+from products.models import Product, OrderItem
+from products.serializers import OrderSerializer
+
+
+class Command(BaseCommand):
+    """
+    Places orders for the same products from many threads at once and checks that
+    stock never goes negative and every unit sold is accounted for by an OrderItem.
+    With --shards N it runs twice, with the single stock_quantity row and with the
+    stock split across N shards, to compare the two under the same contention.
+    """
+    help = 'Stress-tests concurrent order placement and reports orders/sec and oversell.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Number of concurrent buyers.')
+        parser.add_argument('--attempts', type=int, default=50, help='Orders attempted per thread.')
+        parser.add_argument('--products', type=int, default=2, help='Number of contended products.')
+        parser.add_argument('--stock', type=int, default=100, help='Initial stock of each product.')
+        parser.add_argument('--quantity', type=int, default=1, help='Units of every product per order.')
+        parser.add_argument('--shards', type=int, default=0, help='Also run with the stock split across this many shards.')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users, products and orders.')
+
+    def handle(self, *args, **options):
+        oversold = []
+        for shards in ([0, options['shards']] if options['shards'] else [0]):
+            oversold += self.run(options, shards)
+        if oversold:
+            raise CommandError(f"Oversold: {', '.join(oversold)}")
+        self.stdout.write(self.style.SUCCESS('No oversell detected.'))
+
+    def run(self, options, shards):
+        """
+        Runs the stress test with the given number of stock shards (0: the single row)
+        and returns the names of the products that were oversold.
+        """
+        products = [
+            Product.objects.create(name=f'Stress product {i}', description='Stress test', price=1, stock_quantity=options['stock'])
+            for i in range(options['products'])
+        ]
+        for product in products:
+            if shards:
+                shard_stock(product, shards)
+        users = [
+            User.objects.create_user(f'stress-buyer-{time.monotonic_ns()}-{i}')
+            for i in range(options['threads'])
+        ]
+        payload = {'items': [{'item': p.id, 'quantity': options['quantity']} for p in products]}
+        counts = {'placed': 0, 'rejected': 0, 'retries': 0}
+        lock = threading.Lock()
+
+        def buyer(user):
+            placed = rejected = retries = 0
+            try:
+                for _ in range(options['attempts']):
+                    while True:
+                        serializer = OrderSerializer(data=payload)
+                        try:
+                            serializer.is_valid(raise_exception=True)
+                            serializer.save(user=user)
+                            placed += 1
+                        except OperationalError:
+                            # SQLite reports "database is locked" under write contention; try again
+                            retries += 1
+                            time.sleep(0.001)
+                            continue
+                        except ValidationError:
+                            rejected += 1  # Out of stock
+                        break
+            finally:
+                connection.close()
+                with lock:
+                    counts['placed'] += placed
+                    counts['rejected'] += rejected
+                    counts['retries'] += retries
+
+        threads = [threading.Thread(target=buyer, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        oversold = []
+        for product in products:
+            product.refresh_from_db()
+            sold = OrderItem.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+            in_shards = product.shards.aggregate(total=Sum('quantity'))['total'] or 0
+            if (
+                product.stock_quantity < 0 or sold + product.stock_quantity != options['stock']
+                or (shards and in_shards != product.stock_quantity - product.reserved_quantity)
+            ):
+                oversold.append(product.name)
+
+        attempts = options['threads'] * options['attempts']
+        self.stdout.write(
+            f"shards={shards} threads={options['threads']} attempts={attempts} placed={counts['placed']} "
+            f"rejected={counts['rejected']} retries={counts['retries']} "
+            f"elapsed={elapsed:.3f}s orders/sec={counts['placed'] / elapsed:.1f}"
+        )
+
+        if not options['keep']:
+            for product in products:
+                product.delete()  # Cascades to the order lines and shards
+            for user in users:
+                user.delete()  # Cascades to the orders
+        return oversold
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from products.cart import sweep_expired_holds
+
+
+class Command(BaseCommand):
+    """
+    Releases the stock held by cart lines whose reservation has lapsed. Meant to run
+    every minute or so from cron; holds are released in batches, one transaction each.
+    """
+    help = 'Releases lapsed cart stock reservations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Lines per transaction (default: CART_SWEEP_BATCH_SIZE).')
+
+    def handle(self, *args, **options):
+        released = sweep_expired_holds(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} lapsed reservations.'))
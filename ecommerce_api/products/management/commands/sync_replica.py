@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ecommerce_api.replicas import copy_database
+
+
+class Command(BaseCommand):
+    """
+    Copies the primary SQLite database over the replica files of SQLITE_REPLICA_PATHS,
+    standing in for replication when trying out read replicas locally. With --every N
+    it copies every N seconds until interrupted, so the replicas lag by up to N seconds
+    like real ones. PostgreSQL replicas are kept up to date by the server.
+    """
+    help = 'Copies the primary SQLite database to its local stand-in replicas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=None, help='Copy again every this many seconds.')
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas:
+            raise CommandError('No replicas are configured; set SQLITE_REPLICA_PATHS.')
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('Only SQLite stand-in replicas can be synced; the database server replicates the others.')
+        source = connections['default'].settings_dict['NAME']
+        while True:
+            for alias in replicas:
+                copy_database(source, connections[alias].settings_dict['NAME'])
+            self.stdout.write(self.style.SUCCESS(f'Copied the primary database to {len(replicas)} replicas.'))
+            if options['every'] is None:
+                return
+            time.sleep(options['every'])
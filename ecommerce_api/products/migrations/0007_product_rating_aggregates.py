@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:38
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('products', 'Review')
+    rows = Review.objects.order_by().values('product_id').annotate(
+        review_count=Count('id'),
+        **{f'rating_{star}_count': Count('id', filter=Q(rating=star)) for star in range(1, 6)}
+    )
+    for row in rows:
+        product_id = row.pop('product_id')
+        total = sum(star * row[f'rating_{star}_count'] for star in range(1, 6))
+        Product.objects.filter(pk=product_id).update(avg_rating=total / row['review_count'], **row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='avg_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['avg_rating', 'id'], name='product_rating_id_idx'),
+        ),
+        migrations.RunPython(populate_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:14
+
+import django.db.models.deletion
+import products.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_review_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFTSIndex',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='fts_index', serialize=False, to='products.product')),
+                ('document', products.search.SearchDocumentField(db_column='products_product_fts')),
+            ],
+            options={
+                'db_table': 'products_product_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='products.product')),
+                ('document', products.search.SearchDocumentField()),
+            ],
+            options={
+                'db_table': 'products_product_search',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:02
+
+from django.core.management.commands.createcachetable import Command as CreateCacheTable
+from django.db import migrations
+
+
+# Table of the 'shared' DatabaseCache, which holds the response cache counters
+TABLE = 'shared_cache'
+
+
+def create_cache_table(apps, schema_editor):
+    command = CreateCacheTable()
+    command.verbosity = 0
+    command.create_table(schema_editor.connection.alias, TABLE, dry_run=False)
+
+
+def drop_cache_table(apps, schema_editor):
+    schema_editor.execute(f'DROP TABLE IF EXISTS {schema_editor.quote_name(TABLE)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_product_category_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, drop_cache_table),
+    ]
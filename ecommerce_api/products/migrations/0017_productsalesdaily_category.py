@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_categories(apps, schema_editor):
+    # The category at rollup time wasn't kept; the product's current one is the best guess
+    ProductSalesDaily = apps.get_model('products', 'ProductSalesDaily')
+    Product = apps.get_model('products', 'Product')
+    ProductSalesDaily.objects.update(
+        category_id=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('category_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_shared_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productsalesdaily',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='products.category'),
+        ),
+        migrations.RunPython(backfill_categories, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='productsalesdaily',
+            unique_together={('day', 'product', 'category')},
+        ),
+    ]
@@ -1,13 +1,16 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .search import SearchDocumentField
+
 
 class Category(models.Model):
     """
     Represents a category for products.
     """
     name = models.CharField(max_length=100, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Validator of the cached responses (see ecommerce_api.cache)
 
     def __str__(self):
         return self.name
@@ -17,29 +20,114 @@ class Product(models.Model):
     """
     Represents a product available for sale.
     """
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)  # Supplier key used by the bulk import
     name = models.CharField(max_length=255)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
     stock_quantity = models.IntegerField()
+    # Units held by carts (see products.cart); available stock is stock_quantity - reserved_quantity
+    reserved_quantity = models.PositiveIntegerField(default=0)
+    # Number of StockShard rows the available stock is split across; 0 when not sharded (see products.inventory)
+    stock_shards = models.PositiveSmallIntegerField(default=0)
     image_url = models.URLField(blank=True, null=True)
     created_date = models.DateTimeField(default=timezone.now)
+    # Review aggregates, maintained incrementally by products.ratings (see reconcile_ratings)
+    avg_rating = models.FloatField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    # Validator of the cached responses (see ecommerce_api.cache). save() sets it, and so
+    # must every UPDATE of a column the API shows (products.inventory, products.ratings)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keysets used by ProductCursorPagination
+            models.Index(fields=['created_date', 'id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['avg_rating', 'id'], name='product_rating_id_idx'),
+            # ProductFilter: category with a price range, and stock_available=true listings
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['created_date', 'id'], condition=models.Q(stock_quantity__gt=0), name='product_in_stock_idx'),
+        ]
+
+    # Counters only ever moved with UPDATEs (products.cart, products.inventory,
+    # products.ratings), which a save() of an instance loaded earlier must not overwrite
+    COUNTER_FIELDS = (
+        'reserved_quantity', 'stock_shards',
+        'avg_rating', 'review_count', 'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the stock as loaded, so the shards of a sharded product can be
+        recounted when stock_quantity is edited.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_stock = instance.__dict__.get('stock_quantity')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     def reduce_stock(self, quantity):
         """
-        Reduces the stock quantity of the product.
-        Returns True if stock was reduced, False otherwise.
+        Reduces the stock quantity of the product with a conditional UPDATE (see
+        products.inventory), so concurrent calls can't oversell; stock held by carts
+        isn't available. Returns True if stock was reduced, False otherwise.
         """
-        if self.stock_quantity >= quantity:
+        from .inventory import take_stock  # products.inventory imports this module
+
+        with transaction.atomic():
+            reduced = take_stock(self, quantity)
+        if reduced:
             self.stock_quantity -= quantity
-            self.save()
-            return True
-        return False
+        return reduced
 
     def __str__(self):
         return self.name
 
 
+class ProductFTSIndex(models.Model):
+    """
+    Row of the SQLite FTS5 search index of a product (see products.search), written with SQL only.
+    """
+    product = models.OneToOneField(
+        Product, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='fts_index',
+    )
+    document = SearchDocumentField(db_column='products_product_fts')  # FTS5's hidden column named after the table
+
+    class Meta:
+        managed = False
+        db_table = 'products_product_fts'
+
+
+class ProductSearchDocument(models.Model):
+    """
+    Row of the PostgreSQL tsvector search index of a product (see products.search), written with SQL only.
+    """
+    product = models.OneToOneField(
+        Product, primary_key=True, db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_document',
+    )
+    document = SearchDocumentField()
+
+    class Meta:
+        managed = False
+        db_table = 'products_product_search'
+
+
 class Order(models.Model):
     """
     Represents a customer order.
@@ -48,6 +136,12 @@ class Order(models.Model):
     order_date = models.DateTimeField(default=timezone.now)
     items = models.ManyToManyField('Product', through='OrderItem')
 
+    class Meta:
+        indexes = [
+            # A user's orders, newest first (OrderViewSet)
+            models.Index(fields=['user', '-order_date', '-id'], name='order_user_date_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.user.username} on {self.order_date}"
 
@@ -59,6 +153,7 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     product = models.ForeignKey('Product', on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # Product price when ordered
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in Order #{self.order.id}"
@@ -77,6 +172,120 @@ class Review(models.Model):
     class Meta:
         unique_together = ('product', 'user')  # One review per user per product
         ordering = ['-created_at']
+        indexes = [
+            # A product's reviews, newest first, with the id for keyset pagination
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_created_id_idx'),
+            # A product's reviews of one rating, newest first
+            models.Index(fields=['product', 'rating', '-created_at', '-id'], name='review_product_rating_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the product and rating as loaded, so the rating aggregates can be
+        moved when a review is edited.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_rating = (instance.__dict__.get('product_id'), instance.__dict__.get('rating'))
+        return instance
 
     def __str__(self):
         return f"Review for {self.product.name} by {self.user.username}"
+
+
+class StockShard(models.Model):
+    """
+    One of the counters a sharded product's available stock is split across (see products.inventory).
+    """
+    product = models.ForeignKey(Product, related_name='shards', on_delete=models.CASCADE)
+    index = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'index')
+
+    def __str__(self):
+        return f"Shard {self.index} of {self.product.name}: {self.quantity}"
+
+
+class Cart(models.Model):
+    """
+    A user's shopping cart. Its lines hold stock for a limited time (see products.cart).
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Cart of {self.user.username}"
+
+
+class CartItem(models.Model):
+    """
+    A product in a cart. While reserved_until is set, the quantity is counted in the
+    product's reserved_quantity; the hold lapses at reserved_until and is released by
+    the next sweep, after which the line stays in the cart without holding stock.
+    """
+    cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    reserved_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('cart', 'product')  # One line per product
+        indexes = [
+            # Sweeping lapsed holds, globally and per product
+            models.Index(fields=['reserved_until'], condition=models.Q(reserved_until__isnull=False), name='cartitem_reserved_until_idx'),
+            models.Index(fields=['product', 'reserved_until'], name='cartitem_product_reserved_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} in {self.cart}"
+
+
+class SalesRollupState(models.Model):
+    """
+    High-water mark of the sales rollups: the last OrderItem id counted in them (see products.rollups).
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_item_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} rolled up to item #{self.last_item_id}"
+
+
+class ProductSalesDaily(models.Model):
+    """
+    Units sold and revenue of a product on one day (UTC), from the order lines rolled up so far,
+    per category the product had when they were rolled up (as in CategorySalesDaily).
+    """
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        # Also the index of date range reports. NULL categories aren't deduplicated; products.rollups keeps one row per key
+        unique_together = ('day', 'product', 'category')
+
+    def __str__(self):
+        return f"{self.product.name} on {self.day}: {self.units} sold"
+
+
+class CategorySalesDaily(models.Model):
+    """
+    Units sold and revenue of a category on one day (UTC); category is null for
+    products without one. Summed over categories it gives the daily totals.
+    """
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        # Not unique: NULL categories wouldn't be deduplicated; products.rollups keeps one row per key
+        indexes = [models.Index(fields=['day', 'category'], name='category_sales_day_idx')]
+
+    def __str__(self):
+        return f"{self.category or 'Uncategorized'} on {self.day}: {self.units} sold"
@@ -0,0 +1,100 @@
+"""
+Rating aggregates stored on Product.
+
+Every review write moves the counters of one product with a single conditional
+UPDATE built from F() expressions, so concurrent reviews can't lose increments and
+the average is always derived from the per-star histogram rather than accumulated.
+recompute_ratings() rebuilds the same columns from the Review table in bulk.
+"""
+from django.db.models import Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import Product, Review
+
+
+STAR_FIELDS = {star: f'rating_{star}_count' for star in range(1, 6)}
+AGGREGATE_FIELDS = ['avg_rating', 'review_count'] + list(STAR_FIELDS.values())
+
+
+def apply_review_delta(product_id, rating, delta):
+    """
+    Adds (delta=1) or removes (delta=-1) one review with the given rating from a product.
+    """
+    if product_id is None or rating not in STAR_FIELDS:
+        return
+    # SET expressions are evaluated against the old row, so the new values are spelled out here.
+    new_count = F('review_count') + delta
+    new_total = sum(star * F(field) for star, field in STAR_FIELDS.items()) + rating * delta
+    Product.objects.filter(pk=product_id).update(
+        review_count=new_count,
+        **{STAR_FIELDS[rating]: F(STAR_FIELDS[rating]) + delta},
+        avg_rating=Case(
+            When(review_count__lte=-delta, then=Value(0.0)),
+            default=Cast(new_total, FloatField()) / Cast(new_count, FloatField()),
+            output_field=FloatField(),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def move_review(old, new):
+    """
+    Moves a review between (product_id, rating) pairs after an edit.
+    """
+    if old == new:
+        return
+    apply_review_delta(*old, -1)
+    apply_review_delta(*new, 1)
+
+
+def recompute_ratings(product_ids=None, batch_size=1000):
+    """
+    Recomputes the aggregates of the given products (all products by default) from the
+    Review table, one batch of products at a time, and writes back only the rows that drifted.
+    Returns (products checked, products fixed).
+    """
+    checked = fixed = 0
+    last_pk = 0
+    candidates = Product.objects.all()
+    if product_ids is not None:
+        candidates = candidates.filter(pk__in=product_ids)
+    while True:
+        products = list(
+            candidates.filter(pk__gt=last_pk).order_by('pk').only('pk', *AGGREGATE_FIELDS)[:batch_size]
+        )
+        if not products:
+            return checked, fixed
+        last_pk = products[-1].pk
+
+        stats = {
+            row['product_id']: row
+            for row in Review.objects.filter(product_id__in=[p.pk for p in products])
+            .order_by().values('product_id')
+            .annotate(
+                review_count=Count('id'),
+                **{field: Count('id', filter=Q(rating=star)) for star, field in STAR_FIELDS.items()}
+            )
+        }
+
+        stale = []
+        for product in products:
+            row = stats.get(product.pk, {})
+            expected = {field: row.get(field, 0) for field in STAR_FIELDS.values()}
+            expected['review_count'] = row.get('review_count', 0)
+            total = sum(star * expected[field] for star, field in STAR_FIELDS.items())
+            expected['avg_rating'] = total / expected['review_count'] if expected['review_count'] else 0.0
+
+            if any(
+                abs(getattr(product, field) - value) > 1e-9 if field == 'avg_rating' else getattr(product, field) != value
+                for field, value in expected.items()
+            ):
+                for field, value in expected.items():
+                    setattr(product, field, value)
+                product.updated_at = timezone.now()
+                stale.append(product)
+
+        if stale:
+            Product.objects.bulk_update(stale, AGGREGATE_FIELDS + ['updated_at'])
+        checked += len(products)
+        fixed += len(stale)
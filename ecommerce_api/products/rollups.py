@@ -0,0 +1,254 @@
+"""
+Daily sales rollups.
+
+Sales reports read ProductSalesDaily and CategorySalesDaily rather than scanning the
+order lines, so their cost depends on the date range, not on the order history.
+
+catch_up() adds the order lines created since its last run. OrderItem ids only grow,
+so the highest id counted so far (SalesRollupState) is a high-water mark. Each batch of
+new lines is summed per day, product and category in the database, then merged into the rollup
+rows in the transaction that moves the mark, so no line is counted twice.
+
+Lines whose order is younger than SALES_ROLLUP_SETTLE_SECONDS wait for the next run. With
+concurrent writers, a transaction that commits late can hold ids lower than lines already
+visible, and a mark moved past them would skip them. The rollups only ever grow: lines
+deleted after they were counted stay in them until rebuild().
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .facets import format_price
+from .models import CategorySalesDaily, OrderItem, ProductSalesDaily, SalesRollupState
+
+
+STATE_NAME = 'sales'
+DEFAULT_BATCH_SIZE = 10000
+DEFAULT_SETTLE_SECONDS = 60
+MAX_REPORT_DAYS = 3660
+DEFAULT_REPORT_DAYS = 30
+DAYS_PER_QUERY = 100  # Days of existing rollup rows looked up per query
+
+
+class MarkMoved(Exception):
+    """
+    Another catch_up() moved the high-water mark while this one was merging a batch.
+    """
+
+
+def get_state():
+    return SalesRollupState.objects.get_or_create(name=STATE_NAME)[0]
+
+
+def get_upper_bound(mark, cutoff):
+    """
+    Returns the last order line id that can be rolled up after mark: lines of orders
+    placed after cutoff, and everything after them, are left for later.
+    """
+    lines = OrderItem.objects.filter(id__gt=mark)
+    unsettled = lines.filter(order__order_date__gt=cutoff).aggregate(first=Min('id'))['first']
+    if unsettled is not None:
+        lines = lines.filter(id__lt=unsettled)
+    return lines.aggregate(last=Max('id'))['last']
+
+
+def catch_up(batch_size=None, settle_seconds=None):
+    """
+    Rolls up the order lines added since the last run, batch_size ids per transaction.
+    Returns the number of lines counted.
+    """
+    batch_size = batch_size or getattr(settings, 'SALES_ROLLUP_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    if settle_seconds is None:
+        settle_seconds = getattr(settings, 'SALES_ROLLUP_SETTLE_SECONDS', DEFAULT_SETTLE_SECONDS)
+    cutoff = timezone.now() - timedelta(seconds=settle_seconds)
+    counted = 0
+    while True:
+        state = get_state()
+        upper = get_upper_bound(state.last_item_id, cutoff)
+        if upper is None:
+            return counted
+        last = min(state.last_item_id + batch_size, upper)
+        try:
+            with transaction.atomic():
+                # Moving the mark first also takes the write lock early on SQLite
+                moved = SalesRollupState.objects.filter(pk=state.pk, last_item_id=state.last_item_id).update(
+                    last_item_id=last, updated_at=timezone.now()
+                )
+                if not moved:
+                    raise MarkMoved
+                counted += merge(OrderItem.objects.filter(id__gt=state.last_item_id, id__lte=last))
+        except MarkMoved:
+            continue  # Start again from the new mark
+
+
+def merge(lines):
+    """
+    Adds the order lines to the rollup rows and returns how many there were.
+    Revenue uses the price recorded on the line, or for lines older than that column
+    the current product price. The category is the product's at the time of the rollup,
+    kept in both rollups so that every report files a sale under the same category.
+    """
+    rows = list(
+        lines.order_by()
+        .values('product_id', day=TruncDate('order__order_date'), category_id=F('product__category_id'))
+        .annotate(
+            lines=Count('id'),
+            units=Sum('quantity'),
+            revenue=Sum(
+                F('quantity') * Coalesce('unit_price', 'product__price'),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+    )
+    products, categories = {}, {}
+    for row in rows:
+        product_key = (row['day'], row['product_id'], row['category_id'])
+        for sums, key in ((products, product_key), (categories, (row['day'], row['category_id']))):
+            units, revenue = sums.get(key, (0, 0))
+            sums[key] = (units + row['units'], revenue + row['revenue'])
+    add_to(ProductSalesDaily, ('product_id', 'category_id'), products)
+    add_to(CategorySalesDaily, ('category_id',), categories)
+    return sum(row['lines'] for row in rows)
+
+
+def add_to(model, key_fields, sums):
+    """
+    Adds (units, revenue) sums keyed on (day, *values of key_fields) to the rollup rows,
+    creating the missing ones. Existing rows are looked up by day and first key field.
+    """
+    key_field = key_fields[0]
+    keys_by_day = defaultdict(set)
+    for day, key, *_ in sums:
+        keys_by_day[day].add(key)
+    days = sorted(keys_by_day)
+    increments = []
+    for start in range(0, len(days), DAYS_PER_QUERY):
+        matches = Q()
+        for day in days[start:start + DAYS_PER_QUERY]:
+            keys = keys_by_day[day]
+            match = Q(**{f'{key_field}__in': keys - {None}})
+            if None in keys:
+                match |= Q(**{f'{key_field}__isnull': True})
+            matches |= Q(match, day=day)
+        for pk, day, *key in model.objects.filter(matches).values_list('pk', 'day', *key_fields):
+            found = sums.pop((day, *key), None)
+            if found is not None:  # Else a row of the product under another category
+                increments.append((*found, pk))
+    if increments:
+        # One statement for all the existing rows; bulk_update() would overwrite rather than add
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {quote(model._meta.db_table)} SET units = units + %s, revenue = revenue + %s WHERE id = %s",
+                increments,
+            )
+    model.objects.bulk_create([
+        model(day=day, units=units, revenue=revenue, **dict(zip(key_fields, key)))
+        for (day, *key), (units, revenue) in sums.items()
+    ], batch_size=1000)
+
+
+def rebuild(batch_size=None, settle_seconds=None):
+    """
+    Drops the rollups and counts every order line again. Reports are incomplete until it finishes.
+    """
+    with transaction.atomic():
+        ProductSalesDaily.objects.all().delete()
+        CategorySalesDaily.objects.all().delete()
+        SalesRollupState.objects.filter(name=STATE_NAME).update(last_item_id=0, updated_at=None)
+    return catch_up(batch_size, settle_seconds)
+
+
+def get_report_range(params):
+    """
+    Returns the (date_from, date_to) days of a report from the query parameters,
+    by default the last DEFAULT_REPORT_DAYS days including today.
+    """
+    today = timezone.localdate()
+    bounds = []
+    for name, default in (('date_from', today - timedelta(days=DEFAULT_REPORT_DAYS - 1)), ('date_to', today)):
+        value = params.get(name)
+        if not value:
+            bounds.append(default)
+            continue
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({name: 'Enter a date (YYYY-MM-DD).'})
+        bounds.append(day)
+    date_from, date_to = bounds
+    if date_from > date_to:
+        raise ValidationError({'date_to': 'Must not be before date_from.'})
+    if (date_to - date_from).days >= MAX_REPORT_DAYS:
+        raise ValidationError({'date_from': f'Reports cover at most {MAX_REPORT_DAYS} days.'})
+    return date_from, date_to
+
+
+def totals(queryset):
+    return queryset.annotate(units_sold=Sum('units'), total_revenue=Sum('revenue'))
+
+
+def daily_sales(date_from, date_to):
+    """
+    Units and revenue per day, every day of the range included.
+    """
+    rows = {
+        row['day']: row for row in
+        totals(CategorySalesDaily.objects.filter(day__range=(date_from, date_to)).values('day').order_by('day'))
+    }
+    days = []
+    for offset in range((date_to - date_from).days + 1):
+        day = date_from + timedelta(days=offset)
+        row = rows.get(day)
+        days.append({
+            'day': day,
+            'units': row['units_sold'] if row else 0,
+            'revenue': format_price(row['total_revenue'] if row else 0),
+        })
+    return days
+
+
+def product_sales(date_from, date_to, order='revenue', limit=20, category=None):
+    """
+    The best-selling products of the range by revenue or units. With a category, only
+    their sales made while they were in it: the category a line counts toward is the one
+    its product had when the line was rolled up, as in category_sales().
+    """
+    queryset = ProductSalesDaily.objects.filter(day__range=(date_from, date_to))
+    if category is not None:
+        queryset = queryset.filter(category_id=category)
+    field = 'total_revenue' if order == 'revenue' else 'units_sold'
+    rows = totals(queryset.values('product_id', 'product__name', 'product__sku')).order_by(f'-{field}', 'product_id')[:limit]
+    return [
+        {
+            'product': row['product_id'], 'name': row['product__name'], 'sku': row['product__sku'],
+            'units': row['units_sold'], 'revenue': format_price(row['total_revenue']),
+        }
+        for row in rows
+    ]
+
+
+def category_sales(date_from, date_to):
+    """
+    Units and revenue per category over the range, best-selling first. A line counts
+    toward the category its product had when the line was rolled up, not the current one.
+    """
+    rows = totals(
+        CategorySalesDaily.objects.filter(day__range=(date_from, date_to)).values('category_id', 'category__name')
+    ).order_by('-total_revenue', 'category_id')
+    return [
+        {
+            'category': row['category_id'], 'name': row['category__name'],
+            'units': row['units_sold'], 'revenue': format_price(row['total_revenue']),
+        }
+        for row in rows
+    ]
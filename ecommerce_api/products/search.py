@@ -0,0 +1,249 @@
+"""
+Full-text search over product name, description and category name.
+
+Each backend keeps a shadow index next to the products table, keeps it in sync
+through the signals in products/signals.py and turns a user query into a ranked,
+prefix-matching filter on a Product queryset:
+
+* SQLiteFTS5Backend  - an FTS5 virtual table ranked with bm25().
+* PostgresBackend    - a tsvector table with a GIN index ranked with ts_rank().
+* LikeSearchBackend  - the original icontains scan, used on any other database.
+
+The backend is picked from the database vendor, or from the PRODUCT_SEARCH_BACKEND
+setting (a dotted path) when it is set.
+
+The shadow tables are mapped by unmanaged models (products.models.ProductFTSIndex and
+ProductSearchDocument), so a search is an ordinary join: the match is the __match
+lookup of their SearchDocumentField, and the rank an annotation over the joined row.
+"""
+import re
+
+from django.conf import settings
+from django.db import NotSupportedError, connection
+from django.db.models import F, FloatField, Func, Lookup, Q, TextField, Value
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    """
+    Splits a user query into lowercase word tokens, dropping any search syntax.
+    """
+    return TOKEN_RE.findall(query.lower())
+
+
+class SearchDocumentField(TextField):
+    """
+    The document column of a search shadow table, only ever filtered with __match.
+    """
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    """
+    document__match=query: the backend's full-text match of a query built by build_query().
+    """
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        raise NotSupportedError(f'Full-text __match is not supported on {connection.vendor}.')
+
+    def as_sqlite(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} @@ to_tsquery('simple', {rhs})", [*lhs_params, *rhs_params]
+
+
+class BM25(Func):
+    """
+    FTS5 rank of the matched row, weighing name, description and category hits; lower is better.
+    """
+    function = 'bm25'
+    template = '%(function)s(%(expressions)s, 10.0, 1.0, 4.0)'
+    output_field = FloatField()
+
+
+class NegatedTSRank(Func):
+    """
+    ts_rank of a tsvector for a tsquery, negated so that lower is better like bm25().
+    """
+    function = 'ts_rank'
+    template = '-%(function)s(%(expressions)s)'
+    output_field = FloatField()
+
+
+class ToTSQuery(Func):
+    function = 'to_tsquery'
+    template = "%(function)s('simple', %(expressions)s)"
+
+
+class LikeSearchBackend:
+    """
+    Unindexed search with icontains on product and category names.
+    """
+    def index_products(self, product_ids):
+        pass
+
+    def index_category(self, category_id):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def rebuild(self):
+        return 0
+
+    def search(self, queryset, query):
+        return queryset.filter(Q(name__icontains=query) | Q(category__name__icontains=query)).annotate(
+            search_rank=Value(0.0, output_field=FloatField())  # Unranked; ties are ordered by id
+        )
+
+
+class ShadowTableBackend:
+    """
+    Base class for backends that keep one index row per product in a side table.
+    Subclasses provide the SQL; the index is always written set-based from the
+    products and categories tables so it can't drift from what was saved.
+    """
+    table = None
+    key_column = None
+    insert_sql = None  # INSERT ... SELECT over products joined to categories, ending in a WHERE clause
+    relation = None    # Product's reverse relation to the unmanaged model of the table
+
+    def execute(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    def index_products(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        self.execute(f'DELETE FROM {self.table} WHERE {self.key_column} IN ({placeholders})', product_ids)
+        self.execute(f'{self.insert_sql} p.id IN ({placeholders})', product_ids)
+
+    def index_category(self, category_id):
+        self.execute(
+            f'DELETE FROM {self.table} WHERE {self.key_column} IN '
+            f'(SELECT id FROM products_product WHERE category_id = %s)',
+            [category_id]
+        )
+        self.execute(f'{self.insert_sql} p.category_id = %s', [category_id])
+
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        self.execute(f'DELETE FROM {self.table} WHERE {self.key_column} IN ({placeholders})', product_ids)
+
+    def rebuild(self):
+        """
+        Reindexes every product and returns the number of rows written.
+        """
+        self.execute(f'DELETE FROM {self.table}')
+        return self.execute(f'{self.insert_sql} 1 = 1')
+
+    def build_query(self, tokens):
+        raise NotImplementedError
+
+    def rank(self, document, match):
+        """
+        Returns the expression ranking the joined index row for the match; lower is better.
+        """
+        raise NotImplementedError
+
+    def search(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+        match = self.build_query(tokens)
+        # The index is joined in so the match and the rank are computed once per query, not per row.
+        document = f'{self.relation}__document'
+        results = queryset.filter(**{f'{document}__match': match}).annotate(search_rank=self.rank(F(document), match))
+        if results.query.order_by:  # An explicit ?ordering= wins over relevance
+            return results
+        return results.order_by('search_rank', 'id')
+
+
+class SQLiteFTS5Backend(ShadowTableBackend):
+    """
+    SQLite FTS5 index. Every token is matched as a prefix, and all tokens must match.
+    Name hits weigh more than category hits, which weigh more than description hits.
+    """
+    table = 'products_product_fts'
+    key_column = 'rowid'
+    insert_sql = (
+        'INSERT INTO products_product_fts (rowid, name, description, category) '
+        "SELECT p.id, p.name, p.description, COALESCE(c.name, '') "
+        'FROM products_product p LEFT JOIN products_category c ON c.id = p.category_id WHERE'
+    )
+    relation = 'fts_index'
+
+    def build_query(self, tokens):
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def rank(self, document, match):
+        return BM25(document)  # The hidden column named after the table stands for the table
+
+
+class PostgresBackend(ShadowTableBackend):
+    """
+    PostgreSQL tsvector index with weighted name (A), category (B) and description (C).
+    """
+    table = 'products_product_search'
+    key_column = 'product_id'
+    insert_sql = (
+        'INSERT INTO products_product_search (product_id, document) '
+        "SELECT p.id, setweight(to_tsvector('simple', p.name), 'A') "
+        "|| setweight(to_tsvector('simple', COALESCE(c.name, '')), 'B') "
+        "|| setweight(to_tsvector('simple', p.description), 'C') "
+        'FROM products_product p LEFT JOIN products_category c ON c.id = p.category_id WHERE'
+    )
+    relation = 'search_document'
+
+    def build_query(self, tokens):
+        return ' & '.join(f'{token}:*' for token in tokens)
+
+    def rank(self, document, match):
+        return NegatedTSRank(document, ToTSQuery(Value(match)))
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTS5Backend,
+    'postgresql': PostgresBackend,
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """
+    Returns the configured search backend instance.
+    """
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+        backend_class = import_string(path) if path else VENDOR_BACKENDS.get(connection.vendor, LikeSearchBackend)
+        _backend = backend_class()
+    return _backend
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter that answers ?search= from the full-text index instead of LIKE scans.
+    """
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return get_search_backend().search(queryset, query)
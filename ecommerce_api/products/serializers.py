@@ -1,5 +1,9 @@
+from collections import defaultdict
+
+from django.db import transaction
 from rest_framework import serializers
-from .models import Product, Category, Order, OrderItem, Review
+from .models import Product, Category, Order, OrderItem, Review, CartItem
+from .inventory import take_stock
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -8,7 +12,7 @@ class CategorySerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Category
-        fields = '__all__'
+        exclude = ['updated_at']  # Cache validator
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -24,8 +28,11 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = '__all__'
-        read_only_fields = ('created_date',)
+        exclude = ['reserved_quantity', 'stock_shards', 'updated_at']  # Internal stock bookkeeping and the cache validator
+        read_only_fields = (
+            'created_date', 'avg_rating', 'review_count',
+            'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+        )
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -44,9 +51,9 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
     def get_item(self, obj):
         """
-        Returns the ID of the associated product.
+        Returns the ID of the associated product without loading the product row.
         """
-        return obj.product.id
+        return obj.product_id
 
     def to_representation(self, instance):
         """
@@ -72,21 +79,31 @@ class OrderSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         """
-        Creates a new Order instance and its associated OrderItems.
-        Manages stock quantity and raises a validation error if insufficient stock.
+        Creates a new Order instance and its associated OrderItems in a single transaction.
+        Stock is taken with conditional UPDATEs (see products.inventory) so concurrent orders
+        can never oversell or take stock held by carts; if any line is short the whole order is rolled back and a
+        validation error is raised.
         """
         items_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
 
+        # Merge repeated products and lock rows in id order so concurrent orders cannot deadlock
+        products = {}
+        quantities = defaultdict(int)
         for item_data in items_data:
             product = item_data['item']
-            quantity = item_data['quantity']
-            if product.stock_quantity >= quantity:
-                OrderItem.objects.create(order=order, product=product, quantity=quantity)
-                product.stock_quantity -= quantity
-                product.save()
-            else:
-                raise serializers.ValidationError(f"Insufficient stock for {product.name}")
+            products[product.pk] = product
+            quantities[product.pk] += item_data['quantity']
+
+        with transaction.atomic():
+            order = Order.objects.create(**validated_data)
+            for product_id in sorted(quantities):
+                if not take_stock(products[product_id], quantities[product_id]):
+                    raise serializers.ValidationError(f"Insufficient stock for {products[product_id].name}")
+
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=item_data['item'], quantity=item_data['quantity'], unit_price=item_data['item'].price)
+                for item_data in items_data
+            ])
 
         return order
 
@@ -95,8 +112,8 @@ class OrderSerializer(serializers.ModelSerializer):
         Overrides the default representation to include serialized OrderItem data.
         """
         representation = super().to_representation(instance)
-        order_items = instance.orderitem_set.all()  # Ensure we are using the related manager
-        representation['items'] = [OrderItemSerializer(item).data for item in order_items]
+        order_items = instance.orderitem_set.all()  # Served from the prefetch cache when OrderViewSet prefetched it
+        representation['items'] = OrderItemSerializer(order_items, many=True).data
         return representation
 
 
@@ -111,4 +128,24 @@ class ReviewSerializer(serializers.ModelSerializer):
         model = Review
         fields = ['id', 'product', 'user', 'rating', 'text', 'created_at']
         read_only_fields = ['id', 'user', 'created_at']
-        
\ No newline at end of file
+        
+
+class CartItemSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a cart line. reserved_until is when its stock hold lapses
+    (null once released); saving a line renews the hold (see products.cart).
+    """
+    quantity = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = CartItem
+        fields = ['id', 'product', 'quantity', 'reserved_until']
+        read_only_fields = ['id', 'reserved_until']
+
+    def validate_product(self, value):
+        """
+        A line's product can't be changed; remove the line and add the other product instead.
+        """
+        if self.instance is not None and value != self.instance.product:
+            raise serializers.ValidationError('The product of a cart line cannot be changed.')
+        return value
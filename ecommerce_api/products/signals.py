@@ -0,0 +1,138 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+from .models import Product, Category, Review
+from .search import get_search_backend
+from .inventory import shard_stock
+from .ratings import apply_review_delta, move_review, recompute_ratings
+from . import autocomplete
+from ecommerce_api.cache import bump_generation
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """
+    Reindexes a product in the full-text index whenever it is saved.
+    """
+    bump_generation(Product)
+    if raw:  # Fixture loading; the index is rebuilt with rebuild_search_index
+        return
+    get_search_backend().index_products([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def recount_stock_shards(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Splits the stock of a sharded product across its shards again when stock_quantity was edited.
+    """
+    if raw or created or not instance.stock_shards:
+        return
+    if instance.stock_quantity != getattr(instance, '_loaded_stock', None):
+        shard_stock(instance, instance.stock_shards, from_totals=True)
+        instance._loaded_stock = instance.stock_quantity
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """
+    Removes a deleted product from the full-text index.
+    """
+    bump_generation(Product)
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def index_category_products(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Reindexes the products of a category, since the category name is part of their document.
+    """
+    bump_generation(Category)
+    if raw or created:  # A new category has no products yet
+        return
+    get_search_backend().index_category(instance.pk)
+
+
+@receiver(post_delete, sender=Category)
+def forget_category(sender, instance, **kwargs):
+    """
+    Invalidates cached category responses when a category is deleted.
+    """
+    bump_generation(Category)
+
+
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Adds a new review to its product's rating aggregates, or moves an edited one.
+    """
+    bump_generation(Review)
+    if raw:  # Fixture loading; run reconcile_ratings afterwards
+        return
+    current = (instance.product_id, instance.rating)
+    if created:
+        apply_review_delta(*current, 1)
+    else:
+        loaded = getattr(instance, '_loaded_rating', None)
+        if loaded is None or None in loaded:
+            # Saved without being loaded first; the old rating is unknown
+            recompute_ratings(product_ids={instance.product_id})
+        else:
+            move_review(loaded, current)
+    instance._loaded_rating = current
+
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+    """
+    Removes a deleted review from its product's rating aggregates.
+    """
+    bump_generation(Review)
+    product_id, rating = getattr(instance, '_loaded_rating', (instance.product_id, instance.rating))
+    apply_review_delta(product_id, rating, -1)
+
+
+@receiver(post_save, sender=User)
+def rename_reviewer(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    Invalidates cached review responses, which show the username, when an existing
+    user is saved with a possibly new one.
+    """
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return  # A new user has no reviews yet; logins only save last_login
+    bump_generation(User)
+
+
+@receiver(post_save, sender=Product)
+def suggest_product(sender, instance, raw=False, **kwargs):
+    """
+    Applies a saved product to this process's autocomplete index once it is committed.
+    """
+    if raw:
+        return
+    pk, name, score = instance.pk, instance.name, instance.review_count
+    transaction.on_commit(lambda: autocomplete.record('products', pk, name, score))
+
+
+@receiver(post_delete, sender=Product)
+def unsuggest_product(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete.record('products', pk, None))
+
+
+@receiver(post_save, sender=Category)
+def suggest_category(sender, instance, raw=False, **kwargs):
+    """
+    Applies a saved category to this process's autocomplete index once it is committed,
+    ranked by its current number of products.
+    """
+    if raw:
+        return
+    pk, name = instance.pk, instance.name
+    transaction.on_commit(lambda: autocomplete.record('categories', pk, name, Product.objects.filter(category_id=pk).count()))
+
+
+@receiver(post_delete, sender=Category)
+def unsuggest_category(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete.record('categories', pk, None))
@@ -1,10 +1,49 @@
-from django.test import TestCase
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from asgiref.sync import sync_to_async
+from django.db import connection
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import CommandError
+from io import StringIO
+from contextlib import closing
+import csv
+import gzip
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import ValidationError
+from rest_framework.authtoken.models import Token
+from ecommerce_api.cache import check_counter_cache, generation_key, get_counter_cache, get_response_cache, modified_key
+from ecommerce_api.compression import brotli
+from ecommerce_api.databases import get_databases
+from ecommerce_api.fast_serializers import ValuesSerializer
+from ecommerce_api.metrics import metrics
+from ecommerce_api.replicas import PrimaryReplicaRouter, copy_database, pin_key
+from users.authentication import token_cache
 from django.contrib.auth.models import User
-from products.models import Product, Category, Order, OrderItem, Review
-from products.serializers import ProductSerializer, CategorySerializer, OrderSerializer, ReviewSerializer
+from django.utils import timezone
+from datetime import timedelta
+from products.models import Product, Category, Order, OrderItem, Review, CartItem, StockShard, ProductSalesDaily, CategorySalesDaily
+from products.serializers import ProductSerializer, CategorySerializer, OrderItemSerializer, OrderSerializer, ReviewSerializer
+from products.ratings import recompute_ratings
+from products.cart import sweep_expired_holds
+from products.importer import ProductImporter
+from products.inventory import shard_stock
+from products.rollups import catch_up, get_state
+from products.search import get_search_backend
+from products import autocomplete
+from products.async_views import ProductDetailView, ReviewListView
 
 class CategoryViewSetTests(TestCase):
     def setUp(self):
@@ -221,4 +260,1629 @@ class UserViewSetTests(TestCase):
     def test_user_retrieve_non_admin_self(self):
         user_token_response = self.client.post(reverse('api_token_auth'), {'username': 'testuser1', 'password': 'testpassword1'})
         user_token = user_token_response.data.get('token')
-        self.client.credentials(HTTP_AUTHORIZATION=f'Token {user_token}')
\ No newline at end of file
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {user_token}')
+
+class ProductCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Electronics')
+        base = timezone.now()
+        self.products = [
+            Product.objects.create(name=f'Item {i}', description='Test item', price=(i % 5) * 10 + 5, category=self.category, stock_quantity=1, created_date=base - timedelta(minutes=i // 3))
+            for i in range(25)
+        ]
+
+    def walk(self, params):
+        ids, url, pages = [], reverse('product-list'), 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            pages += 1
+            if not response.data['next']:
+                return ids, pages, response
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_walk_newest_first(self):
+        ids, pages, _ = self.walk({'pagination': 'cursor', 'page_size': 10})
+        expected = [p.id for p in sorted(self.products, key=lambda p: (p.created_date, p.id), reverse=True)]
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_cursor_walk_by_price_with_ties(self):
+        ids, _, _ = self.walk({'pagination': 'cursor', 'ordering': 'price', 'page_size': 4})
+        expected = [p.id for p in sorted(self.products, key=lambda p: (p.price, p.id))]
+        self.assertEqual(ids, expected)
+
+    def test_cursor_previous_link(self):
+        first = self.client.get(reverse('product-list'), {'pagination': 'cursor', 'ordering': '-price', 'page_size': 5})
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual([p['id'] for p in back.data['results']], [p['id'] for p in first.data['results']])
+
+    def test_cursor_search(self):
+        Product.objects.create(name='Laptop', description='Powerful laptop', price=1200.00, category=self.category, stock_quantity=10)
+        response = self.client.get(reverse('product-search'), {'q': 'item', 'pagination': 'cursor', 'page_size': 20})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_unsupported_ordering(self):
+        for ordering in ('review_count', 'price,-avg_rating'):
+            response = self.client.get(reverse('product-list'), {'pagination': 'cursor', 'ordering': ordering})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('ordering', response.data)
+        response = self.client.get(reverse('product-list'), {'ordering': 'review_count'})  # Page numbers order by anything
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_page_size(self):
+        for page_size, expected in (('3', 3), ('500', 25), ('0', 10), ('many', 10)):
+            response = self.client.get(reverse('product-list'), {'pagination': 'cursor', 'page_size': page_size})
+            self.assertEqual(len(response.data['results']), expected, page_size)
+
+    def test_cursor_search_keeps_relevance_order(self):
+        for i in range(3):
+            Product.objects.create(name=f'Bag {i}', description='Fits a laptop', price=30, category=self.category, stock_quantity=1)
+            Product.objects.create(name=f'Laptop {i}', description='Powerful', price=900, category=self.category, stock_quantity=1)
+        expected = [p['id'] for p in self.client.get(reverse('product-search'), {'q': 'laptop', 'page_size': 100}).data['results']]
+        ids, response = [], self.client.get(reverse('product-search'), {'q': 'laptop', 'pagination': 'cursor', 'page_size': 2})
+        while True:
+            ids.extend(p['id'] for p in response.data['results'])
+            self.assertNotIn('search_rank', response.data['results'][0])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(ids, expected)
+        self.assertEqual({p.name.split()[0] for p in Product.objects.filter(id__in=ids[:3])}, {'Laptop'})  # Name hits first
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('product-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_page_runs_no_count_query(self):
+        first = self.client.get(reverse('product-list'), {'pagination': 'cursor', 'page_size': 5})
+        with self.assertNumQueries(2):  # The versions of the page's rows, then the page; no COUNT(*) query
+            self.client.get(first.data['next'])
+
+
+class ProductReviewListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.product = Product.objects.create(name='Laptop', description='Powerful laptop', price=1200.00, stock_quantity=10)
+        other = Product.objects.create(name='Mouse', description='Wireless mouse', price=20.00, stock_quantity=10)
+        base = timezone.now()
+        for i in range(25):
+            user = User.objects.create_user(f'reviewer{i}')
+            review = Review.objects.create(product=self.product, user=user, rating=i % 5 + 1, text=f'Review {i}')
+            Review.objects.filter(pk=review.pk).update(created_at=base - timedelta(minutes=i // 3))  # Ties on created_at
+            Review.objects.create(product=other, user=user, rating=1)
+        self.reviews = list(Review.objects.filter(product=self.product))
+        self.url = reverse('product-reviews', args=[self.product.id])
+
+    def walk(self, params):
+        ids, pages = [], 0
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(review['id'] for review in response.data['results'])
+            pages += 1
+            if not response.data['next']:
+                return ids, pages
+            response = self.client.get(response.data['next'])
+
+    def test_walk_newest_first(self):
+        ids, pages = self.walk({'page_size': 10})
+        expected = [r.id for r in sorted(self.reviews, key=lambda r: (r.created_at, r.id), reverse=True)]
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+        ids, _ = self.walk({'page_size': 7, 'ordering': 'created_at'})
+        self.assertEqual(ids, expected[::-1])
+
+    def test_review_fields(self):
+        response = self.client.get(self.url, {'page_size': 1})
+        review = response.data['results'][0]
+        self.assertEqual(set(review), {'id', 'product', 'user', 'rating', 'text', 'created_at'})
+        self.assertEqual((review['product'], review['user']), (self.product.id, 'reviewer2'))  # Newest, and the highest id of the newest
+
+    def test_rating_filters(self):
+        ids, _ = self.walk({'rating': 5})
+        self.assertEqual(sorted(ids), sorted(r.id for r in self.reviews if r.rating == 5))
+        ids, _ = self.walk({'min_rating': 4, 'page_size': 3})
+        self.assertEqual(sorted(ids), sorted(r.id for r in self.reviews if r.rating >= 4))
+        response = self.client.get(self.url, {'rating': 'five'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unknown_product(self):
+        response = self.client.get(reverse('product-reviews', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(RESPONSE_CACHE_COUNTERS_ALIAS='default')  # Only the queries of the page
+    def test_query_count_is_constant(self):
+        with self.assertNumQueries(2):  # The product check + the page, usernames joined in
+            first = self.client.get(self.url, {'page_size': 5})
+        with self.assertNumQueries(2):
+            self.client.get(first.data['next'])
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {'page_size': 25, 'min_rating': 2})
+
+
+class OrderPlacementTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'buyerpassword')
+        self.client.force_authenticate(self.user)
+        self.product1 = Product.objects.create(name='Laptop', description='Powerful laptop', price=1200.00, stock_quantity=5)
+        self.product2 = Product.objects.create(name='Smartphone', description='Latest smartphone', price=800.00, stock_quantity=1)
+
+    def test_order_decrements_stock(self):
+        data = {'items': [{'item': self.product1.id, 'quantity': 2}, {'item': self.product2.id, 'quantity': 1}]}
+        response = self.client.post(reverse('order-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Product.objects.get(id=self.product1.id).stock_quantity, 3)
+        self.assertEqual(Product.objects.get(id=self.product2.id).stock_quantity, 0)
+        self.assertEqual(OrderItem.objects.filter(order_id=response.data['id']).count(), 2)
+
+    def test_short_line_rolls_back_whole_order(self):
+        data = {'items': [{'item': self.product1.id, 'quantity': 2}, {'item': self.product2.id, 'quantity': 2}]}
+        response = self.client.post(reverse('order-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Product.objects.get(id=self.product1.id).stock_quantity, 5)
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(OrderItem.objects.count(), 0)
+
+    def test_repeated_product_lines_are_checked_together(self):
+        data = {'items': [{'item': self.product1.id, 'quantity': 3}, {'item': self.product1.id, 'quantity': 3}]}
+        response = self.client.post(reverse('order-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Product.objects.get(id=self.product1.id).stock_quantity, 5)
+
+    def test_stale_stock_does_not_oversell(self):
+        serializer = OrderSerializer(data={'items': [{'item': self.product2.id, 'quantity': 1}]})
+        self.assertTrue(serializer.is_valid())
+        Product.objects.filter(id=self.product2.id).update(stock_quantity=0)  # Sold elsewhere after validation
+        with self.assertRaises(ValidationError):
+            serializer.save(user=self.user)
+        self.assertEqual(Product.objects.get(id=self.product2.id).stock_quantity, 0)
+
+
+class OrderConcurrencyTests(TransactionTestCase):
+    def test_concurrent_orders_never_oversell(self):
+        out = StringIO()
+        call_command('stress_orders', threads=6, attempts=10, products=2, stock=25, stdout=out)
+        self.assertIn('No oversell detected.', out.getvalue())
+        self.assertIn('placed=25 ', out.getvalue())
+
+    def test_concurrent_orders_on_sharded_stock_never_oversell(self):
+        out = StringIO()
+        call_command('stress_orders', threads=6, attempts=10, products=1, stock=25, shards=4, stdout=out)
+        self.assertIn('No oversell detected.', out.getvalue())
+        self.assertEqual(out.getvalue().count('placed=25 '), 2)
+
+    def test_benchmark_db_reads_while_writing(self):
+        Product.objects.create(name='Laptop', description='Powerful laptop', price=1200, stock_quantity=10)
+        out = StringIO()
+        call_command('benchmark_db', seconds=0.3, readers=2, writers=1, stdout=out)
+        self.assertIn('reads/sec=', out.getvalue())
+        self.assertIn('orders/sec=', out.getvalue())
+        self.assertEqual(Product.objects.count(), 1)  # The benchmark product is gone
+        self.assertFalse(User.objects.exists())
+
+
+class DatabaseProfileTests(TestCase):
+    """
+    DATABASE_PROFILE picks the database settings.
+    """
+    def test_profiles(self):
+        base_dir = settings.BASE_DIR
+        sqlite = get_databases(base_dir, {})['default']
+        self.assertEqual(sqlite['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('PRAGMA journal_mode = WAL', sqlite['OPTIONS']['init_command'])
+        self.assertTrue(sqlite['CONN_MAX_AGE'])
+        self.assertNotIn('CONN_MAX_AGE', get_databases(base_dir, {'DATABASE_PROFILE': 'sqlite-rollback'})['default'])
+        postgres = get_databases(base_dir, {'DATABASE_PROFILE': 'postgres', 'POSTGRES_HOST': 'db.internal'})['default']
+        self.assertEqual((postgres['ENGINE'], postgres['HOST']), ('django.db.backends.postgresql', 'db.internal'))
+        self.assertTrue('pool' in postgres['OPTIONS'] or postgres['CONN_HEALTH_CHECKS'])
+        with self.assertRaises(ImproperlyConfigured):
+            get_databases(base_dir, {'DATABASE_PROFILE': 'mysql'})
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite pragmas')
+    def test_sqlite_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 20000)
+
+
+@override_settings(DATABASE_REPLICAS=['default'])  # The test database stands in for the replica
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'buyerpassword')
+        self.product = Product.objects.create(name='Laptop', description='Powerful laptop', price=1200.00, stock_quantity=10)
+
+    def routed_reads(self, method, *args, **kwargs):
+        """
+        Makes the request and returns it with the set of databases the router picked
+        for its reads (None is the primary).
+        """
+        picked = []
+        db_for_read = PrimaryReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            picked.append(db_for_read(router, model, **hints))
+            return picked[-1]
+
+        with mock.patch.object(PrimaryReplicaRouter, 'db_for_read', spy):
+            response = method(*args, **kwargs)
+        return response, set(picked)
+
+    def test_catalog_reads_go_to_a_replica(self):
+        response, databases = self.routed_reads(self.client.get, reverse('product-detail', args=[self.product.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(databases, {'default'})
+
+    def test_writers_read_their_writes_from_the_primary(self):
+        self.client.force_authenticate(self.user)
+        payload = {'items': [{'item': self.product.id, 'quantity': 2}]}
+        response, databases = self.routed_reads(self.client.post, reverse('order-list'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(databases, {None})
+        self.assertTrue(caches['default'].get(pin_key(self.user)))
+
+        response, databases = self.routed_reads(self.client.get, reverse('order-list'))
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(databases, {None})
+
+        caches['default'].delete(pin_key(self.user))  # The pin expires
+        response, databases = self.routed_reads(self.client.get, reverse('order-list'))
+        self.assertEqual(databases, {'default'})
+
+    def test_failed_writes_do_not_pin(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse('order-list'), {'items': [{'item': self.product.id, 'quantity': 11}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNone(caches['default'].get(pin_key(self.user)))
+
+    def test_exports_stream_from_the_replica_picked_by_the_view(self):
+        self.client.force_authenticate(User.objects.create_superuser('exportadmin', 'admin@example.com', 'adminpassword'))
+        Order.objects.create(user=self.user)
+        for name in ('product-export', 'order-export'):
+            response, databases = self.routed_reads(self.client.get, reverse(name))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            with mock.patch.object(PrimaryReplicaRouter, 'db_for_read', return_value=None) as db_for_read:
+                content = b''.join(response.streaming_content)
+            self.assertTrue(content)
+            self.assertFalse([call for call in db_for_read.call_args_list if call.args[0] in (Product, Order)])
+            self.assertIn('default', databases)
+
+    def test_sync_replica(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source, target = os.path.join(directory, 'primary.sqlite3'), os.path.join(directory, 'replica.sqlite3')
+            with closing(sqlite3.connect(source)) as primary:
+                primary.execute('CREATE TABLE item (name TEXT)')
+                primary.execute("INSERT INTO item VALUES ('laptop')")
+                primary.commit()
+            copy_database(source, target)
+            with closing(sqlite3.connect(target)) as replica:
+                self.assertEqual(replica.execute('SELECT name FROM item').fetchall(), [('laptop',)])
+        with override_settings(DATABASE_REPLICAS=[]), self.assertRaises(CommandError):
+            call_command('sync_replica', stdout=StringIO())
+
+
+class OrderListQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'buyerpassword')
+        self.client.force_authenticate(self.user)
+        self.products = [
+            Product.objects.create(name=f'Item {i}', description='Test item', price=10, stock_quantity=100)
+            for i in range(3)
+        ]
+
+    def place_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(user=self.user)
+            OrderItem.objects.bulk_create([OrderItem(order=order, product=product, quantity=2) for product in self.products])
+
+    def test_order_list_items(self):
+        self.place_orders(1)
+        response = self.client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['items'][0]['item'], self.products[0].id)
+        self.assertEqual(response.data[0]['items'][0]['quantity'], 2)
+
+    def test_order_list_query_count_is_constant(self):
+        self.place_orders(5)
+        with self.assertNumQueries(2):  # Orders + prefetched order lines
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(len(response.data), 5)
+
+        self.place_orders(45)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(len(response.data), 50)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Electronics')
+        self.laptop = Product.objects.create(name='Laptop Pro', description='Powerful laptop', price=1200.00, category=self.category, stock_quantity=10)
+        self.bag = Product.objects.create(name='Carry Bag', description='Fits any laptop', price=40.00, stock_quantity=10)
+
+    def search(self, query):
+        response = self.client.get(reverse('product-search'), {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product['id'] for product in response.data['results']]
+
+    def test_search_ranks_name_matches_first(self):
+        self.assertEqual(self.search('laptop'), [self.laptop.id, self.bag.id])
+
+    def test_search_prefix_and_all_terms(self):
+        self.assertEqual(self.search('lap pro'), [self.laptop.id])
+        self.assertEqual(self.search('electro'), [self.laptop.id])
+
+    def test_search_ignores_query_syntax(self):
+        self.assertEqual(self.search('"laptop*" -('), [self.laptop.id, self.bag.id])
+        self.assertEqual(self.search('***'), [])
+
+    def test_index_follows_product_and_category_writes(self):
+        self.laptop.name = 'Notebook'
+        self.laptop.save()
+        self.assertEqual(self.search('notebook'), [self.laptop.id])
+        self.category.name = 'Computers'
+        self.category.save()
+        self.assertEqual(self.search('computers'), [self.laptop.id])
+        self.assertEqual(self.search('electronics'), [])
+        self.bag.delete()
+        self.assertEqual(self.search('laptop'), [self.laptop.id])
+
+    def test_search_composes_with_querysets(self):
+        results = get_search_backend().search(Product.objects.filter(price__lt=100), 'laptop')
+        self.assertEqual(list(results.values_list('id', flat=True)), [self.bag.id])
+        self.assertEqual(list(Category.objects.filter(product__in=get_search_backend().search(Product.objects.all(), 'pro'))), [self.category])
+
+    def test_list_search_filter_uses_index(self):
+        response = self.client.get(reverse('product-list'), {'search': 'carry'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['id'] for p in response.data['results']], [self.bag.id])
+
+    def test_rebuild_search_index(self):
+        Product.objects.filter(id=self.bag.id).update(name='Backpack')  # Bypasses the signals
+        self.assertEqual(self.search('backpack'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('backpack'), [self.bag.id])
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete.reset()
+        self.addCleanup(autocomplete.reset)
+        self.client = APIClient()
+        self.electronics = Category.objects.create(name='Electronics')
+        self.cables = Category.objects.create(name='Wire & Cables')
+        self.mouse = Product.objects.create(name='Logitech Wireless Mouse', description='Mouse', price=30.00, category=self.electronics, stock_quantity=10)
+        self.charger = Product.objects.create(name='Wireless Charger', description='Charger', price=20.00, category=self.cables, stock_quantity=10)
+        self.mug = Product.objects.create(name='Café Crème Mug', description='Mug', price=8.00, category=self.electronics, stock_quantity=10)
+        Product.objects.filter(id=self.charger.id).update(review_count=5)
+        autocomplete.build()  # What the startup thread does, here in the test transaction
+
+    def suggest(self, query, **params):
+        response = self.client.get(reverse('product-autocomplete'), {'q': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {kind: [item['name'] for item in items] for kind, items in response.data.items()}
+
+    def test_prefix_of_any_word_most_popular_first(self):
+        self.assertEqual(self.suggest('wire'), {'products': ['Wireless Charger', 'Logitech Wireless Mouse'], 'categories': ['Wire & Cables']})
+        self.assertEqual(self.suggest('e'), {'products': [], 'categories': ['Electronics']})
+        self.assertEqual(self.suggest('wireless ch'), {'products': ['Wireless Charger'], 'categories': []})
+        self.assertEqual(self.suggest(''), {'products': [], 'categories': []})
+
+    def test_case_and_accents_ignored(self):
+        self.assertEqual(self.suggest('CAFE cre')['products'], ['Café Crème Mug'])
+        self.assertEqual(self.suggest('crème')['products'], ['Café Crème Mug'])
+
+    def test_categories_ranked_by_products(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Wireless')
+        self.assertEqual(self.suggest('wire')['categories'], ['Wire & Cables', 'Wireless'])
+
+    def test_limit(self):
+        self.assertEqual(self.suggest('wire', limit=1)['products'], ['Wireless Charger'])
+        for limit in ('0', '21', 'many'):
+            response = self.client.get(reverse('product-autocomplete'), {'q': 'wire', 'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('limit', response.data)
+
+    def test_first_build_runs_in_the_background(self):
+        autocomplete.reset()
+        with mock.patch('threading.Thread') as thread:
+            for _ in range(2):
+                response = self.client.get(reverse('product-autocomplete'), {'q': 'wire'})
+                self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+                self.assertEqual(response['Retry-After'], '5')
+        self.assertEqual(thread.call_count, 1)  # One build claimed under the lock
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Wired Headset', description='Headset', price=15.00, stock_quantity=1)
+        since, = thread.call_args.kwargs['args']
+        autocomplete.rebuild(since)
+        self.assertEqual(self.suggest('wired')['products'], ['Wired Headset'])
+        self.assertEqual(autocomplete.stats()['overlay']['products'], 1)  # Recorded while building
+
+    def test_built_once_then_answered_from_memory(self):
+        self.suggest('wire')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('logi')['products'], ['Logitech Wireless Mouse'])
+
+    def test_follows_committed_writes(self):
+        self.suggest('wire')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mouse.name = 'Logitech Silent Mouse'
+            self.mouse.save()
+            self.charger.delete()
+            Product.objects.create(name='Wired Headset', description='Headset', price=15.00, category=self.cables, stock_quantity=1, review_count=9)
+            self.electronics.name = 'Gadgets'
+            self.electronics.save()
+        self.assertEqual(self.suggest('wire'), {'products': ['Wired Headset'], 'categories': ['Wire & Cables']})
+        self.assertEqual(self.suggest('silent')['products'], ['Logitech Silent Mouse'])
+        self.assertEqual(self.suggest('gad')['categories'], ['Gadgets'])
+        self.assertEqual(self.suggest('elec')['categories'], [])
+
+    def test_follows_committed_imports(self):
+        self.suggest('wire')
+        rows = [
+            {'sku': 'HDS-1', 'name': 'Wired Headset', 'price': '15', 'stock_quantity': '1'},
+            {'sku': 'MUG-1', 'name': 'Wireless Mug', 'price': '8', 'stock_quantity': '1'},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImporter(batch_size=1).run(rows)
+        self.assertEqual(autocomplete.stats()['overlay']['products'], 2)
+        self.assertEqual(self.suggest('wire')['products'], ['Wireless Charger', 'Logitech Wireless Mouse', 'Wired Headset', 'Wireless Mug'])
+
+    def test_rebuilt_when_overlay_full(self):
+        self.suggest('wire')
+        with mock.patch.object(autocomplete, 'OVERLAY_LIMIT', 1), mock.patch('threading.Thread') as thread:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.mug.save()
+            self.suggest('mug')
+        since, = thread.call_args.kwargs['args']
+        autocomplete.rebuild(since)  # What the thread runs, here in the test transaction
+        self.assertEqual(autocomplete.stats()['overlay'], {'products': 0, 'categories': 0})
+        self.assertEqual(self.suggest('mug')['products'], ['Café Crème Mug'])
+
+    def test_precomputed_prefixes_match_scan(self):
+        words = ['alpha', 'beta', 'gamma', 'delta', 'epsilon']
+        items = [(pk, f'{words[pk % 5]} {words[pk * 7 % 5]} item{pk}', pk * 37 % 101) for pk in range(1, 2000)]
+        index = autocomplete.PrefixIndex(items)
+        self.assertIn('a', index.top)
+        for prefix in ('a', 'al', 'item1', 'item19', 'delta', 'zeta'):
+            expected = sorted(
+                (item for item in items if any(word.startswith(prefix) for word in item[1].split())),
+                key=lambda item: (item[2], -item[0]), reverse=True,
+            )[:5]
+            self.assertEqual([index.ids[item] for item in index.search(prefix, 5)], [item[0] for item in expected], prefix)
+
+    def test_memory_footprint_in_metrics(self):
+        autocomplete.reset()
+        self.assertIsNone(autocomplete.stats())
+        autocomplete.build()
+        self.assertEqual(autocomplete.stats()['names'], {'products': 3, 'categories': 2})
+        self.client.force_authenticate(User.objects.create_superuser('acadmin', 'admin@example.com', 'adminpassword'))
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertRegex(body, r'autocomplete_index_bytes [1-9]\d*')
+        self.assertIn('autocomplete_index_names{kind="products",part="index"} 3', body)
+
+
+class ProductRatingAggregateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [User.objects.create_user(f'reviewer{i}', f'reviewer{i}@example.com', 'reviewerpassword') for i in range(3)]
+        self.product1 = Product.objects.create(name='Laptop', description='Powerful laptop', price=1200.00, stock_quantity=10)
+        self.product2 = Product.objects.create(name='Smartphone', description='Latest smartphone', price=800.00, stock_quantity=20)
+
+    def review(self, user, product, rating):
+        self.client.force_authenticate(user)
+        response = self.client.post(reverse('review-list'), {'product': product.id, 'rating': rating, 'text': 'Review'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def assertAggregates(self, product, avg_rating, histogram):
+        product.refresh_from_db()
+        self.assertAlmostEqual(product.avg_rating, avg_rating)
+        self.assertEqual(product.review_count, sum(histogram))
+        self.assertEqual([getattr(product, f'rating_{star}_count') for star in range(1, 6)], histogram)
+
+    def test_aggregates_follow_review_writes(self):
+        self.review(self.users[0], self.product1, 5)
+        review_id = self.review(self.users[1], self.product1, 2)
+        self.assertAggregates(self.product1, 3.5, [0, 1, 0, 0, 1])
+
+        self.client.force_authenticate(self.users[1])
+        response = self.client.patch(reverse('review-detail', args=[review_id]), {'rating': 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertAggregates(self.product1, 4.5, [0, 0, 0, 1, 1])
+
+        response = self.client.patch(reverse('review-detail', args=[review_id]), {'product': self.product2.id}, format='json')
+        self.assertAggregates(self.product1, 5.0, [0, 0, 0, 0, 1])
+        self.assertAggregates(self.product2, 4.0, [0, 0, 0, 1, 0])
+
+        response = self.client.delete(reverse('review-detail', args=[review_id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertAggregates(self.product2, 0.0, [0, 0, 0, 0, 0])
+
+    def test_save_of_stale_instance_keeps_aggregates(self):
+        stale = Product.objects.get(id=self.product1.id)
+        self.review(self.users[0], self.product1, 5)
+        stale.name = 'Laptop Pro'
+        stale.save()
+        self.assertAggregates(self.product1, 5.0, [0, 0, 0, 0, 1])
+        self.assertEqual(self.product1.name, 'Laptop Pro')
+
+    def test_reconcile_ratings_fixes_drift(self):
+        Review.objects.bulk_create([Review(product=self.product1, user=user, rating=rating) for user, rating in zip(self.users, [1, 4, 4])])
+        self.assertAggregates(self.product1, 0.0, [0, 0, 0, 0, 0])  # bulk_create bypasses the signals
+        out = StringIO()
+        call_command('reconcile_ratings', batch_size=1, stdout=out)
+        self.assertIn('Checked 2 products, fixed 1.', out.getvalue())
+        self.assertAggregates(self.product1, 3.0, [1, 0, 0, 2, 0])
+
+    def test_filter_and_order_by_rating(self):
+        self.review(self.users[0], self.product1, 3)
+        self.review(self.users[0], self.product2, 5)
+        self.review(self.users[1], self.product2, 4)
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse('product-list'), {'min_rating': 4})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.product2.id])
+        response = self.client.get(reverse('product-list'), {'ordering': '-avg_rating'})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.product2.id, self.product1.id])
+        self.assertEqual(response.data['results'][0]['review_count'], 2)
+        response = self.client.get(reverse('product-list'), {'min_reviews': 2})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.product2.id])
+
+
+class CatalogResponseCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser('adminuser', 'admin@example.com', 'adminpassword')
+        self.category = Category.objects.create(name='Electronics')
+        self.product = Product.objects.create(name='Laptop', description='Powerful laptop', price=1200.00, category=self.category, stock_quantity=10)
+
+    def test_repeated_reads_only_check_versions(self):
+        url = reverse('product-detail', args=[self.product.id])
+        self.client.get(url)
+        with self.assertNumQueries(1):  # The row's updated_at
+            response = self.client.get(url)
+        self.assertEqual(response.data['name'], 'Laptop')
+        self.client.get(reverse('product-list'), {'page_size': 5, 'price_min': 100})
+        with self.assertNumQueries(2):  # The count and the versions of the page's rows
+            self.client.get(reverse('product-list'), {'price_min': 100, 'page_size': 5})  # Same params, any order
+
+    def test_writes_invalidate(self):
+        self.client.get(reverse('product-search'), {'q': 'laptop'})
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.patch(reverse('product-detail', args=[self.product.id]), {'name': 'Laptop Pro'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('product-search'), {'q': 'laptop'})
+        self.assertEqual(response.data['results'][0]['name'], 'Laptop Pro')
+
+        self.client.get(reverse('category-list'))
+        self.category.name = 'Computers'
+        self.category.save()  # Admin and ORM writes invalidate too
+        self.assertEqual(self.client.get(reverse('category-list')).data[0]['name'], 'Computers')
+
+    def test_order_placement_invalidates_stock(self):
+        url = reverse('product-detail', args=[self.product.id])
+        self.assertEqual(self.client.get(url).data['stock_quantity'], 10)
+        self.client.force_authenticate(self.admin_user)
+        self.client.post(reverse('order-list'), {'items': [{'item': self.product.id, 'quantity': 3}]}, format='json')
+        self.assertEqual(self.client.get(url).data['stock_quantity'], 7)
+
+    def test_stock_writes_only_invalidate_their_rows(self):
+        other = Product.objects.create(name='Mouse', description='Wireless mouse', price=20.00, category=self.category, stock_quantity=5)
+        detail = reverse('product-detail', args=[self.product.id])
+        etag = self.client.get(detail)['ETag']
+        list_etag = self.client.get(reverse('product-list'))['ETag']
+        self.client.force_authenticate(self.admin_user)
+        self.client.post(reverse('order-list'), {'items': [{'item': other.id, 'quantity': 1}]}, format='json')
+        self.assertEqual(self.client.get(detail, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # The page shows the mouse
+        self.assertEqual({p['name']: p['stock_quantity'] for p in response.data['results']}['Mouse'], 4)
+
+    def test_cache_stats(self):
+        url = reverse('category-list')
+        self.client.get(url)
+        self.client.get(url)
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.get(reverse('cache_stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(response.data['hits'], 1)
+        self.assertGreaterEqual(response.data['misses'], 1)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('cache_stats')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': os.path.join(tempfile.gettempdir(), 'ecommerce-api-test-cache')}},
+    RESPONSE_CACHE_COUNTERS_ALIAS='default',
+)
+class FileBasedResponseCacheTests(TestCase):
+    def test_file_cache_serves_and_invalidates(self):
+        category = Category.objects.create(name='Electronics')
+        self.client.get(reverse('category-detail', args=[category.id]))
+        with self.assertNumQueries(1):  # The row's updated_at
+            self.client.get(reverse('category-detail', args=[category.id]))
+        category.name = 'Computers'
+        category.save()
+        self.assertEqual(self.client.get(reverse('category-detail', args=[category.id])).data['name'], 'Computers')
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        get_response_cache().clear()
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser('adminuser', 'admin@example.com', 'adminpassword')
+        self.user = User.objects.create_user('reviewer', 'reviewer@example.com', 'reviewerpassword')
+        self.product = Product.objects.create(name='Laptop', description='Powerful laptop', price=1200.00, stock_quantity=10)
+        Review.objects.create(product=self.product, user=self.user, rating=5, text='Great')
+
+    def backdate_writes(self, *models):
+        """
+        Pretends the models were last written a minute ago: Last-Modified is only sent
+        once the second of the last write is over.
+        """
+        get_counter_cache().set_many({modified_key(model): time.time() - 60 for model in models}, timeout=None)
+        for model in models:
+            if any(field.name == 'updated_at' for field in model._meta.fields):
+                model.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+
+    def test_if_none_match(self):
+        url = reverse('product-detail', args=[self.product.id])
+        response = self.client.get(url)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        etag = response['ETag']
+        with self.assertNumQueries(1):  # The row's updated_at
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual((response.content, response['ETag']), (b'', etag))
+        self.assertNotEqual(self.client.get(url, HTTP_ACCEPT='text/html')['ETag'], etag)  # Another body
+
+        self.client.force_authenticate(self.admin_user)
+        self.client.patch(url, {'name': 'Laptop Pro'}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'Laptop Pro')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since(self):
+        category = Category.objects.create(name='Electronics')
+        url = reverse('category-detail', args=[category.id])
+        self.assertNotIn('Last-Modified', self.client.get(url))  # Written this very second
+        self.backdate_writes(Category)
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        category.name = 'Computers'
+        category.save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'Computers')
+        self.assertNotIn('Last-Modified', self.client.get(reverse('category-list')))  # A list can lose rows
+
+        url = reverse('product-reviews', args=[self.product.id])  # Versioned by the model counters
+        self.backdate_writes(Product, Review, User)
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_review_listings(self):
+        listings = [
+            (reverse('product-reviews', args=[self.product.id]), lambda data: data['results']),
+            (f"{reverse('review-list')}?product_id={self.product.id}", lambda data: data),  # Not paginated
+        ]
+        for url, get_reviews in listings:
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+            self.user.username = 'critic'
+            self.user.save()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(get_reviews(response.data)[0]['user'], 'critic')
+            self.user.username = 'reviewer'
+            self.user.save()
+
+        url = reverse('product-reviews', args=[self.product.id])
+        etag = self.client.get(url)['ETag']
+        Review.objects.create(product=self.product, user=self.admin_user, rating=3)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_counters_shared_between_workers(self):
+        self.assertEqual(check_counter_cache(None), [])
+        url = reverse('product-reviews', args=[self.product.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        caches['shared'].incr(generation_key(Review))  # A write in another worker process
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @override_settings(RESPONSE_CACHE_COUNTERS_ALIAS='default')
+    def test_process_local_counters_warned_on_deploy_check(self):
+        self.assertEqual([warning.id for warning in check_counter_cache(None)], ['ecommerce_api.W001'])
+
+    def test_compression(self):
+        for i in range(20):
+            Product.objects.create(name=f'Item {i}', description='Test item ' * 10, price=10, stock_quantity=1)
+        url = reverse('product-list')
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        small = self.client.get(reverse('product-detail', args=[self.product.id]), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', small)  # Under COMPRESSION_MIN_BYTES
+        if brotli is not None:
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(brotli.decompress(response.content), plain.content)
+
+
+class ProductBulkImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser('adminuser', 'admin@example.com', 'adminpassword')
+        self.client.force_authenticate(self.admin_user)
+        self.category = Category.objects.create(name='Electronics')
+        self.existing = Product.objects.create(sku='LAP-1', name='Laptop', description='Old', price=1000, category=self.category, stock_quantity=1)
+
+    def post_feed(self, body, content_type, **params):
+        url = reverse('product-bulk-import')
+        if params:
+            url += '?' + '&'.join(f'{k}={v}' for k, v in params.items())
+        return self.client.generic('POST', url, body, content_type=content_type)
+
+    def test_csv_upsert_with_row_errors(self):
+        feed = (
+            'sku,name,description,price,category,stock_quantity,image_url\n'
+            'LAP-1,Laptop Pro,"New, improved\nmodel",1299.99,Electronics,5,http://example.com/laptop.jpg\n'
+            'PHN-1,Smartphone,,799.00,Electronics,20,\n'
+            'BAD-1,,,-3,Nowhere,many,not-a-url\n'
+        )
+        response = self.post_feed(feed, 'text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['failed']), (1, 1, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 3)
+        self.assertEqual(set(response.data['errors'][0]['errors']), {'name', 'price', 'category', 'stock_quantity', 'image_url'})
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.description, self.existing.stock_quantity), ('Laptop Pro', 'New, improved\nmodel', 5))
+        self.assertEqual(Product.objects.get(sku='PHN-1').category, self.category)
+
+    def test_ndjson_import_creates_categories_and_indexes(self):
+        feed = '\n'.join([
+            '{"sku": "KTL-1", "name": "Kettle", "price": "25.50", "category": "Kitchen", "stock_quantity": 3}',
+            'not json',
+            '',
+        ])
+        response = self.post_feed(feed, 'application/x-ndjson', create_categories='true')
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertTrue(Category.objects.filter(name='Kitchen').exists())
+        response = self.client.get(reverse('product-search'), {'q': 'kitchen'})
+        self.assertEqual([p['sku'] for p in response.data['results']], ['KTL-1'])
+
+    def test_import_requires_staff_and_known_format(self):
+        self.assertEqual(self.post_feed('{}', 'application/json').status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        self.client.force_authenticate(User.objects.create_user('testuser', 'test@example.com', 'testpassword'))
+        self.assertEqual(self.post_feed('sku\n', 'text/csv').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_catalog_command(self):
+        path = os.path.join(tempfile.mkdtemp(), 'feed.ndjson')
+        with open(path, 'w') as feed:
+            for i in range(25):
+                feed.write(json.dumps({'sku': f'SKU-{i}', 'name': f'Item {i}', 'price': i, 'stock_quantity': i}) + '\n')
+        out = StringIO()
+        call_command('import_catalog', path, batch_size=10, stdout=out)
+        self.assertIn('Created 25, updated 0, failed 0.', out.getvalue())
+        call_command('import_catalog', path, batch_size=10, stdout=out)
+        self.assertIn('Created 0, updated 25, failed 0.', out.getvalue())
+        self.assertEqual(Product.objects.count(), 26)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser('adminuser', 'admin@example.com', 'adminpassword')
+        self.client.force_authenticate(self.admin_user)
+        self.electronics = Category.objects.create(name='Electronics')
+        self.clothing = Category.objects.create(name='Clothing')
+        self.laptop = Product.objects.create(sku='LAP-1', name='Laptop', description='Powerful laptop', price='1200.50', category=self.electronics, stock_quantity=10)
+        self.shirt = Product.objects.create(name='Shirt', description='Cotton shirt', price=20, category=self.clothing, stock_quantity=10, created_date=timezone.now() - timedelta(days=30))
+        self.orders = []
+        for days_ago, products in [(0, [self.laptop, self.shirt]), (2, [self.shirt]), (10, [self.laptop])]:
+            order = Order.objects.create(user=self.admin_user, order_date=timezone.now() - timedelta(days=days_ago))
+            OrderItem.objects.bulk_create([OrderItem(order=order, product=product, quantity=2) for product in products])
+            self.orders.append(order)
+
+    def export(self, url_name, **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_order_export_ndjson(self):
+        records = [json.loads(line) for line in self.export('order-export').splitlines()]
+        self.assertEqual([r['id'] for r in records], [o.id for o in self.orders])
+        self.assertEqual(records[0]['items'][0], {'id': records[0]['items'][0]['id'], 'product_id': self.laptop.id, 'sku': 'LAP-1', 'name': 'Laptop', 'category_id': self.electronics.id, 'price': '1200.50', 'quantity': 2})
+        self.assertEqual(len(records[0]['items']), 2)
+
+    def test_order_export_price_paid(self):
+        OrderItem.objects.filter(order=self.orders[0], product=self.laptop).update(unit_price='1100.00')
+        Product.objects.filter(id=self.laptop.id).update(price='1300.00')
+        records = [json.loads(line) for line in self.export('order-export').splitlines()]
+        self.assertEqual([line['price'] for line in records[0]['items']], ['1100.00', '20.00'])
+        self.assertEqual(records[2]['items'][0]['price'], '1300.00')  # No unit_price recorded
+
+    def test_order_export_filters_and_csv(self):
+        since = (timezone.now() - timedelta(days=5)).date().isoformat()
+        rows = list(csv.DictReader(StringIO(self.export('order-export', output='csv', date_from=since, category=self.clothing.id))))
+        self.assertEqual(sorted({int(r['order_id']) for r in rows}), [self.orders[0].id, self.orders[1].id])
+        self.assertEqual(len(rows), 3)  # Every line of the matching orders
+        self.assertEqual(rows[0]['username'], 'adminuser')
+
+    def test_order_export_query_count_is_constant(self):
+        with self.assertNumQueries(2):  # Orders with users + prefetched lines with products
+            self.export('order-export')
+
+    def test_product_export(self):
+        records = [json.loads(line) for line in self.export('product-export', category=self.electronics.id).splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual((records[0]['sku'], records[0]['price'], records[0]['category_name']), ('LAP-1', '1200.50', 'Electronics'))
+        rows = list(csv.DictReader(StringIO(self.export('product-export', output='csv', date_to=(timezone.now() - timedelta(days=1)).date().isoformat()))))
+        self.assertEqual([r['name'] for r in rows], ['Shirt'])
+
+    def test_export_requires_staff_and_valid_params(self):
+        self.assertEqual(self.client.get(reverse('order-export'), {'date_from': 'yesterday'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('product-export'), {'output': 'xml'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(User.objects.create_user('testuser', 'test@example.com', 'testpassword'))
+        self.assertEqual(self.client.get(reverse('order-export')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite-specific')
+class QueryPlanTests(TestCase):
+    """
+    Runs each endpoint's queries through EXPLAIN QUERY PLAN and fails on full table scans,
+    and on sorts that the keyset pagination indexes should have made unnecessary.
+    """
+    FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+    def setUp(self):
+        get_response_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'buyerpassword')
+        self.category = Category.objects.create(name='Electronics')
+        self.product = Product.objects.create(name='Laptop', description='Powerful laptop', price=1200.00, category=self.category, stock_quantity=10)
+        Review.objects.create(product=self.product, user=self.user, rating=5)
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedPlans(self, url, params=None, allow_sort=False):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        selects = [query['sql'] for query in context.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            plan = self.explain(sql)
+            full_scans = [step for step in plan if self.FULL_SCAN.match(step)]
+            self.assertEqual(full_scans, [], f'Full table scan in {url} {params}:\n{sql}\n{plan}')
+            if not allow_sort:
+                sorts = [step for step in plan if 'TEMP B-TREE' in step]
+                self.assertEqual(sorts, [], f'Sort without an index in {url} {params}:\n{sql}\n{plan}')
+
+    def test_product_list_plans(self):
+        url = reverse('product-list')
+        self.assertIndexedPlans(url, {'pagination': 'cursor'})
+        self.assertIndexedPlans(url, {'pagination': 'cursor', 'ordering': 'price'})
+        self.assertIndexedPlans(url, {'pagination': 'cursor', 'ordering': '-avg_rating'})
+        self.assertIndexedPlans(url, {'pagination': 'cursor', 'stock_available': 'true'})
+        self.assertIndexedPlans(url, {'category': self.category.id, 'price_min': 100, 'price_max': 2000})
+        self.assertIndexedPlans(url, {'price_min': 100, 'price_max': 2000})
+
+    def test_product_detail_and_search_plans(self):
+        self.assertIndexedPlans(reverse('product-detail', args=[self.product.id]))
+        self.assertIndexedPlans(reverse('product-search'), {'q': 'laptop'}, allow_sort=True)  # Ranked by relevance
+
+    def test_review_list_plan(self):
+        self.assertIndexedPlans(reverse('review-list'), {'product_id': self.product.id})
+        url = reverse('product-reviews', args=[self.product.id])
+        self.assertIndexedPlans(url)
+        self.assertIndexedPlans(url, {'rating': 5})
+        Review.objects.create(product=self.product, user=User.objects.create_user('reviewer'), rating=4)
+        first = self.client.get(url, {'page_size': 1, 'ordering': 'created_at'})
+        self.assertIndexedPlans(first.data['next'])
+
+    def test_order_list_plan(self):
+        self.client.force_authenticate(self.user)
+        self.assertIndexedPlans(reverse('order-list'))
+
+    def test_token_auth_plan(self):
+        token = Token.objects.create(user=self.user)
+        token_cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertIndexedPlans(reverse('order-list'))
+
+
+class LoadTestingCommandTests(TestCase):
+    """
+    Small runs of seed_catalog and benchmark_api.
+    """
+    seed_args = ['--products', '60', '--categories', '3', '--users', '5', '--orders', '20', '--reviews', '120', '--batch-size', '25']
+
+    def seeded_catalog(self):
+        return list(Product.objects.order_by('sku').values_list('sku', 'name', 'price', 'category__name', 'avg_rating'))
+
+    def test_seed_catalog_is_deterministic(self):
+        call_command('seed_catalog', *self.seed_args, stdout=StringIO())
+        first = self.seeded_catalog()
+        call_command('seed_catalog', *self.seed_args, '--clear', stdout=StringIO())
+        self.assertEqual(self.seeded_catalog(), first)
+        self.assertEqual(len(first), 60)
+        self.assertEqual(Review.objects.count(), 120)
+        self.assertEqual(Order.objects.count(), 20)
+
+    def test_seed_catalog_aggregates_match_reviews(self):
+        call_command('seed_catalog', *self.seed_args, stdout=StringIO())
+        self.assertEqual(recompute_ratings(), (60, 0))
+
+    def test_seed_catalog_refuses_to_seed_twice(self):
+        call_command('seed_catalog', *self.seed_args, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('seed_catalog', *self.seed_args, stdout=StringIO())
+
+    def test_benchmark_api_saves_and_compares_baselines(self):
+        call_command('seed_catalog', *self.seed_args, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            args = ['--iterations', '2', '--warmup', '0', '--host', 'testserver']
+            call_command('benchmark_api', *args, '--save', path, stdout=StringIO())
+            with open(path) as f:
+                baseline = json.load(f)
+            self.assertEqual(baseline['results']['orders-create']['errors'], 0)
+            self.assertEqual(baseline['results']['reviews-create']['errors'], 0)
+            self.assertIn('p99_ms', baseline['results']['products-search'])
+
+            out = StringIO()
+            call_command('benchmark_api', *args, '--only', 'products-list', '--compare', path, stdout=out)
+            self.assertIn('Δp50', out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='benchmark-api-').exists())
+
+
+class RequestMetricsTests(TestCase):
+    """
+    MetricsMiddleware and the /api/metrics endpoint.
+    """
+    def setUp(self):
+        get_response_cache().clear()
+        metrics.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser('metricsadmin', 'admin@example.com', 'adminpassword')
+        self.user = User.objects.create_user('metricsuser', 'user@example.com', 'userpassword')
+        self.category = Category.objects.create(name='Electronics')
+        Product.objects.create(name='Laptop', description='Powerful laptop', price=1200.00, category=self.category, stock_quantity=10)
+
+    def test_server_timing_header_for_staff_only(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('product-list')))
+        self.client.force_authenticate(self.user)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('product-list')))
+        self.client.force_authenticate(self.admin)
+        get_response_cache().clear()
+        response = self.client.get(reverse('product-list'))
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="4 queries"$')  # Versions, then rows
+        self.client.force_authenticate(None)
+        with override_settings(DEBUG=True):
+            self.assertIn('Server-Timing', self.client.get(reverse('product-list')))
+        with override_settings(REQUEST_METRICS={**settings.REQUEST_METRICS, 'SERVER_TIMING': True}):
+            self.assertIn('Server-Timing', self.client.get(reverse('product-list')))
+
+    def test_metrics_are_recorded_per_route_and_action(self):
+        self.client.get(reverse('product-list'))
+        self.client.get(reverse('product-list'))  # Served from the response cache
+        self.client.get(reverse('product-search'), {'q': 'laptop'})
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{route="product.list",method="GET",status="2xx"} 2', body)
+        self.assertIn('http_request_db_queries_sum{route="product.list",method="GET",status="2xx"} 6', body)
+        self.assertIn('http_request_duration_seconds_count{route="product.search",method="GET",status="2xx"} 1', body)
+        self.assertIn('response_cache_requests_total{result="hit"}', body)
+
+    def test_streamed_queries_are_recorded_when_the_stream_closes(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('product-export'))
+        self.assertNotIn('product.export', metrics.render())
+        b''.join(response.streaming_content)  # The test client closes the response once it is read
+        self.assertIn('http_request_db_queries_sum{route="product.export",method="GET",status="2xx"} 1', metrics.render())
+
+    def test_metrics_staff_only(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(REQUEST_METRICS={'QUERY_BUDGET': 1, 'LOG_SAMPLE_RATE': 1.0})
+    def test_over_budget_requests_are_logged(self):
+        with self.assertLogs('ecommerce_api.metrics', 'WARNING') as logs:
+            self.client.get(reverse('product-list'))
+        self.assertIn('(product.list)', logs.output[0])
+        self.assertIn('4 queries', logs.output[0])
+
+
+class AsyncCatalogReadTests(TestCase):
+    """
+    The async read views served under ASGI answer exactly like the sync viewsets.
+    """
+    def setUp(self):
+        get_response_cache().clear()
+        self.sync_client = APIClient()
+        self.async_client = AsyncClient()
+        self.admin = User.objects.create_superuser('asyncadmin', 'admin@example.com', 'adminpassword')
+        self.user = User.objects.create_user('asyncuser', 'user@example.com', 'userpassword')
+        self.category = Category.objects.create(name='Electronics')
+        self.product = Product.objects.create(name='Laptop', description='Powerful laptop', price=1200.00, category=self.category, stock_quantity=10)
+        Product.objects.create(name='Smartphone', description='Latest smartphone', price=800.00, category=self.category, stock_quantity=0)
+        Review.objects.create(product=self.product, user=self.user, rating=4, text='Good')
+
+    async def assertSameAsSync(self, url, params=None):
+        response = await self.async_client.get(url, params or {}, headers={'accept': 'application/json'})
+        get_response_cache().clear()
+        expected = await sync_to_async(self.sync_client.get)(url, params or {}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, expected.status_code, url)
+        self.assertEqual(response.content, expected.content, url)
+        self.assertEqual(response['Allow'], expected['Allow'])
+        return response
+
+    async def test_reads_match_sync_viewsets(self):
+        await self.assertSameAsSync(reverse('product-list'))
+        await self.assertSameAsSync(reverse('product-list'), {'category': self.category.id, 'price_min': 100, 'stock_available': 'true', 'ordering': '-price'})
+        await self.assertSameAsSync(reverse('product-list'), {'pagination': 'cursor', 'ordering': 'price', 'page_size': 1})
+        await self.assertSameAsSync(reverse('product-list'), {'search': 'lap'})
+        await self.assertSameAsSync(reverse('product-detail', args=[self.product.id]))
+        await self.assertSameAsSync(reverse('product-search'), {'q': 'smart'})
+        await self.assertSameAsSync(reverse('product-search'), {'q': 'laptop', 'pagination': 'cursor', 'page_size': 1})
+        await self.assertSameAsSync(reverse('product-search'))
+        await self.assertSameAsSync(reverse('category-list'))
+        await self.assertSameAsSync(reverse('review-list'), {'product_id': self.product.id})
+
+    async def test_errors_match_sync_viewsets(self):
+        await self.assertSameAsSync(reverse('product-detail', args=[999999]))
+        await self.assertSameAsSync(reverse('product-list'), {'page': 99})
+        await self.assertSameAsSync(reverse('product-list'), {'category': 999999, 'price_min': 'cheap'})
+        await self.assertSameAsSync(reverse('product-list'), {'pagination': 'cursor', 'cursor': 'garbage'})
+
+    @override_settings(RESPONSE_CACHE_COUNTERS_ALIAS='default', REQUEST_METRICS={**settings.REQUEST_METRICS, 'SERVER_TIMING': True})  # Only the queries of the list
+    async def test_reads_use_the_async_views(self):
+        response = await self.async_client.get(reverse('review-list'), {'product_id': self.product.id})
+        self.assertIs(response.resolver_match.func.view_class, ReviewListView)
+        self.assertIn('desc="1 queries"', response['Server-Timing'])  # Reviewer usernames come from a join
+        with override_settings(ASYNC_CATALOG_READS=False):
+            response = await self.async_client.get(reverse('review-list'), {'product_id': self.product.id})
+        self.assertIsNot(getattr(response.resolver_match.func, 'view_class', None), ReviewListView)
+
+    async def test_conditional_reads(self):
+        url = reverse('product-detail', args=[self.product.id])
+        response = await self.async_client.get(url, headers={'accept': 'application/json'})
+        expected = await sync_to_async(self.sync_client.get)(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response['ETag'], expected['ETag'])  # Same cache entry, same validator
+        response = await self.async_client.get(url, headers={'accept': 'application/json', 'if-none-match': response['ETag']})
+        self.assertIs(response.resolver_match.func.view_class, ProductDetailView)
+        self.assertEqual((response.status_code, response.content), (304, b''))
+
+    @override_settings(RESPONSE_CACHE_ALIAS='shared')  # A database cache
+    async def test_reads_with_a_database_cache(self):
+        url = reverse('product-detail', args=[self.product.id])
+        response = await self.async_client.get(url, headers={'accept': 'application/json'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIs(response.resolver_match.func.view_class, ProductDetailView)
+        cached = await self.async_client.get(url, headers={'accept': 'application/json'})
+        self.assertEqual(cached.content, response.content)
+        response = await self.async_client.get(url, headers={'accept': 'application/json', 'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_writes_and_browsable_api_use_the_sync_viewsets(self):
+        token = await sync_to_async(Token.objects.create)(user=self.admin)
+        response = await self.async_client.post(
+            reverse('product-list'),
+            {'name': 'Tablet', 'description': 'New tablet', 'price': '300.00', 'category': self.category.id, 'stock_quantity': 5},
+            content_type='application/json',
+            headers={'authorization': f'Token {token.key}'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = await self.async_client.get(reverse('product-list'), headers={'accept': 'text/html'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+
+class ProductFacetTests(TestCase):
+    """
+    GET /api/products/facets/ counts per category, price bucket and stock status.
+    """
+    def setUp(self):
+        get_response_cache().clear()
+        self.client = APIClient()
+        self.electronics = Category.objects.create(name='Electronics')
+        self.books = Category.objects.create(name='Books')
+        Product.objects.create(name='Laptop', description='Powerful laptop', price=1200.00, category=self.electronics, stock_quantity=10)
+        Product.objects.create(name='Laptop sleeve', description='Fits a laptop', price=30.00, category=self.electronics, stock_quantity=0)
+        Product.objects.create(name='Novel', description='A long story', price=20.00, category=self.books, stock_quantity=5)
+        Product.objects.create(name='Gift card', description='Any amount', price=50.00, stock_quantity=100)
+
+    def test_facet_counts(self):
+        response = self.client.get(reverse('product-facets'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(response.data['categories'], [
+            {'id': self.electronics.id, 'name': 'Electronics', 'count': 2},
+            {'id': None, 'name': None, 'count': 1},
+            {'id': self.books.id, 'name': 'Books', 'count': 1},
+        ])
+        self.assertEqual(response.data['price'][0], {'min': None, 'max': '25.00', 'count': 1})
+        self.assertEqual(response.data['price'][1], {'min': '25.00', 'max': '50.00', 'count': 1})
+        self.assertEqual(response.data['price'][2], {'min': '50.00', 'max': '100.00', 'count': 1})  # Lower bound included
+        self.assertEqual(response.data['price'][-1], {'min': '1000.00', 'max': None, 'count': 1})
+        self.assertEqual(response.data['in_stock'], {'true': 3, 'false': 1})
+
+    def test_facets_apply_filters_and_search(self):
+        response = self.client.get(reverse('product-facets'), {'search': 'laptop', 'stock_available': 'true'})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['in_stock'], {'true': 1, 'false': 0})
+        response = self.client.get(reverse('product-facets'), {'q': 'laptop', 'price_max': 100})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['categories'], [{'id': self.electronics.id, 'name': 'Electronics', 'count': 1}])
+
+    def test_custom_price_buckets(self):
+        response = self.client.get(reverse('product-facets'), {'price_buckets': '40,1000'})
+        self.assertEqual([bucket['count'] for bucket in response.data['price']], [2, 1, 1])
+        for value in ('100,50', 'cheap', '0,10', ','.join(['1'] * 30)):
+            response = self.client.get(reverse('product-facets'), {'price_buckets': value})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, value)
+            self.assertIn('price_buckets', response.data)
+
+    def test_one_query_and_cached_by_filters(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('product-facets'), {'price_min': 10, 'page': 1})
+        self.assertEqual(len(queries), 2)  # The version, then the facets
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('product-facets'), {'price_min': 10, 'page': 3, 'ordering': 'price'})
+        self.assertEqual(len(queries), 1)  # Paging and ordering don't change the facets
+        self.assertEqual(response.data['count'], 4)
+        Product.objects.create(name='Pen', description='Blue', price=12.00, stock_quantity=1)
+        self.assertEqual(self.client.get(reverse('product-facets'), {'price_min': 10}).data['count'], 5)
+
+
+class ValuesSerializerTests(TestCase):
+    """
+    The values_list() fast path of the list endpoints renders the same JSON as the serializers.
+    """
+    def setUp(self):
+        get_response_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='reviewer', password='password123')
+        self.category = Category.objects.create(name='Electronics')
+        self.laptop = Product.objects.create(name='Laptop', description='Powerful laptop', price=1200.5, category=self.category, stock_quantity=10, image_url='https://example.com/laptop.png')
+        Product.objects.create(name='Laptop bag', description='Fits a laptop', price=30, stock_quantity=0)
+        Review.objects.create(product=self.laptop, user=self.user, rating=4, text='Fast')
+        Review.objects.create(product=self.laptop, user=User.objects.create_user(username='critic', password='password123'), rating=5, text='')
+        recompute_ratings([self.laptop.id])
+
+    def assertSameJSON(self, serializer_class, queryset):
+        renderer = JSONRenderer()
+        fast = ValuesSerializer.for_serializer(serializer_class)
+        self.assertEqual(
+            renderer.render(fast.to_representation(fast.rows(queryset))),
+            renderer.render(serializer_class(queryset, many=True).data),
+        )
+
+    def test_same_json_as_serializers(self):
+        self.assertSameJSON(ProductSerializer, Product.objects.order_by('id'))
+        self.assertSameJSON(CategorySerializer, Category.objects.order_by('id'))
+        self.assertSameJSON(ReviewSerializer, Review.objects.order_by('id'))
+
+    def test_list_endpoints(self):
+        response = self.client.get(reverse('product-list'), {'ordering': 'price'})
+        self.assertEqual(response.json()['results'], json.loads(JSONRenderer().render(
+            ProductSerializer(Product.objects.order_by('price'), many=True).data
+        )))
+        response = self.client.get(reverse('product-search'), {'q': 'laptop', 'pagination': 'cursor', 'page_size': 1})
+        self.assertEqual(len(response.json()['results']), 1)
+        following = self.client.get(response.json()['next']).json()  # Cursors are read from the row tuples
+        self.assertEqual(len(following['results']), 1)
+        self.assertEqual(self.client.get(reverse('category-list')).json(), [{'id': self.category.id, 'name': 'Electronics'}])
+
+    @override_settings(RESPONSE_CACHE_COUNTERS_ALIAS='default')  # Only the queries of the list
+    def test_review_list_single_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('review-list'), {'product_id': self.laptop.id})
+        self.assertEqual(len(queries), 1)  # The username is joined in
+        self.assertEqual(sorted(review['user'] for review in response.json()), ['critic', 'reviewer'])
+
+    def test_instance_fields_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesSerializer(OrderItemSerializer)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_serialization', rows=10, iterations=3, stdout=out)
+        self.assertIn('products', out.getvalue())
+        self.assertIn('reviews', out.getvalue())
+
+
+class RendererTests(TestCase):
+    """
+    JSON is rendered and parsed with orjson, MessagePack is negotiated when msgpack is installed.
+    """
+    def setUp(self):
+        get_response_cache().clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', password='adminpassword', email='admin@example.com')
+        self.category = Category.objects.create(name='Électronique')
+        Product.objects.create(name='Laptop \u2028 line', description='Ünïcode', price=1200.5, category=self.category, stock_quantity=10)
+
+    def test_json_same_as_stdlib_renderer(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        self.assertIn(b'\\u2028', response.content)  # Escaped like JSONRenderer
+        self.assertIn('Électronique'.encode(), self.client.get(reverse('category-list')).content)
+        response = self.client.get(reverse('product-list'), HTTP_ACCEPT='application/json; indent=2')
+        self.assertIn(b'\n  "count"', response.content)
+
+    def test_browsable_api(self):
+        response = self.client.get(reverse('product-list'), HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, '&quot;count&quot;: 1')
+
+    def test_json_parser(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(reverse('category-list'), data='{"name": "Books"}', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        for body in ('{"name": ', '{"name": NaN}'):
+            response = self.client.post(reverse('category-list'), data=body, content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('JSON parse error', response.data['detail'])
+
+    @skipUnless(settings.MSGPACK_ENABLED, 'msgpack is not installed')
+    def test_msgpack(self):
+        import msgpack
+        response = self.client.get(reverse('product-list'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), json.loads(self.client.get(reverse('product-list')).content))
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(
+            reverse('category-list') + '?format=msgpack', data=msgpack.packb({'name': 'Books'}), content_type='application/msgpack'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(msgpack.unpackb(response.content)['name'], 'Books')
+        response = self.client.post(reverse('category-list'), data=b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_renderers', pages=2, iterations=2, stdout=out)
+        self.assertIn('json (stdlib)', out.getvalue())
+
+
+class CartReservationTests(TestCase):
+    """
+    Adding to the cart holds stock until the reservation lapses; checkout uses up the holds.
+    """
+    def setUp(self):
+        get_response_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user('shopper', 'shopper@example.com', 'shopperpassword')
+        self.other = User.objects.create_user('rival', 'rival@example.com', 'rivalpassword')
+        self.client.force_authenticate(self.user)
+        self.laptop = Product.objects.create(name='Laptop', description='Powerful laptop', price=1200.00, stock_quantity=3)
+        self.phone = Product.objects.create(name='Smartphone', description='Latest smartphone', price=800.00, stock_quantity=1)
+
+    def add(self, product, quantity, user=None):
+        client = self.client
+        if user is not None:
+            client = APIClient()
+            client.force_authenticate(user)
+        return client.post(reverse('cart-list'), {'product': product.id, 'quantity': quantity}, format='json')
+
+    def reserved(self, product):
+        return Product.objects.get(id=product.id).reserved_quantity
+
+    def test_add_holds_stock(self):
+        response = self.add(self.laptop, 2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsNotNone(response.data['reserved_until'])
+        self.assertEqual(self.add(self.laptop, 1).data['quantity'], 3)  # Added to the same line
+        self.assertEqual(self.reserved(self.laptop), 3)
+        response = self.add(self.laptop, 1, user=self.other)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Insufficient stock for Laptop', str(response.data))
+        self.assertNotIn('reserved_quantity', self.client.get(reverse('product-detail', args=[self.laptop.id])).data)
+
+    def test_orders_cannot_take_held_stock(self):
+        self.add(self.phone, 1, user=self.other)
+        response = self.client.post(reverse('order-list'), {'items': [{'item': self.phone.id, 'quantity': 1}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_and_remove_move_the_hold(self):
+        line = self.add(self.laptop, 1).data
+        response = self.client.patch(reverse('cart-detail', args=[line['id']]), {'quantity': 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.reserved(self.laptop), 3)
+        response = self.client.patch(reverse('cart-detail', args=[line['id']]), {'quantity': 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.reserved(self.laptop), 3)
+        response = self.client.patch(reverse('cart-detail', args=[line['id']]), {'product': self.phone.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.delete(reverse('cart-detail', args=[line['id']])).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.reserved(self.laptop), 0)
+
+    def test_lapsed_holds_are_swept_in_batches(self):
+        users = [User.objects.create_user(f'browser{i}') for i in range(4)]
+        self.add(self.phone, 1, user=users[0])
+        for user in users[1:]:
+            self.add(self.laptop, 1, user=user)
+        self.assertEqual(self.reserved(self.laptop), 3)
+        CartItem.objects.update(reserved_until=timezone.now() - timedelta(seconds=1))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(sweep_expired_holds(batch_size=2), 4)
+        self.assertGreater(len(queries), 4)  # Several batches
+        self.assertEqual(self.reserved(self.laptop), 0)
+        self.assertEqual(self.reserved(self.phone), 0)
+        self.assertEqual(CartItem.objects.filter(reserved_until__isnull=True).count(), 4)  # Lines stay in the carts
+        self.assertEqual(self.add(self.laptop, 3).status_code, status.HTTP_201_CREATED)
+
+    def test_reserving_sweeps_the_product(self):
+        self.add(self.phone, 1, user=self.other)
+        CartItem.objects.update(reserved_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.add(self.phone, 1).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.reserved(self.phone), 1)
+
+    def test_checkout(self):
+        self.add(self.laptop, 2)
+        self.add(self.phone, 1)
+        response = self.client.post(reverse('cart-checkout'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(sorted(item['quantity'] for item in response.data['items']), [1, 2])
+        laptop = Product.objects.get(id=self.laptop.id)
+        self.assertEqual((laptop.stock_quantity, laptop.reserved_quantity), (1, 0))
+        self.assertEqual(self.client.get(reverse('cart-list')).data, [])
+        self.assertEqual(self.client.post(reverse('cart-checkout')).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_checkout_without_hold_is_all_or_nothing(self):
+        self.add(self.laptop, 1)
+        self.add(self.phone, 1)
+        CartItem.objects.update(reserved_until=timezone.now() - timedelta(seconds=1))
+        sweep_expired_holds()
+        self.add(self.phone, 1, user=self.other)  # Taken by someone else meanwhile
+        response = self.client.post(reverse('cart-checkout'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Product.objects.get(id=self.laptop.id).stock_quantity, 3)
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(CartItem.objects.filter(cart__user=self.user).count(), 2)
+
+    def test_cart_is_private(self):
+        self.add(self.laptop, 1, user=self.other)
+        self.assertEqual(self.client.get(reverse('cart-list')).data, [])
+        self.assertEqual(APIClient().get(reverse('cart-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_sweep_command(self):
+        self.add(self.laptop, 1)
+        CartItem.objects.update(reserved_until=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command('sweep_reservations', stdout=out)
+        self.assertIn('Released 1 lapsed reservations.', out.getvalue())
+
+    def test_admin_cannot_set_holds(self):
+        self.client.force_login(User.objects.create_superuser('cartadmin', 'admin@example.com', 'adminpassword'))
+        for url in (reverse('admin:products_product_add'), reverse('admin:products_product_change', args=[self.laptop.id])):
+            self.assertNotIn('reserved_quantity', self.client.get(url).context['adminform'].form.fields)
+
+
+class ShardedStockTests(TestCase):
+    """
+    A sharded product's stock is taken from its shards, with the totals kept on the product row.
+    """
+    def setUp(self):
+        get_response_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'buyerpassword')
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name='Console', description='Limited edition', price=500, stock_quantity=10)
+        shard_stock(self.product, 4)
+
+    def order(self, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('order-list'), {'items': [{'item': self.product.id, 'quantity': quantity}]}, format='json')
+
+    def assertStock(self, stock_quantity, reserved_quantity=0):
+        product = Product.objects.get(id=self.product.id)
+        self.assertEqual((product.stock_quantity, product.reserved_quantity), (stock_quantity, reserved_quantity))
+        self.assertEqual(sum(product.shards.values_list('quantity', flat=True)), stock_quantity - reserved_quantity)
+
+    def test_split_evenly(self):
+        self.assertEqual(list(StockShard.objects.filter(product=self.product).order_by('index').values_list('quantity', flat=True)), [3, 3, 2, 2])
+
+    def test_orders_take_from_shards(self):
+        self.assertEqual(self.order(2).status_code, status.HTTP_201_CREATED)
+        self.assertStock(8)
+        self.assertEqual(self.order(5).status_code, status.HTTP_201_CREATED)  # More than any shard holds
+        self.assertStock(3)
+        self.assertEqual(self.order(4).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertStock(3)
+        self.assertEqual(self.client.get(reverse('product-list'), {'stock_available': 'true'}).data['count'], 1)
+        self.assertEqual(self.order(3).status_code, status.HTTP_201_CREATED)
+        self.assertStock(0)
+        self.assertEqual(self.client.get(reverse('product-list'), {'stock_available': 'true'}).data['count'], 0)
+
+    def test_cart_holds_and_checkout(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('cart-list'), {'product': self.product.id, 'quantity': 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertStock(10, 4)
+        self.assertEqual(self.order(7).status_code, status.HTTP_400_BAD_REQUEST)  # Only 6 aren't held
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(reverse('cart-checkout')).status_code, status.HTTP_201_CREATED)
+        self.assertStock(6)
+
+    def test_rebalance_unshard_and_edit(self):
+        self.order(5)
+        shard_stock(self.product, 2)
+        self.assertEqual(list(self.product.shards.order_by('index').values_list('quantity', flat=True)), [3, 2])
+        product = Product.objects.get(id=self.product.id)
+        product.stock_quantity = 20
+        product.save()  # Edited directly: the shards are recounted
+        self.assertStock(20)
+        shard_stock(self.product, 0)
+        self.assertFalse(StockShard.objects.exists())
+        self.assertEqual(self.order(20).status_code, status.HTTP_201_CREATED)
+        self.assertStock(0)
+
+    def test_reduce_stock(self):
+        product = Product.objects.get(id=self.product.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(product.reduce_stock(4))
+            self.assertFalse(product.reduce_stock(7))
+        self.assertEqual(product.stock_quantity, 6)
+        self.assertStock(6)
+
+    def test_save_keeps_counters(self):
+        stale = Product.objects.get(id=self.product.id)
+        shard_stock(self.product, 0)
+        stale.name = 'Console (renamed)'
+        stale.save()
+        self.assertEqual(Product.objects.get(id=self.product.id).stock_shards, 0)
+
+    def test_shard_stock_command(self):
+        out = StringIO()
+        call_command('shard_stock', self.product.id, shards=3, stdout=out)
+        self.assertEqual(self.product.shards.count(), 3)
+        call_command('shard_stock', rebalance=True, stdout=out)
+        self.assertIn('Updated the stock shards of 1 products.', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('shard_stock', stdout=out)
+
+    def test_recount_repairs_lost_totals(self):
+        self.order(2)
+        Product.objects.filter(id=self.product.id).update(stock_quantity=99, reserved_quantity=5)  # Drifted
+        call_command('shard_stock', rebalance=True, recount=True, stdout=StringIO())
+        self.assertStock(8)
+
+    def test_admin_cannot_set_shards(self):
+        self.client.force_login(User.objects.create_superuser('shardadmin', 'admin@example.com', 'adminpassword'))
+        for url in (reverse('admin:products_product_add'), reverse('admin:products_product_change', args=[self.product.id])):
+            self.assertNotIn('stock_shards', self.client.get(url).context['adminform'].form.fields)
+
+
+class SalesRollupTests(TestCase):
+    """
+    Order lines are rolled up per day from a high-water mark; the sales reports read only the rollups.
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'adminpassword')
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'buyerpassword')
+        self.client.force_authenticate(self.admin)
+        self.category = Category.objects.create(name='Electronics')
+        self.laptop = Product.objects.create(name='Laptop', description='Powerful laptop', price=1000, stock_quantity=50, category=self.category)
+        self.mug = Product.objects.create(name='Mug', description='Uncategorized', price=10, stock_quantity=50)
+        self.today = timezone.now() - timedelta(minutes=5)
+        self.yesterday = self.today - timedelta(days=1)
+
+    def order(self, when, *lines):
+        order = Order.objects.create(user=self.user, order_date=when)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=quantity, unit_price=product.price) for product, quantity in lines
+        ])
+
+    def report(self, name, **params):
+        params.setdefault('date_from', self.yesterday.date().isoformat())
+        params.setdefault('date_to', self.today.date().isoformat())
+        return self.client.get(reverse(f'sales-report-{name}'), params)
+
+    def test_catch_up_is_incremental(self):
+        self.order(self.yesterday, (self.laptop, 1), (self.mug, 3))
+        self.assertEqual(catch_up(settle_seconds=0), 2)
+        self.assertEqual(catch_up(settle_seconds=0), 0)  # Nothing new
+        self.order(self.yesterday, (self.laptop, 2))
+        self.order(self.today, (self.mug, 1))
+        self.assertEqual(catch_up(batch_size=1, settle_seconds=0), 2)
+        self.assertEqual(get_state().last_item_id, OrderItem.objects.latest('id').id)
+        laptop = ProductSalesDaily.objects.get(product=self.laptop)
+        self.assertEqual((laptop.day, laptop.units, laptop.revenue), (self.yesterday.date(), 3, 3000))
+        self.assertEqual(ProductSalesDaily.objects.filter(product=self.mug).count(), 2)
+        self.assertEqual(CategorySalesDaily.objects.get(category__isnull=True, day=self.yesterday.date()).units, 3)
+
+    def test_recent_orders_wait_for_the_settle_window(self):
+        self.order(self.yesterday, (self.laptop, 1))
+        self.order(timezone.now(), (self.mug, 1))
+        self.order(self.yesterday, (self.laptop, 1))  # After the unsettled line, so it waits too
+        self.assertEqual(catch_up(settle_seconds=60), 1)
+        self.assertEqual(catch_up(settle_seconds=0), 2)
+
+    def test_reports_read_only_the_rollups(self):
+        self.order(self.yesterday, (self.laptop, 1), (self.mug, 5))
+        self.order(self.today, (self.laptop, 2))
+        catch_up(settle_seconds=0)
+        self.laptop.price = 1
+        self.laptop.save()  # Revenue keeps the price paid
+        with CaptureQueriesContext(connection) as queries:
+            daily = self.report('daily')
+            products = self.report('products', order='units', limit=1)
+            categories = self.report('categories')
+        self.assertFalse([query for query in queries if 'products_orderitem' in query['sql']])
+        self.assertEqual(daily.status_code, status.HTTP_200_OK)
+        self.assertEqual([(day['units'], day['revenue']) for day in daily.data['results']], [(6, '1050.00'), (2, '2000.00')])
+        self.assertIsNotNone(daily.data['rolled_up_at'])
+        self.assertEqual([(row['name'], row['units']) for row in products.data['results']], [('Mug', 5)])
+        self.assertEqual(
+            [(row['name'], row['revenue']) for row in categories.data['results']], [('Electronics', '3000.00'), (None, '50.00')]
+        )
+
+    def test_reports_agree_on_the_category_at_rollup_time(self):
+        self.order(self.yesterday, (self.laptop, 1))
+        catch_up(settle_seconds=0)
+        computers = Category.objects.create(name='Computers')
+        self.laptop.category = computers
+        self.laptop.save()
+        self.order(self.today, (self.laptop, 2))
+        self.order(self.yesterday, (self.laptop, 1))
+        catch_up(settle_seconds=0)
+        for category, units in ((self.category, 1), (computers, 3)):
+            products = self.report('products', category=category.id)
+            self.assertEqual([(row['name'], row['units']) for row in products.data['results']], [('Laptop', units)])
+        categories = self.report('categories')
+        self.assertEqual([(row['name'], row['units']) for row in categories.data['results']], [('Computers', 3), ('Electronics', 1)])
+        self.assertEqual(ProductSalesDaily.objects.filter(product=self.laptop, day=self.yesterday.date()).count(), 2)
+
+    def test_reports_are_staff_only_and_validated(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.report('daily').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(len(self.client.get(reverse('sales-report-daily')).data['results']), 30)
+        self.assertEqual(self.report('daily', date_from='yesterday').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.report('daily', date_from='2030-01-02', date_to='2030-01-01').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.report('products', order='price').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.report('products', limit=1000).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rollup_command(self):
+        self.order(self.yesterday, (self.laptop, 1))
+        out = StringIO()
+        call_command('rollup_sales', settle=0, stdout=out)
+        self.assertIn('Rolled up 1 order lines', out.getvalue())
+        ProductSalesDaily.objects.update(units=99)  # Drifted
+        call_command('rollup_sales', rebuild=True, settle=0, stdout=out)
+        self.assertEqual(ProductSalesDaily.objects.get().units, 1)
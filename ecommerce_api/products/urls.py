@@ -1,7 +1,7 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from rest_framework.authtoken.views import obtain_auth_token
-from .views import ProductViewSet, CategoryViewSet, OrderViewSet, ReviewViewSet
+from users.views import ThrottledObtainAuthToken
+from .views import ProductViewSet, CategoryViewSet, OrderViewSet, ReviewViewSet, CartViewSet, SalesReportViewSet, CacheStatsView, MetricsView
 
 # Create a router and register our ViewSets with it.
 router = DefaultRouter()
@@ -9,8 +9,12 @@ router.register(r'products', ProductViewSet, basename='product')
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'orders', OrderViewSet, basename='order')
 router.register(r'reviews', ReviewViewSet, basename='review')
+router.register(r'cart', CartViewSet, basename='cart')
+router.register(r'reports/sales', SalesReportViewSet, basename='sales-report')
 
 # The API URLs are now determined automatically by the router.
 urlpatterns = [
-    path('api-token-auth/', obtain_auth_token, name='api_token_auth'),  # For user login and token generation
+    path('api-token-auth/', ThrottledObtainAuthToken.as_view(), name='api_token_auth'),  # For user login and token generation
+    path('cache-stats/', CacheStatsView.as_view(), name='cache_stats'),  # Response cache hit/miss counters (staff only)
+    path('metrics', MetricsView.as_view(), name='metrics'),  # Prometheus request metrics (staff only)
 ] + router.urls
\ No newline at end of file
@@ -1,12 +1,28 @@
-from rest_framework import viewsets, permissions, filters
+from django.contrib.auth.models import User
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from rest_framework import viewsets, permissions
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet
 import django_filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
-from .models import Product, Category, Order, Review
-from .serializers import ProductSerializer, CategorySerializer, OrderSerializer, ReviewSerializer
-from ecommerce_api.pagination import ProductPagination  # Import the pagination class
+from rest_framework.views import APIView
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from .models import Product, Category, Order, Review, CartItem
+from .serializers import ProductSerializer, CategorySerializer, OrderSerializer, ReviewSerializer, CartItemSerializer
+from . import autocomplete, cart, rollups
+from .search import FullTextSearchFilter, get_search_backend
+from .importer import FORMATS, ProductImporter, read_rows
+from .exports import export_orders, export_products
+from .facets import facet_counts, get_price_buckets
+from ecommerce_api.pagination import ProductPagination, ProductCursorPagination, ProductSearchCursorPagination, ReviewCursorPagination  # Import the pagination classes
+from ecommerce_api.cache import CachedResponseMixin, get_page_version, stats as cache_stats, version_of
+from ecommerce_api.fast_serializers import ValuesListMixin, ValuesSerializer
+from ecommerce_api.metrics import metrics
+from ecommerce_api.throttling import ScopedUserThrottle
+from ecommerce_api.replicas import ReplicaRoutingMixin
 
 
 class IsAdminUserOrReadOnly(permissions.BasePermission):
@@ -22,16 +38,20 @@ class IsAdminUserOrReadOnly(permissions.BasePermission):
 
 class ProductFilter(FilterSet):
     """
-    Filter set for the Product model, allowing filtering by category, price range, and stock availability.
+    Filter set for the Product model, allowing filtering by category, price range, stock availability and rating,
+    and ordering by price, date and rating.
     """
     category = django_filters.ModelChoiceFilter(queryset=Category.objects.all())
     price_min = django_filters.NumberFilter(field_name="price", lookup_expr='gte')
     price_max = django_filters.NumberFilter(field_name="price", lookup_expr='lte')
     stock_available = django_filters.BooleanFilter(field_name='stock_quantity', lookup_expr='gt', method='filter_stock_available')
+    min_rating = django_filters.NumberFilter(field_name='avg_rating', lookup_expr='gte')
+    min_reviews = django_filters.NumberFilter(field_name='review_count', lookup_expr='gte')
+    ordering = django_filters.OrderingFilter(fields=('price', 'created_date', 'avg_rating', 'review_count'))
 
     class Meta:
         model = Product
-        fields = ['category', 'price_min', 'price_max', 'stock_available']
+        fields = ['category', 'price_min', 'price_max', 'stock_available', 'min_rating', 'min_reviews']
 
     def filter_stock_available(self, queryset, name, value):
         """
@@ -42,64 +62,242 @@ class ProductFilter(FilterSet):
         return queryset
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ReviewFilter(FilterSet):
+    """
+    Filter set for a product's reviews, by exact or minimum rating.
+    """
+    rating = django_filters.NumberFilter(field_name='rating')
+    min_rating = django_filters.NumberFilter(field_name='rating', lookup_expr='gte')
+
+    class Meta:
+        model = Review
+        fields = ['rating', 'min_rating']
+
+
+class ProductViewSet(ReplicaRoutingMixin, CachedResponseMixin, ValuesListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing Product objects.
     Provides CRUD operations with admin-only write access and read-only access for others.
     Supports filtering, searching, and pagination.
+    List, detail, search and facet responses are served from the response cache, versioned
+    by the updated_at of the products they show; list and search rows are fetched with
+    values_list() rather than as model instances.
+    Reads go to a read replica when one is configured (see ecommerce_api.replicas).
     """
+    cache_models = (Product, Category)  # Search matches category names
+    version_field = 'updated_at'
+    review_cache_models = (Product, Review, User)  # The reviews action shows usernames
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminUserOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
     search_fields = ['name', 'category__name']  # Enable search by name and category name
     filterset_class = ProductFilter  # Use the ProductFilter
     pagination_class = ProductPagination  # Apply the pagination class
+    cursor_pagination_class = ProductCursorPagination  # Used with ?pagination=cursor
+    search_cursor_pagination_class = ProductSearchCursorPagination  # Used by the search action with ?pagination=cursor
+    review_pagination_class = ReviewCursorPagination  # Used by the reviews action
+    facet_ignored_params = ('page', 'page_size', 'pagination', 'cursor', 'ordering')
+
+    @property
+    def paginator(self):
+        """
+        Returns the review paginator for the reviews action, the cursor paginator when the
+        client opts in with ?pagination=cursor (or follows a cursor link), keyed on
+        relevance for the search action, and the page-number paginator otherwise.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if self.action == 'reviews':
+                self._paginator = self.review_pagination_class()
+            elif params.get('pagination') == 'cursor' or 'cursor' in params:
+                if self.action == 'search':
+                    self._paginator = self.search_cursor_pagination_class()
+                else:
+                    self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     @action(detail=False, methods=['GET'])
     def search(self, request):
         """
-        Custom action to search products by name or category name.
-        Applies pagination to the search results.
+        Custom action to search products by name, description or category name.
+        Results come from the full-text index, best match first, with every word matched as a prefix.
+        Applies pagination to the search results, and serves repeated searches from the response cache.
+        """
+        return self.cached_response(request, self.search_products)
+
+    def search_products(self, request):
+        """
+        Runs the search behind the search action.
         """
         query = request.query_params.get('q')
         if query:
-            products = self.queryset.filter(
-                Q(name__icontains=query) | Q(category__name__icontains=query)
-            )
-            paginator = self.pagination_class()  # Apply pagination to search results
-            page = paginator.paginate_queryset(products, request)
-            if page is not None:
-                serializer = self.get_serializer(page, many=True)
-                return paginator.get_paginated_response(serializer.data)
-            serializer = self.get_serializer(products, many=True)
-            return Response(serializer.data)
+            return self.list_values(get_search_backend().search(self.queryset, query), extra=('search_rank',))  # Paginated like the list
         return Response({'message': 'Please provide a search query.'})
 
+    def get_row_version(self, request):
+        """
+        Versions search pages like list pages, and facets by the number of matching
+        products and the last write to one of them or their categories.
+        """
+        if self.action == 'search':
+            query = request.query_params.get('q')
+            if not query:
+                return version_of(None), None
+            return get_page_version(get_search_backend().search(self.queryset, query), self.version_field, self.paginator, request, self)
+        if self.action == 'facets':
+            # A product leaving the facets lowers the count, one joining them is written
+            return version_of(self.facet_products(request).aggregate(
+                count=Count('id'), updated_at=Max('updated_at'), category_updated_at=Max('category__updated_at'),
+            )), None
+        return super().get_row_version(request)
+
+
+    @action(detail=True, methods=['GET'])
+    def reviews(self, request, pk=None):
+        """
+        The product's reviews, newest first, cursor-paginated on (created_at, id) so a
+        product with many reviews is paged through at the same cost per page.
+        Filter with ?rating= or ?min_rating=; ?ordering=created_at lists the oldest first.
+        The reviews are fetched with their usernames in one query, without model instances,
+        and served from the response cache.
+        """
+        return self.cached_response(request, self.product_reviews, pk)
+
+    def product_reviews(self, request, pk):
+        """
+        Lists the reviews behind the reviews action.
+        """
+        get_object_or_404(Product.objects.only('id'), pk=pk)
+        filterset = ReviewFilter(request.query_params, queryset=Review.objects.filter(product_id=pk))
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        serializer = ValuesSerializer.for_serializer(ReviewSerializer)
+        page = self.paginate_queryset(serializer.rows(filterset.qs))
+        return self.get_paginated_response(serializer.to_representation(page))
 
-class CategoryViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['GET'])
+    def autocomplete(self, request):
+        """
+        Search-as-you-type suggestions: the most reviewed products and the largest categories
+        with a word starting with ?q=, up to ?limit= of each (default 8, at most 20).
+        Answered from this process's in-memory prefix index, without a database query;
+        503 with Retry-After while the process is still building it.
+        """
+        try:
+            limit = int(request.query_params.get('limit', autocomplete.DEFAULT_LIMIT))
+            if not 1 <= limit <= autocomplete.MAX_LIMIT:
+                raise ValueError
+        except ValueError:
+            raise ValidationError({'limit': f'Enter a whole number from 1 to {autocomplete.MAX_LIMIT}.'})
+        try:
+            suggestions = autocomplete.suggest(request.query_params.get('q', ''), limit)
+        except autocomplete.NotReady:
+            return Response(
+                {'detail': 'Suggestions are being prepared; try again shortly.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '5'},
+            )
+        return Response(suggestions)
+
+    @action(detail=False, methods=['GET'])
+    def facets(self, request):
+        """
+        Counts per category, price bucket and stock status for the products matching the
+        same filters and ?search= as the list (or ?q= as the search action), for a filter sidebar.
+        Override the price bucket boundaries with ?price_buckets=50,100,500.
+        Served from the response cache, keyed on the filters only.
+        """
+        return self.cached_response(request, self.facet_counts)
+
+    def facet_counts(self, request):
+        """
+        Computes the facets behind the facets action with one grouped query.
+        """
+        bounds = get_price_buckets(request.query_params.get('price_buckets'))
+        return Response(facet_counts(self.facet_products(request), bounds))
+
+    def facet_products(self, request):
+        products = self.filter_queryset(self.get_queryset())
+        query = request.query_params.get('q')
+        if query:
+            products = get_search_backend().search(products, query)
+        return products
+
+    def get_cache_models(self):
+        if self.action == 'reviews':
+            return self.review_cache_models
+        return self.cache_models
+
+    def get_cache_ignored_params(self):
+        """
+        Facets don't depend on paging or ordering, so those parameters share one cache entry.
+        """
+        if self.action == 'facets':
+            return self.cache_ignored_params + self.facet_ignored_params
+        return self.cache_ignored_params
+
+    @action(detail=False, methods=['POST'], url_path='import', permission_classes=[permissions.IsAdminUser])
+    def bulk_import(self, request):
+        """
+        Staff-only bulk upsert of products by sku from a streamed CSV (text/csv) or
+        NDJSON (application/x-ndjson) body. Rows are validated one by one; invalid rows
+        are skipped and listed in the report instead of aborting the feed.
+        Pass ?create_categories=true to create unknown categories on the fly.
+        """
+        content_type = request.content_type.split(';')[0].strip().lower()
+        format = FORMATS.get(content_type)
+        if format is None:
+            return Response(
+                {'detail': f'Unsupported media type "{content_type}". Use text/csv or application/x-ndjson.'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        importer = ProductImporter(create_categories=request.query_params.get('create_categories') == 'true')
+        # Read the raw request stream line by line rather than parsing the whole body into request.data
+        report = importer.run(read_rows(request.stream or [], format))
+        return Response(report)
+
+    @action(detail=False, methods=['GET'], permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        """
+        Staff-only streaming export of all products as NDJSON (default) or CSV (?output=csv).
+        Filter with ?date_from=, ?date_to= (created date) and ?category=.
+        """
+        return export_products(request)
+
+
+class CategoryViewSet(ReplicaRoutingMixin, CachedResponseMixin, ValuesListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing Category objects.
-    Provides standard CRUD operations.
+    Provides standard CRUD operations, with list and detail served from the response cache.
+    Reads go to a read replica when one is configured.
     """
+    cache_models = (Category,)
+    version_field = 'updated_at'
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ReplicaRoutingMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing Order objects.
     Authenticated users can create and view their own orders.
+    Reads go to a read replica when one is configured, except right after the user placed
+    an order, so it is listed.
     """
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]  # Only logged-in users can place orders
+    throttle_classes = [ScopedUserThrottle]  # Placing orders, not reading them
+    throttle_scope = 'orders'
 
     def get_queryset(self):
         """
-        Returns only the orders associated with the currently authenticated user.
+        Returns only the orders associated with the currently authenticated user, newest first.
+        Order lines are prefetched so listing orders costs a constant number of queries.
         """
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).order_by('-order_date', '-id').prefetch_related('orderitem_set')
 
     def perform_create(self, serializer):
         """
@@ -107,15 +305,30 @@ class OrderViewSet(viewsets.ModelViewSet):
         """
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=['GET'], permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        """
+        Staff-only streaming export of every user's orders with their lines, as NDJSON
+        (default) or CSV (?output=csv, one row per order line).
+        Filter with ?date_from=, ?date_to= (order date) and ?category= (category of an ordered product).
+        """
+        return export_orders(request)
+
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ReplicaRoutingMixin, CachedResponseMixin, ValuesListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing Review objects.
     Allows read access to all, and authenticated users can create reviews.
     Supports filtering reviews by product ID.
+    The list fetches the reviewer's username in the same query as the reviews.
+    List and detail are served from the response cache.
+    Reads go to a read replica when one is configured.
     """
+    cache_models = (Review, User)  # Reviews show the username
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]  # Allow reading by all, creating by authenticated
+    throttle_classes = [ScopedUserThrottle]  # Writing reviews, not reading them
+    throttle_scope = 'reviews'
     queryset = Review.objects.all()
 
     def get_queryset(self):
@@ -131,4 +344,135 @@ class ReviewViewSet(viewsets.ModelViewSet):
         """
         Saves the review, associating it with the currently authenticated user.
         """
-        serializer.save(user=self.request.user)
\ No newline at end of file
+        serializer.save(user=self.request.user)
+
+
+class CartViewSet(ReplicaRoutingMixin, viewsets.ModelViewSet):
+    """
+    The authenticated user's cart.
+    POST adds a quantity of a product (to its line if there is one), PUT/PATCH sets a
+    line's quantity and DELETE removes it; adding and setting hold the stock for
+    CART_RESERVATION_TTL seconds. POST checkout/ turns the cart into an order.
+    """
+    serializer_class = CartItemSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = None  # Only checkout/ is throttled, as an order
+    replica_reads = False  # Holds change by the second; writes still pin the user to the primary
+
+    def get_queryset(self):
+        return CartItem.objects.filter(cart__user=self.request.user).order_by('id')
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = cart.reserve(cart.get_cart(self.request.user), data['product'], data['quantity'], add=True)
+
+    def perform_update(self, serializer):
+        item = serializer.instance
+        serializer.instance = cart.reserve(item.cart, item.product, serializer.validated_data.get('quantity', item.quantity))
+
+    def perform_destroy(self, instance):
+        cart.remove(instance)
+
+    @action(detail=False, methods=['POST'], throttle_classes=[ScopedUserThrottle], throttle_scope='orders')
+    def checkout(self, request):
+        """
+        Places an order for the cart's lines, using up their stock holds, and empties the cart.
+        """
+        order = cart.checkout(cart.get_cart(request.user))
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+
+class SalesReportViewSet(viewsets.ViewSet):
+    """
+    Staff-only sales reports, read from the daily rollups only (see products.rollups), so
+    they lag the orders by up to SALES_ROLLUP_SETTLE_SECONDS plus the rollup_sales interval.
+    Every report covers ?date_from= to ?date_to= (days, by default the last 30) and says
+    when the rollups were last caught up.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def report(self, date_from, date_to, results):
+        return Response({
+            'date_from': date_from,
+            'date_to': date_to,
+            'rolled_up_at': rollups.get_state().updated_at,
+            'results': results,
+        })
+
+    @action(detail=False, methods=['GET'])
+    def daily(self, request):
+        """
+        Units sold and revenue per day.
+        """
+        date_from, date_to = rollups.get_report_range(request.query_params)
+        return self.report(date_from, date_to, rollups.daily_sales(date_from, date_to))
+
+    @action(detail=False, methods=['GET'])
+    def products(self, request):
+        """
+        The best-selling products, by revenue or with ?order=units by units sold.
+        ?limit= sets how many (at most 100), ?category= keeps the sales made in one category.
+        """
+        date_from, date_to = rollups.get_report_range(request.query_params)
+        order = request.query_params.get('order', 'revenue')
+        if order not in ('revenue', 'units'):
+            raise ValidationError({'order': 'Must be revenue or units.'})
+        try:
+            limit = int(request.query_params.get('limit', 20))
+            category = request.query_params.get('category')
+            category = int(category) if category else None
+        except ValueError:
+            raise ValidationError('limit and category must be integers.')
+        if not 1 <= limit <= 100:
+            raise ValidationError({'limit': 'Must be between 1 and 100.'})
+        results = rollups.product_sales(date_from, date_to, order=order, limit=limit, category=category)
+        return self.report(date_from, date_to, results)
+
+    @action(detail=False, methods=['GET'])
+    def categories(self, request):
+        """
+        Units sold and revenue per category, best-selling first.
+        Sales count toward the category their product had when they were rolled up.
+        """
+        date_from, date_to = rollups.get_report_range(request.query_params)
+        return self.report(date_from, date_to, rollups.category_sales(date_from, date_to))
+
+
+class CacheStatsView(APIView):
+    """
+    Staff-only hit/miss counters of the response cache for this worker process.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats.as_dict())
+
+
+class MetricsView(APIView):
+    """
+    Staff-only request and response cache metrics for this worker process, in the
+    Prometheus text format.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        cache = cache_stats.as_dict()
+        lines = [
+            metrics.render(),
+            '# HELP response_cache_requests_total Response cache lookups by result.',
+            '# TYPE response_cache_requests_total counter',
+            f'response_cache_requests_total{{result="hit"}} {cache["hits"]}',
+            f'response_cache_requests_total{{result="miss"}} {cache["misses"]}',
+        ]
+        index = autocomplete.stats()
+        if index is not None:
+            lines += [
+                '# HELP autocomplete_index_bytes Memory held by the autocomplete prefix index.',
+                '# TYPE autocomplete_index_bytes gauge',
+                f'autocomplete_index_bytes {index["bytes"]}',
+                '# HELP autocomplete_index_names Names in the autocomplete prefix index, and changed since it was built.',
+                '# TYPE autocomplete_index_names gauge',
+                *(f'autocomplete_index_names{{kind="{kind}",part="index"}} {count}' for kind, count in index['names'].items()),
+                *(f'autocomplete_index_names{{kind="{kind}",part="overlay"}} {count}' for kind, count in index['overlay'].items()),
+            ]
+        return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,130 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """
+    Bounded, thread-safe LRU of token key -> (Token with its user loaded, revocation
+    generation of the user when it was cached), with a per-entry TTL.
+    """
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (token, generation, expires_at)
+        self.keys_by_user = {}  # user id -> set of cached keys
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            token, generation, expires_at = entry
+            if expires_at < time.monotonic():
+                self._discard(key)
+                return None
+            self.entries.move_to_end(key)
+            return token, generation
+
+    def set(self, key, token, generation=None):
+        with self.lock:
+            self._discard(key)
+            self.entries[key] = (token, generation, time.monotonic() + self.ttl)
+            self.keys_by_user.setdefault(token.user_id, set()).add(key)
+            while len(self.entries) > self.max_size:
+                self._discard(next(iter(self.entries)))
+
+    def evict_key(self, key):
+        with self.lock:
+            self._discard(key)
+
+    def evict_user(self, user_id):
+        with self.lock:
+            for key in list(self.keys_by_user.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_user.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            user_id = entry[0].user_id
+            keys = self.keys_by_user.get(user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_user[user_id]
+
+
+_config = getattr(settings, 'TOKEN_AUTH_CACHE', {})
+token_cache = TokenCache(max_size=_config.get('MAX_SIZE', 10000), ttl=_config.get('TTL', 60))
+
+
+def get_revocation_cache():
+    return caches[_config.get('REVOCATION_ALIAS', 'shared')]
+
+
+def revocation_key(user_id):
+    return f'token-revocation:{user_id}'
+
+
+def get_revocation_generation(user_id):
+    """
+    Returns the user's revocation generation, starting it from the clock if it is missing.
+    """
+    cache = get_revocation_cache()
+    key = revocation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)  # What another worker may have added first
+    return generation
+
+
+def revoke_user_tokens(*user_ids):
+    """
+    Stops every worker process from serving the users' tokens from its cache: evicts
+    them here and moves the users' revocation generation in the shared cache, which
+    each cache hit checks.
+    The signals in users/signals.py call this on saves and deletes (queryset deletes
+    included, as they send post_delete per row). QuerySet.update() sends no signals:
+    call it yourself after e.g. User.objects.filter(...).update(is_active=False).
+    """
+    for user_id in user_ids:
+        token_cache.evict_user(user_id)
+    get_revocation_cache().set_many({revocation_key(user_id): time.time_ns() for user_id in user_ids}, timeout=None)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for TokenAuthentication that serves token -> user from an
+    in-process cache, replacing the Token JOIN User query of repeat requests with a
+    lookup of the user's revocation generation in the shared cache.
+    A revocation committed between the token query and the generation read of a miss
+    can still be served from the cache until the entry's TTL runs out.
+    """
+    def authenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        token = None
+        if entry is not None:
+            token, generation = entry
+            if get_revocation_cache().get(revocation_key(token.user_id)) != generation:
+                token_cache.evict_key(key)
+                token = None
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token, get_revocation_generation(token.user_id))
+        # Each request gets its own copy of the user so per-request changes can't leak into the cache
+        return (copy.copy(token.user), token)
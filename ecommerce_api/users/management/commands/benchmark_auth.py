@@ -0,0 +1,47 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from users.authentication import CachedTokenAuthentication, token_cache
+
+
+class Command(BaseCommand):
+    """
+    Authenticates the same token repeatedly with TokenAuthentication and with
+    CachedTokenAuthentication, and reports queries and time per request.
+    The benchmark user is created in a transaction that is rolled back at the end.
+    """
+    help = 'Benchmarks token authentication with and without the token cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Authenticated requests per authentication class.')
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        with transaction.atomic():
+            user = User.objects.create_user(f'benchmark-auth-{time.monotonic_ns()}')
+            token = Token.objects.create(user=user)
+            token_cache.clear()
+
+            self.stdout.write(f"{'authentication':<28}{'queries/request':>16}{'us/request':>12}")
+            for auth_class in (TokenAuthentication, CachedTokenAuthentication):
+                authenticator = auth_class()
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for _ in range(options['requests']):
+                        request = Request(factory.get('/api/orders/', HTTP_AUTHORIZATION=f'Token {token.key}'))
+                        authenticator.authenticate(request)
+                    elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{auth_class.__name__:<28}{len(queries) / options['requests']:>16.3f}"
+                    f"{elapsed / options['requests'] * 1e6:>12.1f}"
+                )
+            token_cache.clear()
+            transaction.set_rollback(True)
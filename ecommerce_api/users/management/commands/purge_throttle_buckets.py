@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ecommerce_api.throttling import purge_idle_buckets
+
+
+class Command(BaseCommand):
+    """
+    Deletes the throttle buckets of clients idle for longer than the longest throttle
+    period; their buckets are full again anyway. Meant to run daily or so from cron.
+    """
+    help = 'Deletes idle throttle buckets.'
+
+    def handle(self, *args, **options):
+        deleted = purge_idle_buckets(time.time())
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} idle throttle buckets.'))
@@ -1,3 +1,13 @@
 from django.db import models
 
-# Create your models here.
+
+class ThrottleBucket(models.Model):
+    """
+    Token bucket of one client in one throttle scope (see ecommerce_api.throttling).
+    """
+    key = models.CharField(max_length=255, primary_key=True)  # Scope and client, e.g. throttle_login_ip-10.0.0.1
+    tokens = models.FloatField()  # Requests left as of updated
+    updated = models.FloatField(db_index=True)  # Timestamp of the last request let through, to purge idle buckets
+
+    def __str__(self):
+        return self.key
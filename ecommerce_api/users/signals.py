@@ -0,0 +1,28 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import revoke_user_tokens
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    """
+    Stops serving a token from the cache once it is deleted (e.g. by CustomLogoutView).
+    """
+    revoke_user_tokens(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def evict_saved_user(sender, instance, created, **kwargs):
+    """
+    Drops cached tokens of a user whenever the user is saved, so deactivation and
+    password changes take effect on the next request in every worker process.
+    """
+    if not created:
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def evict_deleted_user(sender, instance, **kwargs):
+    revoke_user_tokens(instance.pk)
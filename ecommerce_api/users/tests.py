@@ -1,3 +1,167 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+from django.contrib.auth.models import User
+from users.authentication import revocation_key, get_revocation_cache, revoke_user_tokens, token_cache
+from ecommerce_api.throttling import ScopedIPThrottle
+from products.models import Product
+from users.models import ThrottleBucket
 
-# Create your tests here.
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user('testuser', 'test@example.com', 'testpassword')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_requests_skip_token_lookup(self):
+        url = reverse('order-list')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(2):  # The revocation generation and the orders query
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_revocation_in_another_worker_is_seen(self):
+        self.client.get(reverse('order-list'))
+        # Another worker deactivates the user: only the shared generation moves here
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        get_revocation_cache().set(revocation_key(self.user.pk), 0, timeout=None)
+        self.assertEqual(len(token_cache), 1)
+        self.assertEqual(self.client.get(reverse('order-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bulk_deactivation_revokes_with_helper(self):
+        self.client.get(reverse('order-list'))
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        revoke_user_tokens(self.user.pk)
+        self.assertEqual(self.client.get(reverse('order-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_queryset_token_delete_revokes_cached_token(self):
+        self.client.get(reverse('order-list'))
+        Token.objects.filter(user=self.user).delete()
+        self.assertEqual(self.client.get(reverse('order-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_cached_token(self):
+        self.client.get(reverse('order-list'))
+        response = self.client.post(reverse('logout'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('order-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_revokes_cached_token(self):
+        self.client.get(reverse('order-list'))
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('order-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_evicts_cached_user(self):
+        self.client.get(reverse('order-list'))
+        self.assertEqual(len(token_cache), 1)
+        self.user.set_password('newpassword')
+        self.user.save()
+        self.assertEqual(len(token_cache), 0)
+
+    def test_cache_is_bounded(self):
+        cache = type(token_cache)(max_size=2, ttl=60)
+        tokens = [Token.objects.create(user=User.objects.create_user(f'user{i}')) for i in range(3)]
+        for token in tokens:
+            cache.set(token.key, token)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(tokens[0].key))
+        self.assertEqual(cache.get(tokens[2].key)[0], tokens[2])
+
+    def test_cache_entries_expire(self):
+        cache = type(token_cache)(max_size=2, ttl=-1)
+        cache.set(self.token.key, self.token)
+        self.assertIsNone(cache.get(self.token.key))
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {'register': '2/hour', 'login': '3/min', 'orders': '2/min', 'reviews': '10/min'},
+})
+class ThrottleTests(TestCase):
+    """
+    Login and registration are limited per client IP, order and review writes per user.
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('testuser', 'test@example.com', 'testpassword')
+
+    def login(self, ip='10.0.0.1'):
+        return self.client.post(reverse('login'), {'username': 'testuser', 'password': 'wrong'}, REMOTE_ADDR=ip)
+
+    def test_login_is_limited_per_ip(self):
+        self.assertEqual([self.login().status_code for _ in range(3)], [status.HTTP_400_BAD_REQUEST] * 3)
+        response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn(response['Retry-After'], ('19', '20'))  # One request every 60 / 3 seconds
+        self.assertEqual(self.login(ip='10.0.0.2').status_code, status.HTTP_400_BAD_REQUEST)
+        # The same bucket guards both login endpoints
+        self.assertEqual(self.client.post(reverse('api_token_auth'), {}, REMOTE_ADDR='10.0.0.1').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_bucket_refills_over_the_period(self):
+        now = 1000.0
+        with mock.patch.object(ScopedIPThrottle, 'timer', side_effect=lambda: now):
+            for _ in range(3):
+                self.login()
+            self.assertEqual(self.login().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            now += 20  # One request's worth
+            self.assertEqual(self.login().status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(self.login().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @mock.patch.object(ScopedIPThrottle, 'timer', return_value=1000.0)
+    def test_buckets_are_rows_without_a_cache_table(self, timer):
+        self.assertNotIn('throttle_buckets', connection.introspection.table_names())  # No createcachetable needed
+        self.login()
+        bucket = ThrottleBucket.objects.get()
+        self.assertEqual((bucket.key, bucket.tokens), ('throttle_login_ip-10.0.0.1', 2))
+        with CaptureQueriesContext(connection) as queries:
+            self.login()
+        self.assertEqual(len([q for q in queries if 'users_throttlebucket' in q['sql']]), 1)  # One conditional UPDATE
+        self.assertEqual(ThrottleBucket.objects.get().tokens, 1)
+
+    @mock.patch.object(ScopedIPThrottle, 'timer', return_value=1000.0)
+    def test_bucket_is_spent_atomically(self, timer):
+        self.login()
+        ThrottleBucket.objects.update(tokens=1.5)  # Another worker spent from it meanwhile
+        self.assertEqual(self.login().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.login().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertLess(ThrottleBucket.objects.get().tokens, 1)
+
+    def test_idle_buckets_are_purged(self):
+        self.login()
+        self.login(ip='10.0.0.2')
+        ThrottleBucket.objects.filter(key__endswith='10.0.0.1').update(updated=0)
+        out = StringIO()
+        call_command('purge_throttle_buckets', stdout=out)
+        self.assertIn('Deleted 1 idle throttle buckets.', out.getvalue())
+        self.assertEqual(list(ThrottleBucket.objects.values_list('key', flat=True)), ['throttle_login_ip-10.0.0.2'])
+
+    def test_registration_is_limited(self):
+        codes = [
+            self.client.post(reverse('register'), {'username': f'new{i}', 'email': f'new{i}@example.com', 'password': 'newpassword'}, REMOTE_ADDR='10.0.0.1').status_code
+            for i in range(3)
+        ]
+        self.assertEqual(codes[2], status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(User.objects.filter(username__startswith='new').count(), codes.count(status.HTTP_201_CREATED))
+
+    def test_orders_are_limited_per_user_but_reads_are_not(self):
+        product = Product.objects.create(name='Laptop', description='Powerful laptop', price=1200, stock_quantity=10)
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('otheruser'))
+        self.client.force_authenticate(self.user)
+        order = {'items': [{'item': product.id, 'quantity': 1}]}
+        codes = [self.client.post(reverse('order-list'), order, format='json', REMOTE_ADDR=f'10.0.0.{i}').status_code for i in range(3)]
+        self.assertEqual(codes, [status.HTTP_201_CREATED, status.HTTP_201_CREATED, status.HTTP_429_TOO_MANY_REQUESTS])
+        self.assertEqual(self.client.get(reverse('order-list')).status_code, status.HTTP_200_OK)
+        self.assertEqual(other.post(reverse('order-list'), order, format='json').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.post(reverse('cart-checkout')).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
@@ -2,10 +2,12 @@ from django.contrib.auth.models import User
 from rest_framework import viewsets, generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authtoken.models import Token
+from rest_framework.authtoken.views import ObtainAuthToken
+from ecommerce_api.throttling import ScopedIPThrottle
 from .serializers import UserSerializer
+from .authentication import CachedTokenAuthentication
 
 # Public endpoint for user registration
 class UserCreate(generics.CreateAPIView):
@@ -15,6 +17,17 @@ class UserCreate(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [ScopedIPThrottle]  # Password hashing is deliberately slow
+    throttle_scope = 'register'
+
+# Public endpoint for token login
+class ThrottledObtainAuthToken(ObtainAuthToken):
+    """
+    Returns the token of a user for their username and password, at most at the
+    'login' throttle rate per client IP address.
+    """
+    throttle_classes = [ScopedIPThrottle]
+    throttle_scope = 'login'
 
 # Admin-only endpoint for user management
 class UserViewSet(viewsets.ModelViewSet):
@@ -42,7 +55,7 @@ class CustomLogoutView(APIView):
     """
     Allows authenticated users (with TokenAuthentication) to logout by deleting their token.
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):